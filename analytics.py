@@ -0,0 +1,428 @@
+"""
+This module holds ClimateAnalytics which derives climate normals,
+rolling means, degree-days, and anomalies from the stored days and
+keeps them in their own tables.
+"""
+
+import numpy as np
+from daily_store import day_number
+from db_operations import TEMPERATURE_COLUMNS, date_key
+from dbcm import DBCM
+from metrics import METRICS, report_error
+from month_record import MonthRecord
+
+BASE_PERIOD = (1991, 2020)
+
+# Where each month starts in a leap year, so that February 29 has a
+# day of year of its own and March 1 is always day 61.
+MONTH_STARTS = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+
+NORMALS_TABLE = (
+    """
+    create table if not exists normals
+    (station_id integer not null,
+    day_of_year integer not null,
+    first_year integer not null,
+    last_year integer not null,
+    samples integer not null,
+    max_temp real,
+    min_temp real,
+    avg_temp real,
+    PRIMARY KEY (station_id, day_of_year)) WITHOUT ROWID;
+    """
+)
+
+DAILY_TABLE = (
+    """
+    create table if not exists daily_analytics
+    (station_id integer not null,
+    date_key integer not null,
+    anomaly real,
+    rolling_mean real,
+    heating_degree_days real not null,
+    cooling_degree_days real not null,
+    PRIMARY KEY (station_id, date_key)) WITHOUT ROWID;
+    """
+)
+
+def day_numbers(dates):
+    """
+    Returns datetime64[D] dates as days since 1970-01-01.
+    """
+    return dates.astype("datetime64[D]").astype(np.int64)
+
+def day_of_year(dates):
+    """
+    Returns the leap-year day of year, from 0 to 365, of datetime64[D] dates.
+    """
+    months = dates.astype("datetime64[M]")
+
+    return MONTH_STARTS[months.astype(np.int64) % 12] + (dates - months).astype(np.int64)
+
+def date_keys(dates):
+    """
+    Returns the integer YYYYMMDD keys of datetime64[D] dates.
+    """
+    months = dates.astype("datetime64[M]")
+
+    return (
+        (dates.astype("datetime64[Y]").astype(np.int64) + 1970) * 10000
+        + (months.astype(np.int64) % 12 + 1) * 100
+        + (dates - months).astype(np.int64) + 1
+    )
+
+def day_text(number):
+    """
+    Returns the "YYYY-MM-DD" date of a day number.
+    """
+    return str(np.datetime64(int(number), "D"))
+
+class ClimateAnalytics():
+    """
+    ClimateAnalytics works on the days behind a DBOperations, a whole
+    station at a time, with numpy array operations rather than a loop
+    over days.
+
+    Normals are the average max, min, and mean temperatures of each day of
+    the year over `base_period` (the WMO's current 30 years by default),
+    smoothed with a centred `smoothing_days` window that wraps around the
+    new year. They are kept in the normals table.
+
+    For every stored day, the daily_analytics table holds the anomaly (the
+    mean temperature less the day's normal), the average mean temperature
+    of the trailing `rolling_days` calendar days (when at least half of
+    them have data), and the heating and cooling degree-days against
+    `base_temperature`.
+
+    sync() brings both up to date after new days are saved. Days outside
+    the base period leave the normals alone, so only the days whose
+    rolling means include them are worked out again.
+    """
+
+    def __init__(self, db, base_period=BASE_PERIOD, base_temperature=18.0,
+                 rolling_days=30, smoothing_days=15):
+        """
+        Initializes ClimateAnalytics for a DBOperations.
+        """
+        self.db = db
+        self.base_period = tuple(base_period)
+        self.base_temperature = base_temperature
+        self.rolling_days = rolling_days
+        self.smoothing_days = smoothing_days
+
+    def initialize(self):
+        """
+        Creates the derived tables.
+        """
+        with DBCM(self.db.app_database) as cursor:
+            try:
+                cursor.execute(NORMALS_TABLE)
+                cursor.execute(DAILY_TABLE)
+
+            except Exception as error:
+                report_error("ClimateAnalytics::initialize", error)
+
+    def build(self, station_id):
+        """
+        Works out a station's normals and every day's analytics from
+        scratch, then replaces the stored ones in a single transaction, so
+        readers never see a station with new normals and old or no days.
+        """
+        try:
+            with METRICS.timer("analytics", step="build"):
+                self.initialize()
+
+                normals = self.compute_normals(station_id)
+
+                columns = self.db.fetch_columns(
+                    "0001-01-01", "9999-12-31", ("avg_temp",), station_id
+                )
+                days = day_numbers(columns["dates"])
+                rows = self.compute_days(columns, normals, days[0]) if len(days) else []
+
+                with DBCM(self.db.app_database) as cursor:
+                    self.save_normals(cursor, station_id, normals)
+
+                    cursor.execute("DELETE FROM daily_analytics WHERE station_id = ?", [station_id])
+                    self.save_days(cursor, station_id, rows)
+
+        except Exception as error:
+            report_error("ClimateAnalytics::build", error)
+
+    def sync(self, station_months):
+        """
+        Updates the analytics after (station_id, MonthRecord or weather
+        dictionary) pairs were saved. A station is built from scratch when
+        it has no normals yet, when they were made for another base period,
+        or when the new days fall in the base period.
+        """
+        try:
+            changed = {}
+
+            for station_id, weather in station_months:
+                if not weather:
+                    continue
+
+                if isinstance(weather, MonthRecord):
+                    days = [
+                        day_number(f"{weather.year}-{weather.month}-{day}")
+                        for day in (min(weather.days), max(weather.days))
+                    ]
+                else:
+                    days = [day_number(sample_date) for sample_date in weather]
+
+                span = changed.get(station_id, (min(days), max(days)))
+                changed[station_id] = (min(span[0], min(days)), max(span[1], max(days)))
+
+            if not changed:
+                return
+
+            self.initialize()
+
+            base_start = day_number(f"{self.base_period[0]}-01-01")
+            base_end = day_number(f"{self.base_period[1]}-12-31")
+
+            for station_id, (first_day, last_day) in changed.items():
+                normals = self.load_normals(station_id)
+
+                if normals is None or (first_day <= base_end and last_day >= base_start):
+                    self.build(station_id)
+                else:
+                    self.refresh(station_id, normals, first_day, last_day)
+
+        except Exception as error:
+            report_error("ClimateAnalytics::sync", error)
+
+    def refresh(self, station_id, normals, first_day, last_day):
+        """
+        Works out again the analytics of the days from `first_day` to the
+        last one whose rolling mean reaches back to `last_day`.
+        """
+        with METRICS.timer("analytics", step="refresh"):
+            columns = self.db.fetch_columns(
+                day_text(first_day - self.rolling_days + 1),
+                day_text(last_day + self.rolling_days - 1),
+                ("avg_temp",),
+                station_id
+            )
+
+            rows = self.compute_days(columns, normals, first_day)
+
+            with DBCM(self.db.app_database) as cursor:
+                self.save_days(cursor, station_id, rows)
+
+    def compute_normals(self, station_id):
+        """
+        Returns a (366, 3) array of the smoothed max, min, and mean normals
+        by day of year, NaN where the base period has no data, and the
+        number of days each day of year had.
+        """
+        first_year, last_year = self.base_period
+
+        columns = self.db.fetch_columns(
+            f"{first_year:04}-01-01", f"{last_year:04}-12-31", TEMPERATURE_COLUMNS, station_id
+        )
+
+        index = day_of_year(columns["dates"])
+        samples = np.bincount(index, minlength=366)
+
+        half = self.smoothing_days // 2
+        window = np.ones(2 * half + 1)
+
+        def smooth(values):
+            wrapped = np.concatenate([values[len(values) - half:], values, values[:half]])
+            return np.convolve(wrapped, window, "valid")
+
+        counts = smooth(samples.astype(np.float64))
+
+        normals = np.full((366, len(TEMPERATURE_COLUMNS)), np.nan)
+
+        for position, column in enumerate(TEMPERATURE_COLUMNS):
+            sums = smooth(np.bincount(index, weights=columns[column], minlength=366))
+            np.divide(sums, counts, out=normals[:, position], where=counts > 0)
+
+        return normals, samples
+
+    def save_normals(self, cursor, station_id, normals):
+        """
+        Replaces a station's normals within the caller's transaction.
+        """
+        values, samples = normals
+        first_year, last_year = self.base_period
+
+        rows = [
+            (station_id, day + 1, first_year, last_year, int(samples[day]))
+            + tuple(None if np.isnan(value) else round(float(value), 2) for value in values[day])
+            for day in range(366)
+        ]
+
+        cursor.execute("DELETE FROM normals WHERE station_id = ?", [station_id])
+        cursor.executemany("INSERT INTO normals VALUES (?,?,?,?,?,?,?,?)", rows)
+
+    def load_normals(self, station_id):
+        """
+        Returns a station's stored normals like compute_normals(),
+        or None if there are none for the base period.
+        """
+        with DBCM(self.db.app_database, read_only=True) as cursor:
+            cursor.execute(
+                """
+                SELECT day_of_year, samples, max_temp, min_temp, avg_temp
+                FROM normals
+                WHERE station_id = ? AND first_year = ? AND last_year = ?
+                ORDER BY day_of_year
+                """,
+                [station_id, self.base_period[0], self.base_period[1]]
+            )
+
+            rows = cursor.fetchall()
+
+        if len(rows) != 366:
+            return None
+
+        table = np.array([row[2:] for row in rows], dtype=np.float64)
+        samples = np.array([row[1] for row in rows], dtype=np.int64)
+
+        return table, samples
+
+    def compute_days(self, columns, normals, first_day):
+        """
+        Returns the daily_analytics rows for the days in `columns` from
+        `first_day` on. `columns` must reach `rolling_days` - 1 days back
+        from `first_day` so that the rolling means are complete.
+        """
+        days = day_numbers(columns["dates"])
+        means = columns["avg_temp"].astype(np.float64)
+
+        if len(days) == 0:
+            return []
+
+        start = days[0]
+        present = np.zeros(days[-1] - start + 1)
+        totals = np.zeros(days[-1] - start + 1)
+
+        present[days - start] = 1
+        totals[days - start] = means
+
+        counted = np.concatenate([[0], np.cumsum(present)])
+        summed = np.concatenate([[0], np.cumsum(totals)])
+
+        ends = days - start + 1
+        starts = np.maximum(ends - self.rolling_days, 0)
+
+        window_days = counted[ends] - counted[starts]
+        rolling = np.full(len(days), np.nan)
+        np.divide(
+            summed[ends] - summed[starts], window_days,
+            out=rolling, where=window_days * 2 >= self.rolling_days
+        )
+
+        mean_normals = normals[0][:, TEMPERATURE_COLUMNS.index("avg_temp")]
+        anomalies = means - mean_normals[day_of_year(columns["dates"])]
+
+        heating = np.maximum(self.base_temperature - means, 0)
+        cooling = np.maximum(means - self.base_temperature, 0)
+
+        keys = date_keys(columns["dates"])
+
+        keep = days >= first_day
+
+        return [
+            (
+                int(key),
+                None if np.isnan(anomaly) else round(float(anomaly), 2),
+                None if np.isnan(mean) else round(float(mean), 2),
+                round(float(hdd), 2),
+                round(float(cdd), 2),
+            )
+            for key, anomaly, mean, hdd, cdd in zip(
+                keys[keep], anomalies[keep], rolling[keep], heating[keep], cooling[keep]
+            )
+        ]
+
+    def save_days(self, cursor, station_id, rows):
+        """
+        Writes daily_analytics rows for a station within the caller's
+        transaction.
+        """
+        cursor.executemany(
+            """
+            INSERT INTO daily_analytics
+            (station_id, date_key, anomaly, rolling_mean, heating_degree_days, cooling_degree_days)
+            VALUES (?,?,?,?,?,?)
+            ON CONFLICT(station_id, date_key) DO UPDATE SET
+            anomaly = excluded.anomaly,
+            rolling_mean = excluded.rolling_mean,
+            heating_degree_days = excluded.heating_degree_days,
+            cooling_degree_days = excluded.cooling_degree_days
+            """,
+            [(station_id,) + row for row in rows]
+        )
+
+    def normals(self, station_id):
+        """
+        Returns a station's normals as (day of year, max, min, mean) rows.
+        """
+        with DBCM(self.db.app_database, read_only=True) as cursor:
+            try:
+                cursor.execute(
+                    """
+                    SELECT day_of_year, max_temp, min_temp, avg_temp
+                    FROM normals
+                    WHERE station_id = ?
+                    ORDER BY day_of_year
+                    """,
+                    [station_id]
+                )
+
+                return cursor.fetchall()
+
+            except Exception as error:
+                report_error("ClimateAnalytics::normals", error)
+
+    def daily(self, start_date, finish_date, station_id):
+        """
+        Returns (date, anomaly, rolling mean, heating degree-days, cooling
+        degree-days) rows between two dates for one station.
+        """
+        with DBCM(self.db.app_database, read_only=True) as cursor:
+            try:
+                cursor.execute(
+                    """
+                    SELECT date_key, anomaly, rolling_mean, heating_degree_days, cooling_degree_days
+                    FROM daily_analytics
+                    WHERE station_id = ?
+                    AND date_key BETWEEN ? AND ?
+                    ORDER BY date_key
+                    """,
+                    [station_id, date_key(start_date), date_key(finish_date)]
+                )
+
+                return [
+                    (f"{key // 10000:04}-{key // 100 % 100:02}-{key % 100:02}",) + tuple(row)
+                    for key, *row in cursor.fetchall()
+                ]
+
+            except Exception as error:
+                report_error("ClimateAnalytics::daily", error)
+
+    def degree_days(self, year, station_id):
+        """
+        Returns the heating and cooling degree-days of a year for one station.
+        """
+        with DBCM(self.db.app_database, read_only=True) as cursor:
+            try:
+                cursor.execute(
+                    """
+                    SELECT TOTAL(heating_degree_days), TOTAL(cooling_degree_days)
+                    FROM daily_analytics
+                    WHERE station_id = ?
+                    AND date_key BETWEEN ? AND ?
+                    """,
+                    [station_id, int(year) * 10000 + 101, int(year) * 10000 + 1231]
+                )
+
+                return cursor.fetchone()
+
+            except Exception as error:
+                report_error("ClimateAnalytics::degree_days", error)
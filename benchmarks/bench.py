@@ -0,0 +1,330 @@
+"""
+Offline benchmarks for the scrape-parse, save, fetch, and plot stages.
+
+Parsing runs on the page fixtures in benchmarks/fixtures, saving and
+fetching run against a generated multi-decade database in a temporary
+directory, and plots are rendered headlessly with the Agg backend.
+Results are written as JSON and checked against regression thresholds:
+
+    python benchmarks/bench.py --output bench_output.json
+    python benchmarks/bench.py --baseline bench_output.json --tolerance 0.2
+    python benchmarks/bench.py --record 2021-01 2021-02
+
+--record downloads real pages into the fixtures directory, replacing
+the ones of the same months. The fixtures committed so far were written
+to match the site's markup, missing and estimated flags included, and
+should be replaced with recorded pages when the site can be reached.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import date, datetime
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fixture_pages import synthetic_temps
+from stations import DEFAULT_STATION_ID
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+FETCH_RANGES = {
+    "month": ("2015-06-01", "2015-06-30"),
+    "year": ("2015-01-01", "2015-12-31"),
+    "decade": ("2006-01-01", "2015-12-31"),
+}
+
+def load_fixtures(directory):
+    """
+    Returns (year, month, page bytes) for every <station>-<year>-<month>.html fixture.
+    """
+    fixtures = []
+
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        _, year, month = os.path.basename(path)[:-len(".html")].split("-")
+
+        with open(path, "rb") as fixture_file:
+            fixtures.append((int(year), int(month), fixture_file.read()))
+
+    return fixtures
+
+def record_fixtures(directory, months, station_id):
+    """
+    Downloads real pages for the given YYYY-MM months into the fixtures directory.
+    """
+    from scrape_weather import WeatherScrapper
+
+    scrapper = WeatherScrapper(station_id=station_id)
+    os.makedirs(directory, exist_ok=True)
+
+    for year_month in months:
+        year, month = (int(part) for part in year_month.split("-"))
+        page = scrapper.fetch_page(year, month)
+
+        path = os.path.join(directory, f"{station_id}-{year}-{month:02}.html")
+        with open(path, "wb") as fixture_file:
+            fixture_file.write(page)
+
+        print(f"Recorded {path} ({len(page)} bytes)")
+
+def bench_parse(fixtures, pages):
+    """
+    Measures pages per second for both parsing engines.
+    """
+    from scrape_weather import WeatherScrapper
+    from table_parser import DailyTableParser
+
+    results = {}
+    rounds = max(1, pages // len(fixtures))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for year, month, page in fixtures:
+            parser = DailyTableParser(year, month)
+            parser.parse(page[offset:offset + 16384] for offset in range(0, len(page), 16384))
+    results["parse.stream.pages_per_sec"] = rounds * len(fixtures) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for year, month, page in fixtures:
+            scrapper = WeatherScrapper(engine="html")
+            scrapper.year = year
+            scrapper.month = f"{month:0>2}"
+            scrapper.feed(str(page))
+    results["parse.html.pages_per_sec"] = rounds * len(fixtures) / (time.perf_counter() - start)
+
+    return results
+
+def synthetic_months(years, station_id):
+    """
+    Returns one MonthRecord per month for the `years` years up to 2020,
+    like the parsers produce.
+    """
+    from month_record import MonthRecord
+
+    months = []
+
+    for year in range(2021 - years, 2021):
+        for month in range(1, 13):
+            weather = MonthRecord(year, month)
+            day = 1
+
+            while True:
+                try:
+                    date(year, month, day)
+                except ValueError:
+                    break
+
+                weather.append(day, *synthetic_temps(station_id, year, month, day))
+                day = day + 1
+
+            months.append(weather)
+
+    return months
+
+def bench_save(db, months, station_id):
+    """
+    Measures rows per second for saving every month in one call,
+    and again when the same rows are saved a second time.
+    """
+    rows = sum(len(weather) for weather in months)
+
+    start = time.perf_counter()
+    db.save_many(months, station_id)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db.save_many(months, station_id)
+    second = time.perf_counter() - start
+
+    return {
+        "save.rows": rows,
+        "save.rows_per_sec": rows / first,
+        "save.resave_rows_per_sec": rows / second,
+    }
+
+def bench_fetch(db, repeats, station_id):
+    """
+    Measures the median latency in milliseconds of range queries, both
+    with an empty query cache and when they are served from it.
+    """
+    results = {}
+
+    for name, (start_date, finish_date) in FETCH_RANGES.items():
+        for query, fetch in (
+                ("fetch", lambda: db.fetch_data(start_date, finish_date, station_id)),
+                ("fetch_columns",
+                 lambda: db.fetch_columns(start_date, finish_date, station_id=station_id))):
+            timings = []
+            for _ in range(repeats):
+                db.clear_cache()
+                start = time.perf_counter()
+                fetch()
+                timings.append(time.perf_counter() - start)
+            results[f"{query}.{name}.ms"] = statistics.median(timings) * 1000
+
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fetch()
+                timings.append(time.perf_counter() - start)
+            results[f"{query}.{name}.cached.ms"] = statistics.median(timings) * 1000
+
+    return results
+
+def bench_plot(db, years, repeats, station_id):
+    """
+    Measures the median time in milliseconds to render the
+    box plot and the long-range line plot headlessly.
+    """
+    import matplotlib.pyplot as plt
+    from weather_processor import WeatherProcessor
+
+    app = WeatherProcessor(station_id=station_id)
+    app.db = db
+
+    renders = {
+        "plot.box.ms": lambda: app.box_plot(2021 - years, 2020),
+        "plot.range.ms": lambda: app.range_plot(f"{2021 - years}-01-01", "2020-12-31"),
+    }
+
+    results = {}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        for name, render in renders.items():
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                render()
+                plt.gcf().canvas.draw()
+                timings.append(time.perf_counter() - start)
+                plt.close("all")
+
+            results[name] = statistics.median(timings) * 1000
+
+    return results
+
+def check(metrics, thresholds, baseline, tolerance):
+    """
+    Returns a list of failure messages. Metrics ending in "per_sec" must
+    not drop below their threshold "min" (or the baseline by more than
+    `tolerance`); metrics ending in "ms" must not rise above their
+    threshold "max" (or the baseline by more than `tolerance`).
+    """
+    failures = []
+
+    for name, limits in thresholds.items():
+        value = metrics.get(name)
+        if value is None:
+            continue
+
+        if "min" in limits and value < limits["min"]:
+            failures.append(f"{name} = {value:.2f} is below the minimum {limits['min']}")
+        if "max" in limits and value > limits["max"]:
+            failures.append(f"{name} = {value:.2f} is above the maximum {limits['max']}")
+
+    for name, previous in (baseline or {}).items():
+        value = metrics.get(name)
+        if value is None or not isinstance(previous, (int, float)):
+            continue
+
+        if name.endswith("per_sec") and value < previous * (1 - tolerance):
+            failures.append(f"{name} = {value:.2f} regressed from {previous:.2f}")
+        if name.endswith(".ms") and value > previous * (1 + tolerance):
+            failures.append(f"{name} = {value:.2f} regressed from {previous:.2f}")
+
+    return failures
+
+def main(argv=None):
+    """
+    Runs the benchmarks and returns the process exit code.
+    """
+    parser = argparse.ArgumentParser(description="Weather processor benchmarks")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--fixtures", default=FIXTURES, help="directory of page fixtures")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="JSON file of min/max limits")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed fractional regression against the baseline")
+    parser.add_argument("--pages", type=int, default=300, help="pages to parse per engine")
+    parser.add_argument("--years", type=int, default=30, help="years of generated data")
+    parser.add_argument("--repeats", type=int, default=20, help="repeats per query")
+    parser.add_argument("--plot-repeats", type=int, default=3, help="repeats per plot")
+    parser.add_argument("--skip", nargs="*", default=[],
+                        choices=["parse", "save", "fetch", "plot"], help="stages to skip")
+    parser.add_argument("--record", nargs="*", metavar="YYYY-MM",
+                        help="download real pages into the fixtures directory and exit")
+    parser.add_argument("--station", type=int, default=DEFAULT_STATION_ID)
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixtures(args.fixtures, args.record, args.station)
+        return 0
+
+    metrics = {}
+
+    if "parse" not in args.skip:
+        metrics.update(bench_parse(load_fixtures(args.fixtures), args.pages))
+
+    with tempfile.TemporaryDirectory() as directory:
+        from db_operations import DBOperations
+        from dbcm import ConnectionManager
+
+        db = DBOperations()
+        db.app_database = os.path.join(directory, "bench.sqlite")
+        db.initialize_db()
+
+        if {"save", "fetch", "plot"} - set(args.skip):
+            metrics.update(bench_save(db, synthetic_months(args.years, args.station), args.station))
+
+        if "fetch" not in args.skip:
+            metrics.update(bench_fetch(db, args.repeats, args.station))
+
+        if "plot" not in args.skip:
+            metrics.update(bench_plot(db, args.years, args.plot_repeats, args.station))
+
+        ConnectionManager.close_all()
+
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds, encoding="utf-8") as thresholds_file:
+            thresholds = json.load(thresholds_file)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["metrics"]
+
+    failures = check(metrics, thresholds, baseline, args.tolerance)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "metrics": metrics,
+        "failures": failures,
+    }
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(text)
+    print(text)
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+This module holds ClimateServer, a local stand-in for the Government of
+Canada climate website. It serves daily data pages for any station, year,
+and month, and yearly bulk CSV files, so that crawls can be load-tested and
+reproduced offline, with injectable latency, errors, and throttling.
+
+    python benchmarks/climate_server.py --port 8000 --latency 0.05 --error-rate 0.02
+
+Point WeatherScrapper or WeatherProcessor at it with base_url.
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import random
+import threading
+import time
+from datetime import date
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from fixture_pages import render_month_page, render_year_csv
+
+class ClimateServer():
+    """
+    ClimateServer serves /climate_data/daily_data_e.html pages. Like the
+    real site, a month before `first_month` is answered with the first
+    month and a month after `last_month` with the last one. Pages come from
+    `recorded_dir` (files named <station>-<year>-<month>.html) when present
+    and are generated by fixture_pages otherwise, with the current month
+    only filled in up to today.
+
+    Yearly CSV files are served from /climate_data/bulk_data_e.html with
+    format=csv. They list every day of the year but only have values
+    between `first_month` and `last_month`, and come from `recorded_dir`
+    (files named <station>-<year>.csv) when present.
+
+    Every response waits `latency` seconds plus up to `jitter` more. A
+    fraction `error_rate` of requests fail with a 500 or 503, a fraction
+    `throttle_rate` are answered 429 with a Retry-After header, and when
+    `max_rate` is set requests beyond that many per second are throttled
+    too. Random choices come from `seed` so runs can be repeated.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle_rate=0.0, max_rate=None, retry_after=1,
+                 first_month=(1996, 10), last_month=None, recorded_dir=None, seed=0):
+        """
+        Initializes ClimateServer. Port 0 picks a free port.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rate = max_rate
+        self.retry_after = retry_after
+        self.first_month = first_month
+        self.last_month = last_month or (date.today().year, date.today().month)
+        self.recorded_dir = recorded_dir
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.tokens = float(max_rate or 0)
+        self.refilled = time.monotonic()
+
+        self.requests = 0
+        self.statuses = {}
+
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        Returns the base URL to hand to WeatherScrapper.
+        """
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Serves requests on a background thread and returns the server.
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        """
+        Stops serving and closes the socket.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        """
+        Starts the server for the body of a with statement.
+        """
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_trace):
+        """
+        Stops the server.
+        """
+        self.stop()
+
+    def decide(self):
+        """
+        Counts a request and returns the error status to answer it
+        with, or None if it should be served normally.
+        """
+        with self.lock:
+            self.requests = self.requests + 1
+
+            if self.max_rate:
+                now = time.monotonic()
+                self.tokens = min(
+                    float(self.max_rate), self.tokens + (now - self.refilled) * self.max_rate
+                )
+                self.refilled = now
+
+                if self.tokens < 1:
+                    return 429
+
+                self.tokens = self.tokens - 1
+
+            roll = self.random.random()
+
+            if roll < self.throttle_rate:
+                return 429
+
+            if roll < self.throttle_rate + self.error_rate:
+                return self.random.choice((500, 503))
+
+            return None
+
+    def delay(self):
+        """
+        Returns how long to wait before answering.
+        """
+        with self.lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def count(self, status):
+        """
+        Counts a response status.
+        """
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def clamp(self, year, month):
+        """
+        Returns the month the real site would serve for a request.
+        """
+        return min(max((year, month), self.first_month), self.last_month)
+
+    def page(self, station_id, year, month):
+        """
+        Returns the page for a month, recorded if available.
+        """
+        if self.recorded_dir:
+            path = os.path.join(self.recorded_dir, f"{station_id}-{year}-{month:02}.html")
+
+            if os.path.exists(path):
+                with open(path, "rb") as page_file:
+                    return page_file.read()
+
+        today = date.today()
+        last_day = today.day if (year, month) == (today.year, today.month) else None
+
+        return render_month_page(station_id, year, month, last_day=last_day)
+
+    def csv(self, station_id, year):
+        """
+        Returns the bulk CSV file for a year, recorded if available.
+        """
+        if self.recorded_dir:
+            path = os.path.join(self.recorded_dir, f"{station_id}-{year}.csv")
+
+            if os.path.exists(path):
+                with open(path, "rb") as csv_file:
+                    return csv_file.read()
+
+        today = date.today()
+        last_day = today.day if self.last_month == (today.year, today.month) else None
+
+        return render_year_csv(
+            station_id, year, first_month=self.first_month, last_month=self.last_month,
+            last_day=last_day
+        )
+
+    def handler(self):
+        """
+        Returns the request handler class bound to this server.
+        """
+        server = self
+
+        class ClimateRequestHandler(BaseHTTPRequestHandler):
+            """
+            Answers requests for daily data pages.
+            """
+
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                """
+                Serves a daily data page, a bulk CSV file, an injected
+                error, or a 404.
+                """
+                time.sleep(server.delay())
+
+                parts = urlsplit(self.path)
+                if parts.path not in (
+                        "/climate_data/daily_data_e.html", "/climate_data/bulk_data_e.html"):
+                    self.reply(404, b"Not Found")
+                    return
+
+                status = server.decide()
+                if status is not None:
+                    headers = {"Retry-After": str(server.retry_after)} if status == 429 else {}
+                    self.reply(status, b"Unavailable", headers)
+                    return
+
+                try:
+                    query = parse_qs(parts.query)
+
+                    if parts.path == "/climate_data/bulk_data_e.html":
+                        body = server.csv(int(query["stationID"][0]), int(query["Year"][0]))
+                        content_type = "text/csv; charset=utf-8"
+                    else:
+                        station_id = int(query["StationID"][0])
+                        year, month = server.clamp(int(query["Year"][0]), int(query["Month"][0]))
+
+                        body = server.page(station_id, year, month)
+                        content_type = "text/html; charset=utf-8"
+                except (KeyError, ValueError):
+                    self.reply(400, b"Bad Request")
+                    return
+
+                etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.reply(304, b"", {"ETag": etag})
+                    return
+
+                headers = {
+                    "Content-Type": content_type,
+                    "ETag": etag,
+                    "Last-Modified": formatdate(usegmt=True),
+                }
+
+                if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                    body = gzip.compress(body, compresslevel=5)
+                    headers["Content-Encoding"] = "gzip"
+
+                self.reply(200, body, headers)
+
+            def reply(self, status, body, headers=None):
+                """
+                Sends a complete response on the kept-alive connection.
+                """
+                server.count(status)
+
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                """
+                Keeps the console quiet.
+                """
+
+        return ClimateRequestHandler
+
+
+def main(argv=None):
+    """
+    Runs the server until it is interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Local stand-in climate data server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered 500/503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction answered 429")
+    parser.add_argument("--max-rate", type=float, help="requests per second before throttling")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429")
+    parser.add_argument("--first-month", default="1996-10", help="first month of history, YYYY-MM")
+    parser.add_argument("--recorded-dir", help="directory of recorded pages to serve")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    first_year, first_month = (int(part) for part in args.first_month.split("-"))
+
+    server = ClimateServer(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, args.throttle_rate,
+        args.max_rate, args.retry_after, (first_year, first_month),
+        recorded_dir=args.recorded_dir, seed=args.seed
+    )
+
+    print(f"Serving climate data on {server.url}")
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+This module builds synthetic daily data pages and yearly bulk CSV files
+shaped like the ones served by the Government of Canada climate website,
+for benchmarks and for the local stand-in server.
+"""
+
+import calendar
+import csv
+import io
+import math
+import random
+from datetime import date
+
+MONTH_NAMES = calendar.month_name
+
+CSV_HEADER = (
+    "Longitude (x)", "Latitude (y)", "Station Name", "Climate ID", "Date/Time",
+    "Year", "Month", "Day", "Data Quality",
+    "Max Temp (\u00b0C)", "Max Temp Flag", "Min Temp (\u00b0C)", "Min Temp Flag",
+    "Mean Temp (\u00b0C)", "Mean Temp Flag", "Heat Deg Days (\u00b0C)", "Heat Deg Days Flag",
+    "Cool Deg Days (\u00b0C)", "Cool Deg Days Flag", "Total Rain (mm)", "Total Rain Flag",
+    "Total Snow (cm)", "Total Snow Flag", "Total Precip (mm)", "Total Precip Flag",
+    "Snow on Grnd (cm)", "Snow on Grnd Flag",
+)
+
+def synthetic_temps(station_id, year, month, day):
+    """
+    Returns a repeatable (max, min, mean) for a day: a seasonal
+    curve plus noise seeded by the station and date.
+    """
+    rng = random.Random(station_id * 100000000 + year * 10000 + month * 100 + day)
+
+    day_of_year = date(year, month, day).timetuple().tm_yday
+    seasonal = 2.5 - 20.0 * math.cos(2 * math.pi * (day_of_year - 15) / 365.25)
+
+    mean = seasonal + rng.gauss(0, 4)
+    spread = abs(rng.gauss(11, 3))
+
+    return round(mean + spread / 2, 1), round(mean - spread / 2, 1), round(mean, 1)
+
+def daily_values(station_id, year, month, missing_rate=0.03, last_day=None):
+    """
+    Yields (day, (max, min, mean), flags, rain, snow, precip) for each day
+    up to `last_day`, where each of the three flags is None, "M", or "E".
+    The same month always gets the same values and flags, whether it is
+    rendered as a page or as part of a CSV file.
+    """
+    rng = random.Random(f"{station_id}-{year}-{month}")
+    last_day = last_day or calendar.monthrange(year, month)[1]
+
+    for day in range(1, last_day + 1):
+        temps = synthetic_temps(station_id, year, month, day)
+        flags = [None, None, None]
+
+        if rng.random() < missing_rate:
+            column = rng.randrange(3)
+            flags[column] = "M" if rng.random() < 0.5 else "E"
+
+        rain = rng.choice(["0.0", "0.0", "1.2", "4.6"])
+        snow = rng.choice(["0.0", "0.0", "2.0"])
+        precip = rng.choice(["0.0", "0.4", "3.1"])
+
+        yield day, temps, flags, rain, snow, precip
+
+def render_month_page(station_id, year, month, missing_rate=0.03, padding=200, last_day=None):
+    """
+    Returns the bytes of a daily data page for the month, with rows
+    up to `last_day` (the whole month by default). About
+    `missing_rate` of the days have an "M" or "E" flag in a temperature
+    cell, and `padding` lines of filler stand in for the site's scripts,
+    navigation, and footer.
+    """
+    month_name = MONTH_NAMES[month]
+
+    head = [
+        '<!DOCTYPE html>',
+        '<html class="no-js" lang="en" dir="ltr">',
+        '<head>',
+        '<meta charset="utf-8">',
+        f'<title>Daily Data Report for {month_name} {year} - Climate - '
+        'Environment and Climate Change Canada</title>',
+    ]
+    head.extend(
+        f'<link rel="stylesheet" href="/static/css/theme-{line}.css">' for line in range(padding // 4)
+    )
+    head.append('</head>')
+
+    body = ['<body vocab="http://schema.org/" typeof="WebPage">']
+    body.extend(
+        f'<li><a href="/climate_data/nav-{line}.html">Navigation link {line}</a></li>'
+        for line in range(padding // 2)
+    )
+    body.extend([
+        '<div class="table-responsive">',
+        '<table class="data-table table table-striped table-hover align-center-all">',
+        f'<caption>Daily Data Report for {month_name} {year}</caption>',
+        '<thead><tr>',
+        '<th scope="col">DAY</th>',
+        '<th scope="col">Max Temp<br><abbr title="Celsius">&deg;C</abbr></th>',
+        '<th scope="col">Min Temp<br><abbr title="Celsius">&deg;C</abbr></th>',
+        '<th scope="col">Mean Temp<br><abbr title="Celsius">&deg;C</abbr></th>',
+        '<th scope="col">Heat Deg Days</th>',
+        '<th scope="col">Cool Deg Days</th>',
+        '<th scope="col">Total Rain mm</th>',
+        '<th scope="col">Total Snow cm</th>',
+        '<th scope="col">Total Precip mm</th>',
+        '<th scope="col">Snow on Grnd cm</th>',
+        '</tr></thead>',
+        '<tbody>',
+    ])
+
+    for day, temps, flags, rain, snow, precip in daily_values(
+            station_id, year, month, missing_rate, last_day):
+        mean = temps[2]
+        cells = [str(temp) for temp in temps]
+
+        for column, flag in enumerate(flags):
+            if flag == "M":
+                cells[column] = '<abbr title="Missing">M</abbr>'
+            elif flag == "E":
+                cells[column] = f'{cells[column]}<abbr title="Estimated">E</abbr>'
+
+        body.extend([
+            '<tr>',
+            f'<th scope="row"><abbr title="{month_name} {day}, {year}">{day:02}</abbr></th>',
+            f'<td>{cells[0]}</td>',
+            f'<td>{cells[1]}</td>',
+            f'<td>{cells[2]}</td>',
+            f'<td>{max(18.0 - mean, 0.0):.1f}</td>',
+            f'<td>{max(mean - 18.0, 0.0):.1f}</td>',
+            f'<td>{rain}</td>',
+            f'<td>{snow}</td>',
+            f'<td>{precip}</td>',
+            '<td>&nbsp;</td>',
+            '</tr>',
+        ])
+
+    body.extend([
+        '<tr class="text-bold">',
+        '<th scope="row">Sum</th>',
+        '<td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td>',
+        '<td>412.7</td><td>0.0</td><td>10.2</td><td>14.0</td><td>24.6</td><td>&nbsp;</td>',
+        '</tr>',
+        '<tr class="text-bold">',
+        '<th scope="row">Avg</th>',
+        '<td>1.4</td><td>-9.8</td><td>-4.2</td>',
+        '<td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td>',
+        '</tr>',
+        '<tr class="text-bold">',
+        '<th scope="row">Xtrm</th>',
+        '<td>14.1</td><td>-24.3</td><td>&nbsp;</td>',
+        '<td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td>',
+        '</tr>',
+        '</tbody>',
+        '</table>',
+        '</div>',
+    ])
+    body.extend(
+        f'<p class="footer-{line}">Footer text {line} for the climate data pages.</p>'
+        for line in range(padding)
+    )
+    body.extend(['</body>', '</html>'])
+
+    return "\n".join(head + body).encode("utf-8")
+
+def render_year_csv(station_id, year, missing_rate=0.03, first_month=None, last_month=None,
+                    last_day=None):
+    """
+    Returns the bytes of a yearly bulk CSV file for the station. Every day
+    of the year has a line, like on the real site, but only the months from
+    `first_month` to `last_month` ((year, month) pairs) have values, and the
+    last of them only up to `last_day`.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+    writer.writerow(CSV_HEADER)
+
+    station = (-97.24, 49.92, f"STATION {station_id}", f"50{station_id:05}")
+
+    for month in range(1, 13):
+        has_values = (first_month or (year, month)) <= (year, month) <= (last_month or (year, month))
+        month_last_day = last_day if (year, month) == last_month else None
+
+        values = {}
+        if has_values:
+            values = {
+                day: (temps, flags, rain, snow, precip)
+                for day, temps, flags, rain, snow, precip in daily_values(
+                    station_id, year, month, missing_rate, month_last_day
+                )
+            }
+
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            line = list(station) + [f"{year}-{month:02}-{day:02}", year, f"{month:02}", f"{day:02}", ""]
+
+            if day in values:
+                temps, flags, rain, snow, precip = values[day]
+                mean = temps[2]
+
+                for temp, flag in zip(temps, flags):
+                    line.extend(["" if flag == "M" else temp, flag or ""])
+
+                line.extend([
+                    f"{max(18.0 - mean, 0.0):.1f}", "", f"{max(mean - 18.0, 0.0):.1f}", "",
+                    rain, "", snow, "", precip, "", "", "",
+                ])
+            else:
+                line.extend([""] * 18)
+
+            writer.writerow(line)
+
+    return ("\ufeff" + output.getvalue()).encode("utf-8")
@@ -0,0 +1,149 @@
+"""
+This module holds DailyCSVParser, a streaming parser for the yearly
+bulk CSV files of daily data served by the Government of Canada
+climate website.
+"""
+
+import codecs
+import csv
+import time
+from month_record import MonthRecord
+
+COLUMNS = {
+    "Max": "Max Temp",
+    "Min": "Min Temp",
+    "Mean": "Mean Temp",
+}
+
+class DailyCSVParser():
+    """
+    DailyCSVParser is fed the raw bytes of a yearly CSV file in chunks as
+    they arrive and reads them line by line with the csv module, so the
+    whole file is never held in memory. Columns are found by their header
+    names. The result is one MonthRecord per month, like DailyTableParser
+    produces, and days with a missing value or an "M" or "E" flag are left
+    out just like they are.
+    """
+
+    def __init__(self, year=None, charset="utf-8-sig"):
+        """
+        Initializes DailyCSVParser. Lines for dates outside `year`
+        are skipped when it is given.
+        """
+        self.year = None if year is None else f"{year}-"
+        self.decoder = codecs.getincrementaldecoder(charset)("replace")
+
+        self.title = None
+        self.months = {}
+        self.rejected = {}
+        self.seconds = 0.0
+
+        self.columns = None
+        self.buffer = ""
+
+    def parse(self, chunks):
+        """
+        Feeds every chunk and returns the MonthRecords keyed by month
+        number. Time spent parsing, not waiting for chunks, is added up
+        in `seconds`.
+        """
+        for chunk in chunks:
+            start = time.perf_counter()
+            self.feed(chunk)
+            self.seconds = self.seconds + time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.feed(b"", final=True)
+        self.seconds = self.seconds + time.perf_counter() - start
+
+        return self.months
+
+    def feed(self, chunk, final=False):
+        """
+        Processes every complete line in the next chunk of the file.
+        """
+        self.buffer = self.buffer + self.decoder.decode(chunk, final)
+
+        lines = self.buffer.splitlines(keepends=True)
+
+        if lines and not final and not lines[-1].endswith(("\n", "\r")):
+            self.buffer = lines.pop()
+        else:
+            self.buffer = ""
+
+        for fields in csv.reader(lines):
+            if fields:
+                self.row(fields)
+
+    def header(self, fields):
+        """
+        Finds the date, station name, and temperature columns.
+        """
+        names = [field.strip() for field in fields]
+
+        self.columns = {"date": names.index("Date/Time")}
+
+        if "Station Name" in names:
+            self.columns["station"] = names.index("Station Name")
+
+        for key, name in COLUMNS.items():
+            self.columns[key] = next(
+                index for index, column in enumerate(names)
+                if column.startswith(name) and not column.endswith("Flag")
+            )
+            self.columns[f"{key} Flag"] = names.index(f"{name} Flag")
+
+    def row(self, fields):
+        """
+        Adds a line to its month's MonthRecord if it has a date and
+        usable max, min, and mean temperatures.
+        """
+        if self.columns is None:
+            self.header(fields)
+            return
+
+        if len(fields) <= max(self.columns.values()):
+            self.reject("incomplete")
+            return
+
+        sample_date = fields[self.columns["date"]].strip()
+
+        if self.year is not None and not sample_date.startswith(self.year):
+            return
+
+        if self.title is None and "station" in self.columns:
+            self.title = fields[self.columns["station"]].strip()
+
+        temps = []
+        for key in COLUMNS:
+            flag = fields[self.columns[f"{key} Flag"]].strip()
+            temp = fields[self.columns[key]].strip()
+
+            if "M" in flag or not temp:
+                self.reject("missing")
+                return
+
+            if "E" in flag:
+                self.reject("estimated")
+                return
+
+            temps.append(temp)
+
+        try:
+            year, month, day = (int(part) for part in sample_date.split("-")[:3])
+            temps = [float(temp) for temp in temps]
+        except ValueError:
+            self.reject("invalid")
+            return
+
+        record = self.months.get(month)
+        if record is None:
+            record = self.months[month] = MonthRecord(year, month)
+
+        record.append(day, *temps)
+
+    def reject(self, reason):
+        """
+        Counts a day that was left out and why.
+        """
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
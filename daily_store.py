@@ -0,0 +1,304 @@
+"""
+This module holds DailyStore which keeps each station's daily
+temperatures in a fixed-width binary file that is read through
+a memory map.
+"""
+
+import os
+import threading
+import numpy as np
+from db_operations import TEMPERATURE_COLUMNS, date_parts
+from metrics import report_error
+from month_record import MonthRecord
+
+MAGIC = b"WXDAYS01"
+
+HEADER = np.dtype([
+    ("magic", "S8"),
+    ("first_day", "<i8"),
+    ("days", "<i8"),
+    ("columns", "<i8"),
+])
+
+VALUE = np.dtype("<f4")
+
+def day_number(sample_date):
+    """
+    Returns the number of days between 1970-01-01 and a "YYYY-M-D" style date.
+    """
+    year, month, day = date_parts(sample_date)
+
+    return int(np.datetime64(f"{year:04}-{month:02}-{day:02}", "D").astype(np.int64))
+
+class DailyStore():
+    """
+    DailyStore writes one file per station under `directory`. A file is a
+    32 byte header (magic, first day, number of days, number of columns)
+    followed by one row of float32 max, min, and mean temperatures per day,
+    from the station's first stored day to its last. Row i is the day i days
+    after the first, and days without data are NaN.
+
+    Files are read through read-only memory maps, so a date is found by
+    arithmetic and a range read is a slice of the map, with no copy. Every
+    process reading the same file shares its pages in the OS page cache.
+    A map is reopened when its file is replaced or grows.
+    """
+
+    def __init__(self, directory="daily_store"):
+        """
+        Initializes DailyStore.
+        """
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.maps = {}
+
+    def path(self, station_id):
+        """
+        Returns the path of a station's file.
+        """
+        return os.path.join(self.directory, f"{station_id}.days")
+
+    def build(self, db, station_id):
+        """
+        Writes a station's file from scratch out of the database
+        behind `db` (a DBOperations).
+        """
+        try:
+            columns = db.fetch_columns(
+                "0001-01-01", "9999-12-31", TEMPERATURE_COLUMNS, station_id
+            )
+
+            days = columns["dates"].astype(np.int64)
+
+            if len(days) == 0:
+                return
+
+            values = np.column_stack([columns[column] for column in TEMPERATURE_COLUMNS])
+
+            table = np.full((days[-1] - days[0] + 1, len(TEMPERATURE_COLUMNS)), np.nan, VALUE)
+            table[days - days[0]] = values
+
+            with self.lock:
+                self.write_file(station_id, days[0], table)
+
+        except Exception as error:
+            report_error("DailyStore::build", error)
+
+    def sync(self, station_months, db):
+        """
+        Writes saved (station_id, MonthRecord or weather dictionary) pairs
+        into the station files. A station without a file yet gets one built
+        from `db`, which already holds the saved days.
+        """
+        try:
+            stations = {}
+
+            for station_id, weather_dictionary in station_months:
+                days, values = stations.setdefault(station_id, ([], []))
+
+                if isinstance(weather_dictionary, MonthRecord):
+                    first_day = day_number(f"{weather_dictionary.year}-{weather_dictionary.month}-1")
+
+                    days.extend(first_day + day - 1 for day in weather_dictionary.days)
+                    values.extend(zip(
+                        weather_dictionary.max_temps,
+                        weather_dictionary.min_temps,
+                        weather_dictionary.mean_temps,
+                    ))
+                    continue
+
+                for sample_date, daily_temps in (weather_dictionary or {}).items():
+                    days.append(day_number(sample_date))
+                    values.append((
+                        float(daily_temps["Max"]),
+                        float(daily_temps["Min"]),
+                        float(daily_temps["Mean"]),
+                    ))
+
+            with self.lock:
+                for station_id, (days, values) in stations.items():
+                    if not days:
+                        continue
+
+                    if os.path.exists(self.path(station_id)):
+                        self.write(station_id, np.array(days, np.int64), np.array(values, VALUE))
+                    else:
+                        self.build(db, station_id)
+
+        except Exception as error:
+            report_error("DailyStore::sync", error)
+
+    def write(self, station_id, days, values):
+        """
+        Writes rows of values for the given day numbers into an existing
+        file. Days past the end grow the file in place; days before the
+        start rewrite it.
+        """
+        path = self.path(station_id)
+        header = np.fromfile(path, HEADER, count=1)[0]
+
+        first_day = int(header["first_day"])
+        stored = int(header["days"])
+
+        if days.min() < first_day:
+            table = np.full(
+                (first_day + stored - days.min(), len(TEMPERATURE_COLUMNS)), np.nan, VALUE
+            )
+            table[first_day - days.min():] = self.columns(station_id)
+            table[days - days.min()] = values
+
+            self.write_file(station_id, days.min(), table)
+            return
+
+        total = max(stored, int(days.max()) - first_day + 1)
+
+        if total > stored:
+            with open(path, "r+b") as store_file:
+                store_file.truncate(HEADER.itemsize + total * len(TEMPERATURE_COLUMNS) * VALUE.itemsize)
+
+        table = np.memmap(
+            path, VALUE, "r+", offset=HEADER.itemsize, shape=(total, len(TEMPERATURE_COLUMNS))
+        )
+        table[stored:] = np.nan
+        table[days - first_day] = values
+        table.flush()
+
+        if total > stored:
+            header = np.memmap(path, HEADER, "r+", shape=(1,))
+            header["days"] = total
+            header.flush()
+
+    def write_file(self, station_id, first_day, table):
+        """
+        Writes a whole file to a temporary name and renames it into place,
+        so that readers keep a consistent map of the old file.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        header = np.zeros(1, HEADER)
+        header["magic"] = MAGIC
+        header["first_day"] = first_day
+        header["days"] = len(table)
+        header["columns"] = len(TEMPERATURE_COLUMNS)
+
+        path = self.path(station_id)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(temp_path, "wb") as store_file:
+            store_file.write(header.tobytes())
+            store_file.write(np.ascontiguousarray(table, VALUE).tobytes())
+
+        os.replace(temp_path, path)
+
+    def open(self, station_id):
+        """
+        Returns the first day number and the (days, 3) array of a station's
+        file, mapped read-only, or None if there is no file.
+        """
+        path = self.path(station_id)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (stat.st_ino, stat.st_size)
+
+        with self.lock:
+            mapped = self.maps.get(station_id)
+
+            if mapped is None or mapped[0] != key:
+                raw = np.memmap(path, np.uint8, "r")
+
+                if bytes(raw[:len(MAGIC)]) != MAGIC:
+                    raise ValueError(f"{path} is not a daily store file")
+
+                mapped = (key, raw)
+                self.maps[station_id] = mapped
+
+        raw = mapped[1]
+        header = raw[:HEADER.itemsize].view(HEADER)[0]
+
+        days = int(header["days"])
+        size = days * len(TEMPERATURE_COLUMNS) * VALUE.itemsize
+
+        table = raw[HEADER.itemsize:HEADER.itemsize + size].view(VALUE)
+
+        return int(header["first_day"]), table.reshape(days, len(TEMPERATURE_COLUMNS))
+
+    def columns(self, station_id):
+        """
+        Returns every stored day of a station as a (days, 3) array.
+        """
+        opened = self.open(station_id)
+
+        return None if opened is None else opened[1]
+
+    def read(self, station_id, start_date, end_date):
+        """
+        Returns a station's days between two dates in the same form as
+        DBOperations.fetch_columns(): a datetime64[D] array under "dates"
+        and a float32 array per temperature column. The columns are views
+        of the map, not copies, and the range is clipped to the stored days.
+        """
+        try:
+            opened = self.open(station_id)
+
+            if opened is None:
+                return None
+
+            first_day, table = opened
+
+            start = min(max(day_number(start_date) - first_day, 0), len(table))
+            stop = min(max(day_number(end_date) - first_day + 1, start), len(table))
+
+            result = {
+                "dates": np.arange(first_day + start, first_day + stop).astype("datetime64[D]")
+            }
+
+            for index, column in enumerate(TEMPERATURE_COLUMNS):
+                result[column] = table[start:stop, index]
+
+            return result
+
+        except Exception as error:
+            report_error("DailyStore::read", error)
+
+    def day(self, station_id, sample_date):
+        """
+        Returns the (max, min, mean) temperatures of one day,
+        NaN where there is no data.
+        """
+        try:
+            opened = self.open(station_id)
+
+            if opened is None:
+                return None
+
+            first_day, table = opened
+            index = day_number(sample_date) - first_day
+
+            if not 0 <= index < len(table):
+                return (np.nan, np.nan, np.nan)
+
+            return tuple(float(value) for value in table[index])
+
+        except Exception as error:
+            report_error("DailyStore::day", error)
+
+    def remove(self, station_id=None):
+        """
+        Deletes one station's file, or every file.
+        """
+        with self.lock:
+            if station_id is None:
+                names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+                paths = [os.path.join(self.directory, name) for name in names if name.endswith(".days")]
+                self.maps = {}
+            else:
+                paths = [self.path(station_id)]
+                self.maps.pop(station_id, None)
+
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
@@ -3,137 +3,802 @@ This module holds DBOperations which handles
 interactions with the database
 """
 
-from dbcm import DBCM
+import threading
+from collections import OrderedDict
+from datetime import date
+from dbcm import DBCM, ConnectionManager
+from metrics import METRICS, report_error
+from month_record import MonthRecord
+from stations import DEFAULT_STATION_ID, DEFAULT_STATION_NAME
+
+SCHEMA_VERSION = 2
+
+WEATHER_TABLE = (
+    """
+    create table {name}
+    (id integer primary key autoincrement not null,
+    station_id integer not null,
+    sample_date text not null,
+    date_key integer not null,
+    year integer not null,
+    month integer not null,
+    day integer not null,
+    location text not null,
+    min_temp real not null,
+    max_temp real not null,
+    avg_temp real not null,
+    UNIQUE (station_id, date_key));
+    """
+)
+
+TEMPERATURE_COLUMNS = ("max_temp", "min_temp", "avg_temp")
+
+SETTLED_AFTER_DAYS = 45
+
+def date_parts(sample_date):
+    """
+    Splits a "YYYY-M-D" style date (padded or not) into integer
+    year, month, and day.
+    """
+    year, month, day = str(sample_date).strip().split("-")[:3]
+
+    return int(year), int(month), int(day)
+
+def date_key(sample_date):
+    """
+    Returns the integer YYYYMMDD key for a date. Keys sort in
+    calendar order, unlike dates whose parts are not zero-padded.
+    """
+    year, month, day = date_parts(sample_date)
+
+    return year * 10000 + month * 100 + day
 
 class DBOperations():
     """
     DBOperations handles interactions with the database.
     """
 
-    def __init__(self):
+    def __init__(self, cache_size=128):
         """
-        Initializes the DBOperations Class.
+        Initializes the DBOperations Class. The results of the last
+        `cache_size` distinct fetches are kept in memory. When a DailyStore
+        is set as `daily_store` it is kept in sync with every save.
         """
         self.app_database = "weather.sqlite"
+        self.daily_store = None
+
+        self.cache_size = cache_size
+        self.query_cache = OrderedDict()
+        self.query_cache_lock = threading.Lock()
 
-    def fetch_data(self, start_date, finish_date):
+    def cached(self, key, query):
         """
-        Fetches sample_dates and mean
-        temperatures between two dates.
+        Returns the result of `query` for `key` from the query cache, or runs
+        it and caches the result. Entries are only used while the database's
+        write generation is unchanged, so any write, by this process or
+        another one, makes them stale. The least recently used entries are
+        dropped once there are more than `cache_size`.
         """
-        with DBCM(self.app_database) as cursor:
+        manager = ConnectionManager.for_database(self.app_database)
+        generation = manager.current_generation()
+        key = (manager.app_database,) + key
+
+        with self.query_cache_lock:
+            entry = self.query_cache.get(key)
+
+            if entry is not None and entry[0] == generation:
+                self.query_cache.move_to_end(key)
+                METRICS.increment("query_cache", result="hit")
+                return entry[1]
+
+        METRICS.increment("query_cache", result="miss")
+
+        result = query()
+
+        if result is not None and self.cache_size:
+            with self.query_cache_lock:
+                self.query_cache[key] = (generation, result)
+                self.query_cache.move_to_end(key)
+
+                while len(self.query_cache) > self.cache_size:
+                    self.query_cache.popitem(last=False)
+
+        return result
+
+    def clear_cache(self):
+        """
+        Empties the query cache.
+        """
+        with self.query_cache_lock:
+            self.query_cache.clear()
+
+    def fetch_data(self, start_date, finish_date, station_id=DEFAULT_STATION_ID):
+        """
+        Fetches sample_dates and mean temperatures
+        between two dates for one station, through the query cache.
+        """
+        try:
+            rows = self.cached(
+                ("fetch_data", station_id, start_date, finish_date),
+                lambda: self.select_data(start_date, finish_date, station_id)
+            )
+
+            return None if rows is None else list(rows)
+
+        except Exception as error:
+            report_error("DBOperations::fetch_data", error)
+
+    def select_data(self, start_date, finish_date, station_id=DEFAULT_STATION_ID):
+        """
+        Selects sample_dates and mean temperatures
+        between two dates for one station.
+        """
+        with METRICS.timer("db_query", query="fetch_data"), \
+                DBCM(self.app_database, read_only=True) as cursor:
             try:
                 sql_select = (
                     """
                     SELECT sample_date, avg_temp
                     FROM weather
-                    WHERE sample_date
-                    BETWEEN date(?) AND date(?)
+                    WHERE station_id = ?
+                    AND date_key BETWEEN ? AND ?
+                    ORDER BY date_key
                     """
                 )
 
-                dates = [start_date, finish_date]
+                parameters = [station_id, date_key(start_date), date_key(finish_date)]
+
+                cursor.execute(sql_select, parameters)
+
+                return cursor.fetchall()
+
+            except Exception as error:
+                report_error("DBOperations::select_data", error)
+
+    def fetch_days(self, start_date, finish_date, station_id=DEFAULT_STATION_ID):
+        """
+        Fetches sample_dates with the max, min, and mean temperatures
+        between two dates for one station, through the query cache.
+        """
+        try:
+            rows = self.cached(
+                ("fetch_days", station_id, start_date, finish_date),
+                lambda: self.select_days(start_date, finish_date, station_id)
+            )
+
+            return None if rows is None else list(rows)
+
+        except Exception as error:
+            report_error("DBOperations::fetch_days", error)
+
+    def select_days(self, start_date, finish_date, station_id=DEFAULT_STATION_ID):
+        """
+        Selects sample_dates with the max, min, and mean temperatures
+        between two dates for one station.
+        """
+        with METRICS.timer("db_query", query="fetch_days"), \
+                DBCM(self.app_database, read_only=True) as cursor:
+            try:
+                sql_select = (
+                    """
+                    SELECT sample_date, max_temp, min_temp, avg_temp
+                    FROM weather
+                    WHERE station_id = ?
+                    AND date_key BETWEEN ? AND ?
+                    ORDER BY date_key
+                    """
+                )
+
+                parameters = [station_id, date_key(start_date), date_key(finish_date)]
+
+                cursor.execute(sql_select, parameters)
+
+                return cursor.fetchall()
+
+            except Exception as error:
+                report_error("DBOperations::select_days", error)
+
+    def page_days(self, start_date, finish_date, station_id=DEFAULT_STATION_ID,
+                  page_rows=5000):
+        """
+        Yields the same rows as fetch_days, `page_rows` at a time, each page
+        read in its own short transaction and resumed after the last date
+        key of the one before. Pages skip the query cache, so a long range
+        is never held in memory at once. Errors are reported and raised,
+        as a page may fail after earlier ones were used.
+        """
+        first_key = date_key(start_date)
+        last_key = date_key(finish_date)
 
-                cursor.execute(sql_select, dates)
+        while first_key <= last_key:
+            rows = self.select_day_page(first_key, last_key, station_id, page_rows)
+
+            if rows:
+                yield rows
+
+            if len(rows) < page_rows:
+                return
+
+            first_key = date_key(rows[-1][0]) + 1
+
+    def select_day_page(self, first_key, last_key, station_id, limit):
+        """
+        Selects up to `limit` days of one station from `first_key` on.
+        """
+        with METRICS.timer("db_query", query="page_days"), \
+                DBCM(self.app_database, read_only=True) as cursor:
+            try:
+                sql_select = (
+                    """
+                    SELECT sample_date, max_temp, min_temp, avg_temp
+                    FROM weather
+                    WHERE station_id = ?
+                    AND date_key BETWEEN ? AND ?
+                    ORDER BY date_key
+                    LIMIT ?
+                    """
+                )
+
+                cursor.execute(sql_select, [station_id, first_key, last_key, limit])
 
                 return cursor.fetchall()
 
             except Exception as error:
-                print(f"DBOperations::fetch_data::{error}")
+                report_error("DBOperations::select_day_page", error)
+                raise
+
+    def fetch_columns(self, start_date, finish_date, columns=("avg_temp",),
+                      station_id=DEFAULT_STATION_ID):
+        """
+        Fetches one station's days between two dates as columns rather than rows.
+        Returns a dictionary holding a datetime64[D] array under "dates"
+        and a float32 array for each requested temperature column. Results
+        come through the query cache, so the arrays are read-only.
+        """
+        try:
+            columns = tuple(columns)
+
+            result = self.cached(
+                ("fetch_columns", station_id, start_date, finish_date, columns),
+                lambda: self.select_columns(start_date, finish_date, columns, station_id)
+            )
+
+            return None if result is None else dict(result)
+
+        except Exception as error:
+            report_error("DBOperations::fetch_columns", error)
+
+    def select_columns(self, start_date, finish_date, columns=("avg_temp",),
+                       station_id=DEFAULT_STATION_ID):
+        """
+        Selects one station's days between two dates as read-only columns.
+        """
+        with METRICS.timer("db_query", query="fetch_columns"), \
+                DBCM(self.app_database, read_only=True) as cursor:
+            try:
+                for column in columns:
+                    if column not in TEMPERATURE_COLUMNS:
+                        raise ValueError(f"Unknown column {column}")
+
+                sql_select = (
+                    f"""
+                    SELECT date_key, {", ".join(columns)}
+                    FROM weather
+                    WHERE station_id = ?
+                    AND date_key BETWEEN ? AND ?
+                    ORDER BY date_key
+                    """
+                )
+
+                parameters = [station_id, date_key(start_date), date_key(finish_date)]
+
+                cursor.execute(sql_select, parameters)
+
+                # Imported here so that commands which never build arrays
+                # do not pay for loading numpy.
+                import numpy as np
+
+                dtype = [("date_key", np.int32)] + [(column, np.float32) for column in columns]
+                table = np.fromiter(cursor, dtype=dtype)
+
+                keys = table["date_key"]
+                years = keys // 10000
+                months = keys // 100 % 100
+                days = keys % 100
+
+                dates = (years - 1970).astype("datetime64[Y]").astype("datetime64[M]")
+                dates = dates + (months - 1).astype("timedelta64[M]")
+                dates = dates.astype("datetime64[D]") + (days - 1).astype("timedelta64[D]")
+
+                result = {"dates": dates}
+                for column in columns:
+                    result[column] = np.ascontiguousarray(table[column])
+
+                for array in result.values():
+                    array.setflags(write=False)
+
+                return result
+
+            except Exception as error:
+                report_error("DBOperations::select_columns", error)
+
+    def fetch_summary(self, start_date, finish_date, station_id=DEFAULT_STATION_ID):
+        """
+        Fetches the number of days, the first and last dates, the average
+        mean temperature, and the lowest min and highest max temperatures
+        between two dates for one station, through the query cache.
+        """
+        try:
+            return self.cached(
+                ("fetch_summary", station_id, start_date, finish_date),
+                lambda: self.select_summary(start_date, finish_date, station_id)
+            )
+
+        except Exception as error:
+            report_error("DBOperations::fetch_summary", error)
+
+    def select_summary(self, start_date, finish_date, station_id=DEFAULT_STATION_ID):
+        """
+        Selects the summary of one station's days between two dates.
+        """
+        with METRICS.timer("db_query", query="fetch_summary"), \
+                DBCM(self.app_database, read_only=True) as cursor:
+            try:
+                sql_select = (
+                    """
+                    SELECT COUNT(*), MIN(sample_date), MAX(sample_date),
+                        AVG(avg_temp), MIN(min_temp), MAX(max_temp)
+                    FROM weather
+                    WHERE station_id = ?
+                    AND date_key BETWEEN ? AND ?
+                    """
+                )
+
+                parameters = [station_id, date_key(start_date), date_key(finish_date)]
+
+                cursor.execute(sql_select, parameters)
+
+                return cursor.fetchone()
+
+            except Exception as error:
+                report_error("DBOperations::select_summary", error)
 
-    def save_data(self, weather_dictionary):
+    def save_data(self, weather_dictionary, station_id=DEFAULT_STATION_ID):
         """
         Extracts dictionary data and saves each "row" to the database.
         """
-        with DBCM(self.app_database) as cursor:
+        self.save_many([weather_dictionary], station_id)
+
+    def save_many(self, weather_dictionaries, station_id=DEFAULT_STATION_ID):
+        """
+        Saves the rows of many weather dictionaries (one per month)
+        for one station in a single transaction, or none of them.
+        """
+        self.save_station_months(
+            (station_id, weather_dictionary) for weather_dictionary in weather_dictionaries
+        )
+
+    def save_station_months(self, station_months, fetches=()):
+        """
+        Saves (station_id, weather dictionary) pairs with a single executemany
+        in one transaction. Days that are already in the database are
+        overwritten, so saving the same range twice is harmless. Stations
+        that are not registered yet are registered under their id.
+
+        `fetches` holds a (station_id, year, month, rows) entry for every
+        month that was downloaded, even ones with no usable rows, and is
+        written to the fetch log in the same transaction.
+
+        If any row fails, nothing is saved and the error is raised.
+        """
+        saved = False
+
+        with METRICS.timer("db_write"), DBCM(self.app_database) as cursor:
             try:
-                insert_sql = (
+                station_months = [
+                    (station_id, weather_dictionary)
+                    for station_id, weather_dictionary in station_months
+                    if weather_dictionary
+                ]
+
+                station_ids = {station_id for station_id, _ in station_months}
+
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO stations (station_id, name) VALUES (?,?)",
+                    [(station_id, f"Station {station_id}") for station_id in station_ids]
+                )
+
+                cursor.execute("SELECT station_id, name FROM stations")
+                locations = dict(cursor.fetchall())
+
+                upsert_sql = (
                     """
                     INSERT INTO weather
-                    (sample_date, max_temp, min_temp, avg_temp, location)
-                    VALUES (?,?,?,?,?)
+                    (station_id, sample_date, date_key, year, month, day,
+                    max_temp, min_temp, avg_temp, location)
+                    VALUES (?,?,?,?,?,?,?,?,?,?)
+                    ON CONFLICT(station_id, date_key) DO UPDATE SET
+                    max_temp = excluded.max_temp,
+                    min_temp = excluded.min_temp,
+                    avg_temp = excluded.avg_temp,
+                    location = excluded.location
+                    """
+                )
+
+                cursor.executemany(upsert_sql, self.rows(station_months, locations))
+
+                METRICS.increment("db_rows_written", cursor.rowcount)
+
+                cursor.executemany(
                     """
+                    INSERT INTO fetch_log (station_id, year, month, fetched_on, rows)
+                    VALUES (?,?,?,?,?)
+                    ON CONFLICT(station_id, year, month) DO UPDATE SET
+                    fetched_on = excluded.fetched_on,
+                    rows = excluded.rows
+                    """,
+                    [
+                        (station_id, year, month, date.today().isoformat(), rows)
+                        for station_id, year, month, rows in fetches
+                    ]
+                )
+
+                saved = True
+
+            except Exception as error:
+                report_error("DBOperations::save_station_months", error)
+                raise
+
+        if saved and self.daily_store is not None:
+            self.daily_store.sync(station_months, self)
+
+    @staticmethod
+    def rows(station_months, locations):
+        """
+        Yields one (station, date, date key, year, month, day, max, min, mean,
+        location) row per day. Dates are stored zero-padded. MonthRecords
+        give their rows directly; weather dictionaries have their dates split.
+        """
+        for station_id, weather_dictionary in station_months:
+            location = locations[station_id]
+
+            if isinstance(weather_dictionary, MonthRecord):
+                yield from weather_dictionary.rows(station_id, location)
+                continue
+
+            for sample_date, daily_temps in weather_dictionary.items():
+                year, month, day = date_parts(sample_date)
+
+                yield (
+                    station_id,
+                    f"{year:04}-{month:02}-{day:02}",
+                    year * 10000 + month * 100 + day,
+                    year,
+                    month,
+                    day,
+                    daily_temps["Max"],
+                    daily_temps["Min"],
+                    daily_temps["Mean"],
+                    location
                 )
 
-                for weather, daily_temps in weather_dictionary.items():
-                    try:
-                        data = []
-                        data.append(weather)
-                        for value in daily_temps.values():
-                            try:
-                                data.append(value)
-                            except Exception as error:
-                                print(f"DBOperations::save_date::inner for loop::{error}")
+    def register_station(self, station_id, name):
+        """
+        Adds a station to the registry or renames it.
+        """
+        with DBCM(self.app_database) as cursor:
+            try:
+                cursor.execute(
+                    """
+                    INSERT INTO stations (station_id, name) VALUES (?,?)
+                    ON CONFLICT(station_id) DO UPDATE SET name = excluded.name
+                    """,
+                    [station_id, name]
+                )
 
-                        data.append("Winnipeg, MB")
-                        cursor.execute(insert_sql, data)
+            except Exception as error:
+                report_error("DBOperations::register_station", error)
 
-                    except Exception as error:
-                        print(f"DBOperations::save_data::outer for loop::{error}")
+    def stations(self):
+        """
+        Returns the registered stations as (station_id, name) tuples.
+        """
+        with DBCM(self.app_database, read_only=True) as cursor:
+            try:
+                cursor.execute("SELECT station_id, name FROM stations ORDER BY station_id")
+                return cursor.fetchall()
 
             except Exception as error:
-                print(f"DBOperations::save_data::main::{error}")
+                report_error("DBOperations::stations", error)
 
     def initialize_db(self):
         """
-        Creates the weather database and table.
+        Creates the weather database, the weather and stations tables, and
+        brings databases made by older versions up to date.
+        """
+        with DBCM(self.app_database) as cursor:
+            try:
+                cursor.execute(
+                    "SELECT COUNT(1) FROM sqlite_master WHERE type = 'table' AND name = 'weather'"
+                )
+
+                if cursor.fetchone()[0]:
+                    self.migrate(cursor)
+                else:
+                    cursor.execute(WEATHER_TABLE.format(name="weather"))
+                    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+                cursor.execute(
+                    """
+                    create table if not exists stations
+                    (station_id integer primary key not null,
+                    name text not null);
+                    """
+                )
+
+                cursor.execute(
+                    "INSERT OR IGNORE INTO stations (station_id, name) VALUES (?,?)",
+                    [DEFAULT_STATION_ID, DEFAULT_STATION_NAME]
+                )
+
+                cursor.execute(
+                    """
+                    create table if not exists fetch_log
+                    (station_id integer not null,
+                    year integer not null,
+                    month integer not null,
+                    fetched_on text not null,
+                    rows integer not null,
+                    PRIMARY KEY (station_id, year, month));
+                    """
+                )
+
+                cursor.execute(
+                    """
+                    create index if not exists weather_station_date
+                    on weather (station_id, date_key, avg_temp, max_temp, min_temp, sample_date);
+                    """
+                )
+
+            except Exception as error:
+                report_error("DBOperations::initialize_db", error)
+
+    def migrate(self, cursor):
+        """
+        Upgrades a weather table made by an older version, one schema
+        version at a time.
+        """
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+
+        if version < 1:
+            self.migrate_date_key(cursor)
+
+        if version < 2:
+            self.migrate_station_key(cursor)
+
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @staticmethod
+    def migrate_date_key(cursor):
+        """
+        Upgrades a weather table made before sample dates were zero-padded
+        and keyed: adds the date_key, year, month, and day columns, fills
+        them in, and rewrites sample_date in YYYY-MM-DD form. If two rows
+        turn out to be the same day the most recently inserted one is kept.
+        """
+        cursor.execute("PRAGMA table_info(weather)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        for column in ("date_key", "year", "month", "day"):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE weather ADD COLUMN {column} integer")
+
+        cursor.execute("SELECT id, sample_date FROM weather ORDER BY id")
+
+        keep = {}
+        for row_id, sample_date in cursor.fetchall():
+            keep[date_parts(sample_date)] = row_id
+
+        kept_ids = set(keep.values())
+        cursor.execute("SELECT id FROM weather")
+        duplicates = [(row_id,) for (row_id,) in cursor.fetchall() if row_id not in kept_ids]
+        cursor.executemany("DELETE FROM weather WHERE id = ?", duplicates)
+
+        # Give every row a temporary unique date first so that padding
+        # one row's date can never collide with another row's old date.
+        cursor.execute("UPDATE weather SET sample_date = 'migrating-' || id")
+        cursor.executemany(
+            """
+            UPDATE weather
+            SET sample_date = ?, date_key = ?, year = ?, month = ?, day = ?
+            WHERE id = ?
+            """,
+            [
+                (
+                    f"{year:04}-{month:02}-{day:02}",
+                    year * 10000 + month * 100 + day,
+                    year,
+                    month,
+                    day,
+                    row_id
+                )
+                for (year, month, day), row_id in keep.items()
+            ]
+        )
+
+    @staticmethod
+    def migrate_station_key(cursor):
+        """
+        Rebuilds a single-station weather table so that rows are keyed by
+        (station_id, date_key) instead of a globally unique sample_date.
+        Existing rows belong to the default station.
+        """
+        cursor.execute("DROP TABLE IF EXISTS weather_migrating")
+        cursor.execute(WEATHER_TABLE.format(name="weather_migrating"))
+        cursor.execute(
+            """
+            INSERT INTO weather_migrating
+            (id, station_id, sample_date, date_key, year, month, day,
+            location, min_temp, max_temp, avg_temp)
+            SELECT id, ?, sample_date, date_key, year, month, day,
+            location, min_temp, max_temp, avg_temp
+            FROM weather
+            """,
+            [DEFAULT_STATION_ID]
+        )
+        cursor.execute("DROP TABLE weather")
+        cursor.execute("ALTER TABLE weather_migrating RENAME TO weather")
+
+    def purge_station(self, station_id=DEFAULT_STATION_ID):
+        """
+        Deletes one station's days, fetch log, and derived rows in a single
+        transaction, and its daily store file if there is one. Every other
+        station is left alone.
         """
         with DBCM(self.app_database) as cursor:
             try:
                 cursor.execute(
                     """
-                    create table if not exists weather
-                    (id integer primary key autoincrement not null,
-                    sample_date text not null UNIQUE,
-                    location text not null,
-                    min_temp real not null,
-                    max_temp real not null,
-                    avg_temp real not null);
+                    SELECT name FROM sqlite_master
+                    WHERE type = 'table'
+                    AND name IN ('weather', 'fetch_log', 'normals', 'daily_analytics')
                     """
                 )
 
+                for (table,) in cursor.fetchall():
+                    cursor.execute(f"DELETE FROM {table} WHERE station_id = ?", [station_id])
+
             except Exception as error:
-                print(f"DBOperations::initialize_db::{error}")
+                report_error("DBOperations::purge_station", error)
+                raise
+
+        if self.daily_store is not None:
+            self.daily_store.remove(station_id)
 
     def purge_data(self):
         """
-        Drops the weather table from the database.
+        Drops the weather table, the fetch log, and the tables derived
+        from them from the database, and empties the daily store if there
+        is one, for every station. The station registry is kept.
         """
         with DBCM(self.app_database) as cursor:
             try:
                 cursor.execute("""drop table weather;""")
+                cursor.execute("""drop table if exists fetch_log;""")
+                cursor.execute("""drop table if exists normals;""")
+                cursor.execute("""drop table if exists daily_analytics;""")
 
             except Exception as error:
-                print(f"DBOperations::purge_data::{error}")
+                report_error("DBOperations::purge_data", error)
 
-    def count_rows_in_table(self):
+        if self.daily_store is not None:
+            self.daily_store.remove()
+
+    def count_rows_in_table(self, station_id=None):
         """
-        Returns 0 if there are no rows in the table.
+        Returns 0 if there are no rows in the table (for
+        one station if `station_id` is given).
         """
-        with DBCM(self.app_database) as cursor:
+        with DBCM(self.app_database, read_only=True) as cursor:
             try:
-                cursor.execute("""SELECT COUNT(1) FROM weather;""")
+                if station_id is None:
+                    cursor.execute("""SELECT COUNT(1) FROM weather;""")
+                else:
+                    cursor.execute(
+                        """SELECT COUNT(1) FROM weather WHERE station_id = ?;""",
+                        [station_id]
+                    )
+
                 return cursor.fetchone()
 
             except Exception as error:
-                print(f"DBOperations::count_rows_in_table::{error}")
+                report_error("DBOperations::count_rows_in_table", error)
 
-    def most_recent_date(self):
+    def most_recent_date(self, station_id=DEFAULT_STATION_ID):
         """
-        Returns the most recent date from the database.
+        Returns the most recent date from the database for a station.
         """
-        with DBCM(self.app_database) as cursor:
+        with DBCM(self.app_database, read_only=True) as cursor:
             try:
                 sql_select = (
                     """
                     SELECT MAX(sample_date)
                     FROM weather
+                    WHERE station_id = ?
                     """
                 )
 
-                cursor.execute(sql_select)
+                cursor.execute(sql_select, [station_id])
 
                 return cursor.fetchone()
 
             except Exception as error:
-                print(f"DBOperations::most_recent_date::{error}")
+                report_error("DBOperations::most_recent_date", error)
+
+    def gaps(self, station_id=DEFAULT_STATION_ID, today=None,
+             settled_after_days=SETTLED_AFTER_DAYS):
+        """
+        Returns the (year, month) pairs, newest first, that are worth
+        downloading again for a station: every month from its first stored
+        month up to the current one that is missing days, unless it was
+        already downloaded `settled_after_days` after it ended. Such a month
+        will not change any more, so days left out for "M" or "E" flags are
+        not asked for again. Months still open to corrections, like the
+        current one, are returned until they are complete or settled.
+        """
+        with METRICS.timer("db_query", query="gaps"), \
+                DBCM(self.app_database, read_only=True) as cursor:
+            try:
+                today = today or date.today()
+
+                sql_select = (
+                    """
+                    WITH RECURSIVE
+                    present(month_key, days) AS (
+                        SELECT date_key / 100, COUNT(1)
+                        FROM weather
+                        WHERE station_id = :station_id
+                        GROUP BY date_key / 100
+                    ),
+                    months(year, month) AS (
+                        SELECT MIN(month_key) / 100, MIN(month_key) % 100
+                        FROM present
+                        HAVING COUNT(1) > 0
+                        UNION ALL
+                        SELECT year + (month = 12), month % 12 + 1
+                        FROM months
+                        WHERE year * 100 + month < :current
+                    ),
+                    spans(year, month, last_day) AS (
+                        SELECT year, month,
+                        date(printf('%04d-%02d-01', year, month), '+1 month', '-1 day')
+                        FROM months
+                    )
+                    SELECT spans.year, spans.month
+                    FROM spans
+                    LEFT JOIN present
+                    ON present.month_key = spans.year * 100 + spans.month
+                    LEFT JOIN fetch_log
+                    ON fetch_log.station_id = :station_id
+                    AND fetch_log.year = spans.year
+                    AND fetch_log.month = spans.month
+                    WHERE COALESCE(present.days, 0) < CAST(strftime('%d', spans.last_day) AS INTEGER)
+                    AND (fetch_log.fetched_on IS NULL
+                        OR fetch_log.fetched_on <= date(spans.last_day, :settled))
+                    ORDER BY spans.year DESC, spans.month DESC
+                    """
+                )
+
+                parameters = {
+                    "station_id": station_id,
+                    "current": today.year * 100 + today.month,
+                    "settled": f"+{settled_after_days} days",
+                }
+
+                cursor.execute(sql_select, parameters)
+
+                return cursor.fetchall()
+
+            except Exception as error:
+                report_error("DBOperations::gaps", error)
@@ -1,9 +1,179 @@
 """
 This module holds the context manager which allows for a
-more robust connection to the database.
+more robust connection to the database, and the ConnectionManager
+which keeps those connections open for the life of the process.
 """
 
+import atexit
+import os
 import sqlite3
+import threading
+from urllib.request import pathname2url
+from metrics import report_error
+
+class ConnectionManager():
+    """
+    ConnectionManager keeps one write connection per database open for the
+    life of the process, plus one read-only connection per thread so that
+    queries can run while another thread is writing. The database is put in
+    WAL mode so readers never block the writer or each other.
+
+    Its write generation counts the commits made to the database, by this
+    process or any other, so that cached query results can tell when they
+    are out of date.
+    """
+
+    PRAGMAS = (
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -32768",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA temp_store = MEMORY",
+    )
+
+    managers = {}
+    managers_lock = threading.Lock()
+
+    def __init__(self, app_database, cached_statements=256, timeout=30):
+        """
+        Initializes the ConnectionManager and opens the write connection.
+        `cached_statements` sets the size of each connection's prepared
+        statement cache.
+        """
+        self.app_database = os.path.abspath(app_database)
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+
+        self.write_lock = threading.RLock()
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+
+        self.generation = 0
+        self.generation_lock = threading.Lock()
+        self.watcher = None
+        self.data_version = None
+
+        self.writer = self.connect(read_only=False)
+        self.writer.execute("PRAGMA journal_mode = WAL")
+
+    @classmethod
+    def for_database(cls, app_database):
+        """
+        Returns the ConnectionManager shared by everything in this process
+        that uses the database, creating it on first use. A forked child
+        process gets its own manager rather than its parent's connections.
+        """
+        key = (os.path.abspath(app_database), os.getpid())
+
+        with cls.managers_lock:
+            manager = cls.managers.get(key)
+
+            if manager is None:
+                manager = cls(app_database)
+                cls.managers[key] = manager
+
+            return manager
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes every connection opened by this process.
+        """
+        with cls.managers_lock:
+            managers = [
+                manager for (_, pid), manager in cls.managers.items() if pid == os.getpid()
+            ]
+            cls.managers = {}
+
+        for manager in managers:
+            manager.close()
+
+    def connect(self, read_only):
+        """
+        Opens a connection with the tuned PRAGMAs applied.
+        """
+        if read_only:
+            conn = sqlite3.connect(
+                f"file:{pathname2url(self.app_database)}?mode=ro",
+                uri=True,
+                timeout=self.timeout,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(
+                self.app_database,
+                timeout=self.timeout,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+
+        return conn
+
+    def reader(self):
+        """
+        Returns the calling thread's read-only connection.
+        """
+        conn = getattr(self.local, "conn", None)
+
+        if conn is None:
+            conn = self.connect(read_only=True)
+            self.local.conn = conn
+
+            with self.readers_lock:
+                self.readers.append(conn)
+
+        return conn
+
+    def current_generation(self):
+        """
+        Returns the write generation. One connection, shared under a lock,
+        checks PRAGMA data_version, which changes whenever any other
+        connection commits, including this manager's writer. So every
+        commit moves the generation on exactly once, however many threads
+        ask. That check does not read any pages of the database.
+        """
+        with self.generation_lock:
+            if self.watcher is None:
+                self.watcher = self.connect(read_only=True)
+
+            data_version = self.watcher.execute("PRAGMA data_version").fetchone()[0]
+
+            if data_version != self.data_version:
+                self.data_version = data_version
+                self.generation = self.generation + 1
+
+            return self.generation
+
+    def close(self):
+        """
+        Closes the write connection and every read-only connection.
+        """
+        with self.readers_lock:
+            readers = self.readers
+            self.readers = []
+
+        with self.generation_lock:
+            if self.watcher is not None:
+                readers.append(self.watcher)
+                self.watcher = None
+
+        for conn in readers:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+        with self.write_lock:
+            self.writer.close()
+
+
+atexit.register(ConnectionManager.close_all)
+
 
 class DBCM():
     """
@@ -11,37 +181,55 @@ class DBCM():
     with the database.
     """
 
-    def __init__(self, app_database):
+    def __init__(self, app_database, read_only=False):
         """
-        Initializes attributes for the DBCM context manager.
+        Initializes attributes for the DBCM context manager. Read-only
+        contexts use the calling thread's read connection, all others
+        share the process's write connection one at a time.
         """
         try:
             self.database_configuration = app_database
+            self.read_only = read_only
+            self.manager = None
             self.conn = None
             self.cursor = None
         except Exception as error:
-            print(f"DBCM::__init__::{error}")
+            report_error("DBCM::__init__", error)
 
     def __enter__(self):
         """
-        Executes the setup code to connect to the database.
+        Executes the setup code to borrow a connection to the database.
         """
         try:
-            self.conn = sqlite3.connect(self.database_configuration)
+            self.manager = ConnectionManager.for_database(self.database_configuration)
+
+            if self.read_only:
+                self.conn = self.manager.reader()
+            else:
+                self.manager.write_lock.acquire()
+                self.conn = self.manager.writer
+
             self.cursor = self.conn.cursor()
 
             return self.cursor
         except Exception as error:
-            print(f"DBCM::__enter__::{error}")
+            report_error("DBCM::__enter__", error)
 
     def __exit__(self, exc_type, exc_value, exc_trace):
         """
-        Executes the teardown code to close the
-        connection to the database.
+        Executes the teardown code to commit (or roll back) the work done
+        and hand the connection back. The connection itself stays open.
         """
         try:
-            self.conn.commit()
+            if not self.read_only:
+                if exc_type is None:
+                    self.conn.commit()
+                else:
+                    self.conn.rollback()
+
             self.cursor.close()
-            self.conn.close()
         except Exception as error:
-            print(f"DBCM::__exit__::{error}")
+            report_error("DBCM::__exit__", error)
+        finally:
+            if not self.read_only and self.conn is not None:
+                self.manager.write_lock.release()
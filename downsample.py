@@ -0,0 +1,59 @@
+"""
+This module holds the Largest-Triangle-Three-Buckets algorithm used to
+shrink long series before they are plotted.
+"""
+
+def lttb(x_values, y_values, threshold):
+    """
+    Downsamples a series to `threshold` points with Largest-Triangle-Three-
+    Buckets. The first and last points are always kept and, for every bucket
+    in between, the point forming the largest triangle with the previously
+    kept point and the average of the next bucket is kept. Peaks and troughs
+    survive, so the line keeps its shape. Returns the kept x and y values.
+    """
+    length = len(x_values)
+
+    if threshold >= length or threshold < 3:
+        return list(x_values), list(y_values)
+
+    sampled_x = [x_values[0]]
+    sampled_y = [y_values[0]]
+
+    bucket_size = (length - 2) / (threshold - 2)
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+
+        next_count = next_end - next_start
+        average_x = sum(x_values[next_start:next_end]) / next_count
+        average_y = sum(y_values[next_start:next_end]) / next_count
+
+        point_x = x_values[previous]
+        point_y = y_values[previous]
+
+        largest_area = -1
+        chosen = start
+
+        for index in range(start, end):
+            area = abs(
+                (point_x - average_x) * (y_values[index] - point_y)
+                - (point_x - x_values[index]) * (average_y - point_y)
+            )
+
+            if area > largest_area:
+                largest_area = area
+                chosen = index
+
+        sampled_x.append(x_values[chosen])
+        sampled_y.append(y_values[chosen])
+        previous = chosen
+
+    sampled_x.append(x_values[-1])
+    sampled_y.append(y_values[-1])
+
+    return sampled_x, sampled_y
@@ -0,0 +1,469 @@
+"""
+This module holds HTTPSession which keeps a pool of persistent (keep-alive)
+connections so that repeated requests to the same host reuse them instead
+of paying for a new TCP and TLS handshake every time.
+"""
+
+import http.client
+import queue
+import ssl
+import threading
+import time
+import zlib
+from urllib.parse import urljoin, urlsplit
+from metrics import METRICS
+from scheduler import RETRY_STATUSES
+
+class HTTPResponse():
+    """
+    HTTPResponse holds the status, headers, and decoded body of a response.
+    """
+
+    def __init__(self, url, status, headers, body):
+        """
+        Initializes HTTPResponse. Header names are stored in lower case.
+        """
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def header(self, name, default=None):
+        """
+        Returns the value of a header regardless of the case of its name.
+        """
+        return self.headers.get(name.lower(), default)
+
+    def raise_for_status(self):
+        """
+        Raises HTTPStatusError if the response is not a success or a 304.
+        """
+        if self.status >= 400:
+            raise HTTPStatusError(self)
+
+
+class HTTPStatusError(Exception):
+    """
+    Raised when the server answers with an error status code.
+    """
+
+    def __init__(self, response):
+        """
+        Initializes HTTPStatusError with the response that caused it.
+        """
+        Exception.__init__(self, f"HTTP {response.status} for {response.url}")
+        self.response = response
+        self.status = response.status
+
+
+class DeflateDecompressor():
+    """
+    DeflateDecompressor decompresses a "deflate" body as it arrives. The
+    body should be zlib-wrapped, but some servers send raw deflate data,
+    so like HTTPSession.decode it reads it as zlib data and starts again
+    as raw deflate if the zlib header is refused.
+    """
+
+    def __init__(self):
+        """
+        Initializes DeflateDecompressor.
+        """
+        self.decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+        self.received = b""
+
+    def decompress(self, chunk):
+        """
+        Returns the decompressed data of the next chunk of the body.
+        """
+        if self.received is None:
+            return self.decompressor.decompress(chunk)
+
+        self.received = self.received + chunk
+
+        try:
+            data = self.decompressor.decompress(chunk)
+        except zlib.error:
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = self.decompressor.decompress(self.received)
+
+        # The two byte zlib header is checked as soon as it is complete.
+        if len(self.received) >= 2:
+            self.received = None
+
+        return data
+
+    def flush(self):
+        """
+        Returns whatever decompressed data is left.
+        """
+        return self.decompressor.flush()
+
+
+class HTTPSession():
+    """
+    HTTPSession hands out pooled keep-alive connections per host. At most
+    `pool_size` connections are open to a host at any time and idle ones
+    are reused by the next request. It is safe to share between threads.
+
+    With a RequestScheduler every request is rate limited, retried on
+    connection errors and on the statuses in RETRY_STATUSES, and counted
+    against the scheduler's adaptive concurrency limit. Without one a
+    request is sent once and any status is returned to the caller.
+    """
+
+    MAX_REDIRECTS = 5
+
+    def __init__(self, pool_size=8, timeout=30, compress=True, scheduler=None):
+        """
+        Initializes HTTPSession. When `compress` is True the server is asked
+        for gzip or deflate content and the body is decompressed on arrival.
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.compress = compress
+        self.scheduler = scheduler
+
+        self.context = ssl._create_unverified_context()
+
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None):
+        """
+        Performs a GET request and returns an HTTPResponse.
+        Redirects are followed.
+        """
+        for _ in range(self.MAX_REDIRECTS + 1):
+            response = self._request(url, headers)
+
+            location = response.header("location")
+            if response.status not in (301, 302, 303, 307, 308) or location is None:
+                return response
+
+            url = urljoin(url, location)
+
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    def close(self):
+        """
+        Closes every idle connection held by the session.
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+
+        for pool in pools:
+            pool.close()
+
+    def stream(self, url, headers=None, chunk_size=16384):
+        """
+        Performs a GET request and yields the decoded body in chunks as it
+        arrives. Redirects are followed and HTTPStatusError is raised for
+        error statuses. If the caller stops early the rest of the body is
+        drained so the connection can still go back to the pool. Only
+        opening the request is retried: an error while the body arrives is
+        raised to the caller, who may already have used part of it.
+        """
+        for _ in range(self.MAX_REDIRECTS + 1):
+            start = time.perf_counter()
+            pool, conn, response = self._start(url, headers)
+            finished = False
+            downloaded = 0
+
+            try:
+                location = response.getheader("location")
+                if response.status in (301, 302, 303, 307, 308) and location is not None:
+                    response.read()
+                    finished = True
+                    url = urljoin(url, location)
+                    continue
+
+                if response.status >= 400:
+                    body = response.read()
+                    finished = True
+                    raise HTTPStatusError(self._response(url, response, body))
+
+                encoding = (response.getheader("content-encoding") or "").strip().lower()
+                decompressor = None
+                if encoding in ("gzip", "x-gzip"):
+                    decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+                elif encoding == "deflate":
+                    decompressor = DeflateDecompressor()
+
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        # read(amt) returns nothing, not an error, when the
+                        # connection closes before Content-Length bytes came.
+                        if response.length:
+                            raise http.client.IncompleteRead(b"", response.length)
+                        break
+
+                    downloaded = downloaded + len(chunk)
+
+                    if decompressor is not None:
+                        chunk = decompressor.decompress(chunk)
+
+                    if chunk:
+                        yield chunk
+
+                finished = True
+                METRICS.observe("http_fetch", time.perf_counter() - start)
+
+                if decompressor is not None:
+                    tail = decompressor.flush()
+                    if tail:
+                        yield tail
+
+                return
+
+            finally:
+                METRICS.increment("http_bytes", downloaded)
+                self._close(pool, conn, response, finished)
+
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    def _request(self, url, headers):
+        """
+        Sends a request and reads the whole body. With a scheduler the body
+        is read as part of the attempt, so that a timeout, reset, or short
+        read while it arrives is retried like a failure to connect.
+        """
+        if self.scheduler is None:
+            return self._read(url, headers)
+
+        def attempt():
+            response = self._read(url, headers)
+
+            if response.status in RETRY_STATUSES:
+                raise HTTPStatusError(response)
+
+            return response
+
+        return self.scheduler.call(attempt)
+
+    def _read(self, url, headers):
+        """
+        Sends a single request and reads the whole body.
+        """
+        start = time.perf_counter()
+        pool, conn, response = self._open(url, headers)
+
+        try:
+            body = response.read()
+        except Exception:
+            self._close(pool, conn, None, False)
+            raise
+
+        self._close(pool, conn, response, True)
+
+        METRICS.observe("http_fetch", time.perf_counter() - start)
+        METRICS.increment("http_bytes", len(body))
+
+        return self._response(url, response, body)
+
+    def _start(self, url, headers):
+        """
+        Opens a streamed request through the scheduler, if there is one, and
+        returns the pool, the connection and the response with its body
+        unread. Only opening it is retried, the caller reads the body.
+        A retryable status is read off and raised as HTTPStatusError so
+        that the scheduler can try again.
+        """
+        if self.scheduler is None:
+            return self._open(url, headers)
+
+        def attempt():
+            pool, conn, response = self._open(url, headers)
+
+            if response.status in RETRY_STATUSES:
+                body = response.read()
+                self._close(pool, conn, response, True)
+                raise HTTPStatusError(self._response(url, response, body))
+
+            return pool, conn, response
+
+        return self.scheduler.call(attempt)
+
+    def _response(self, url, response, body):
+        """
+        Builds an HTTPResponse with a decoded body.
+        """
+        response_headers = {name.lower(): value for name, value in response.getheaders()}
+        body = self.decode(body, response_headers.get("content-encoding"))
+
+        return HTTPResponse(url, response.status, response_headers, body)
+
+    def _open(self, url, headers):
+        """
+        Sends a request on a pooled connection and returns the pool, the
+        connection and the response with its body still unread. A reused
+        connection that the server has already closed is replaced and the
+        request is sent again once. The caller must hand the connection
+        back with _close().
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        request_headers = {"Connection": "keep-alive", "User-Agent": "WeatherScrapper"}
+        if self.compress:
+            request_headers["Accept-Encoding"] = "gzip, deflate"
+        if headers:
+            request_headers.update(headers)
+
+        pool = self._pool(parts.scheme, parts.hostname, parts.port)
+        pool.slots.acquire()
+
+        try:
+            conn, reused = pool.acquire()
+
+            try:
+                response = self._send(conn, path, request_headers)
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+
+                conn = pool.connect()
+                try:
+                    response = self._send(conn, path, request_headers)
+                except Exception:
+                    conn.close()
+                    raise
+
+            except Exception:
+                conn.close()
+                raise
+
+        except Exception:
+            pool.slots.release()
+            METRICS.increment("http_requests", status="error")
+            raise
+
+        METRICS.increment("http_requests", status=str(response.status))
+
+        return pool, conn, response
+
+    @staticmethod
+    def _close(pool, conn, response, finished):
+        """
+        Returns the connection to the pool, or closes it if the server asked
+        for that or the response could not be read to the end.
+        """
+        try:
+            if response is not None and not finished:
+                response.read()
+                finished = True
+
+            if finished and not response.will_close:
+                pool.release(conn)
+            else:
+                conn.close()
+
+        except Exception:
+            conn.close()
+
+        finally:
+            pool.slots.release()
+
+    @staticmethod
+    def _send(conn, path, headers):
+        """
+        Sends the request and returns the response.
+        """
+        conn.request("GET", path, headers=headers)
+
+        return conn.getresponse()
+
+    @staticmethod
+    def decode(body, content_encoding):
+        """
+        Decompresses a gzip or deflate encoded body.
+        """
+        if not content_encoding:
+            return body
+
+        content_encoding = content_encoding.strip().lower()
+
+        if content_encoding in ("gzip", "x-gzip"):
+            return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+
+        if content_encoding == "deflate":
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+
+        return body
+
+    def _pool(self, scheme, host, port):
+        """
+        Returns the connection pool for a host, creating it if needed.
+        """
+        key = (scheme, host, port)
+
+        with self._lock:
+            pool = self._pools.get(key)
+
+            if pool is None:
+                pool = _ConnectionPool(self, scheme, host, port)
+                self._pools[key] = pool
+
+            return pool
+
+
+class _ConnectionPool():
+    """
+    Idle connections to a single host.
+    """
+
+    def __init__(self, session, scheme, host, port):
+        """
+        Initializes the pool. `slots` limits how many connections
+        can be in use at the same time.
+        """
+        self.session = session
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+
+        self.slots = threading.BoundedSemaphore(session.pool_size)
+        self.idle = queue.LifoQueue()
+
+    def connect(self):
+        """
+        Opens a new connection to the host.
+        """
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.session.timeout, context=self.session.context
+            )
+
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.session.timeout)
+
+    def acquire(self):
+        """
+        Returns an idle connection and True, or a new connection and False.
+        """
+        try:
+            return self.idle.get_nowait(), True
+        except queue.Empty:
+            return self.connect(), False
+
+    def release(self, conn):
+        """
+        Puts a connection back so the next request can reuse it.
+        """
+        self.idle.put(conn)
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
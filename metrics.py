@@ -0,0 +1,229 @@
+"""
+This module holds Metrics, the timers, counters, and error log that
+every stage of the application reports to, and METRICS, the instance
+they share.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+class Metrics():
+    """
+    Metrics keeps counters and timers keyed by name and labels, plus the
+    most recent errors. It can be read as a JSON snapshot or in the
+    Prometheus text format, and is safe to share between threads.
+    """
+
+    def __init__(self, prefix="weather", max_errors=100):
+        """
+        Initializes Metrics. Every exported metric name starts with `prefix`
+        and the last `max_errors` errors are kept.
+        """
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+        self.counters = {}
+        self.timers = {}
+        self.errors = deque(maxlen=max_errors)
+
+    def increment(self, name, value=1, **labels):
+        """
+        Adds `value` to a counter.
+        """
+        key = self.key(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """
+        Records one duration for a timer.
+        """
+        key = self.key(name, labels)
+
+        with self.lock:
+            timer = self.timers.get(key)
+
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] = timer[0] + 1
+                timer[1] = timer[1] + seconds
+                timer[2] = max(timer[2], seconds)
+
+    @staticmethod
+    def key(name, labels):
+        """
+        Returns the key a metric is kept under. Label values are kept as
+        strings, as they are exported, so keys always sort.
+        """
+        return (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Times the body of a with statement.
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def error(self, where, error):
+        """
+        Counts and logs an error caught at `where` (a "Class::method" string)
+        and prints it the way the application always has.
+        """
+        print(f"{where}::{error}")
+
+        self.increment("errors", where=where.split("::")[0], type=type(error).__name__)
+
+        with self.lock:
+            self.errors.append({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "where": where,
+                "type": type(error).__name__,
+                "message": str(error),
+            })
+
+    def total(self, name):
+        """
+        Returns the sum of a counter over all of its labels.
+        """
+        with self.lock:
+            return sum(value for (key, _), value in self.counters.items() if key == name)
+
+    def reset(self):
+        """
+        Clears every counter, timer, and error.
+        """
+        with self.lock:
+            self.started = time.time()
+            self.counters = {}
+            self.timers = {}
+            self.errors.clear()
+
+    def snapshot(self):
+        """
+        Returns every metric as a JSON-serializable dictionary.
+        """
+        with self.lock:
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "timers": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": count,
+                        "total_seconds": total,
+                        "max_seconds": maximum,
+                    }
+                    for (name, labels), (count, total, maximum) in sorted(self.timers.items())
+                ],
+                "errors": list(self.errors),
+            }
+
+    def to_json(self):
+        """
+        Returns the snapshot as JSON text.
+        """
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        Counters become <prefix>_<name>_total and timers become
+        <prefix>_<name>_seconds summaries with a _max gauge.
+        """
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+
+        lines = []
+        declared = set()
+
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{self.labels(labels)} {value}")
+
+        for (name, labels), (count, total, _) in timers:
+            metric = f"{self.prefix}_{name}_seconds"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} summary")
+                declared.add(metric)
+            lines.append(f"{metric}_count{self.labels(labels)} {count}")
+            lines.append(f"{metric}_sum{self.labels(labels)} {total:.6f}")
+
+        for (name, labels), (_, _, maximum) in timers:
+            metric = f"{self.prefix}_{name}_seconds_max"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} gauge")
+                declared.add(metric)
+            lines.append(f"{metric}{self.labels(labels)} {maximum:.6f}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def labels(labels):
+        """
+        Formats labels as {name="value",...}.
+        """
+        if not labels:
+            return ""
+
+        pairs = []
+        for name, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{name}="{value}"')
+
+        return "{" + ",".join(pairs) + "}"
+
+    def write_json(self, path):
+        """
+        Writes the JSON snapshot to a file.
+        """
+        self._write(path, self.to_json())
+
+    def write_prometheus(self, path):
+        """
+        Writes the Prometheus text to a file, for example one read
+        by the node exporter's textfile collector.
+        """
+        self._write(path, self.to_prometheus())
+
+    @staticmethod
+    def _write(path, text):
+        """
+        Writes to a temporary file and renames it into place so
+        readers never see a partially written file.
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+
+        with open(temp_path, "w", encoding="utf-8") as temp_file:
+            temp_file.write(text)
+
+        os.replace(temp_path, path)
+
+
+METRICS = Metrics()
+
+def report_error(where, error):
+    """
+    Counts, logs, and prints an error caught at `where`.
+    """
+    METRICS.error(where, error)
@@ -0,0 +1,137 @@
+"""
+This module holds MonthRecord, the compact form in which parsers
+hand over the days they read for one month.
+"""
+
+from array import array
+
+class MonthRecord():
+    """
+    MonthRecord holds one station-month of daily temperatures as typed
+    columns: the day of the month in an unsigned byte array and the max,
+    min, and mean temperatures in double arrays, so a day costs 25 bytes
+    instead of a dictionary of strings. DBOperations saves it directly,
+    without converting any text.
+
+    It can still be read like the {date: {"Max", "Min", "Mean"}}
+    dictionaries WeatherScrapper builds, through items() and iteration.
+    """
+
+    __slots__ = ("year", "month", "days", "max_temps", "min_temps", "mean_temps")
+
+    def __init__(self, year, month):
+        """
+        Initializes an empty MonthRecord.
+        """
+        self.year = int(year)
+        self.month = int(month)
+
+        self.days = array("B")
+        self.max_temps = array("d")
+        self.min_temps = array("d")
+        self.mean_temps = array("d")
+
+    def append(self, day, maximum, minimum, mean):
+        """
+        Adds a day.
+        """
+        self.days.append(day)
+        self.max_temps.append(maximum)
+        self.min_temps.append(minimum)
+        self.mean_temps.append(mean)
+
+    def __len__(self):
+        """
+        Returns the number of days.
+        """
+        return len(self.days)
+
+    def __iter__(self):
+        """
+        Yields the "YYYY-MM-DD" date of every day.
+        """
+        prefix = f"{self.year:04}-{self.month:02}-"
+
+        for day in self.days:
+            yield f"{prefix}{day:02}"
+
+    def items(self):
+        """
+        Yields (date, {"Max", "Min", "Mean"}) for every day.
+        """
+        for sample_date, maximum, minimum, mean in zip(
+                self, self.max_temps, self.min_temps, self.mean_temps):
+            yield sample_date, {"Max": maximum, "Min": minimum, "Mean": mean}
+
+    def to_dict(self):
+        """
+        Returns the days as a {date: {"Max", "Min", "Mean"}} dictionary.
+        """
+        return dict(self.items())
+
+    def rows(self, station_id, location):
+        """
+        Yields the rows DBOperations inserts: (station, date, date key,
+        year, month, day, max, min, mean, location).
+        """
+        prefix = f"{self.year:04}-{self.month:02}-"
+        base_key = self.year * 10000 + self.month * 100
+
+        for day, maximum, minimum, mean in zip(
+                self.days, self.max_temps, self.min_temps, self.mean_temps):
+            yield (
+                station_id,
+                f"{prefix}{day:02}",
+                base_key + day,
+                self.year,
+                self.month,
+                day,
+                maximum,
+                minimum,
+                mean,
+                location
+            )
+
+    def __reduce__(self):
+        """
+        Pickles the record as its year, month, and the raw bytes of its
+        four arrays joined together, which is far smaller and quicker to
+        send between processes than the arrays one by one.
+        """
+        return (
+            MonthRecord.frombytes,
+            (
+                self.year,
+                self.month,
+                b"".join((
+                    self.days.tobytes(),
+                    self.max_temps.tobytes(),
+                    self.min_temps.tobytes(),
+                    self.mean_temps.tobytes(),
+                )),
+            )
+        )
+
+    @classmethod
+    def frombytes(cls, year, month, data):
+        """
+        Returns the record whose arrays were joined into `data` by __reduce__.
+        """
+        record = cls(year, month)
+
+        count = len(data) // (record.days.itemsize + 3 * record.max_temps.itemsize)
+        offset = count * record.days.itemsize
+
+        record.days.frombytes(data[:offset])
+
+        for column in (record.max_temps, record.min_temps, record.mean_temps):
+            column.frombytes(data[offset:offset + count * column.itemsize])
+            offset = offset + count * column.itemsize
+
+        return record
+
+    def __repr__(self):
+        """
+        Returns a short description of the record.
+        """
+        return f"MonthRecord({self.year}-{self.month:02}, {len(self)} days)"
@@ -0,0 +1,161 @@
+"""
+This module holds PageCache which keeps the raw monthly daily-data pages
+on disk so they only have to be downloaded once.
+"""
+
+import calendar
+import hashlib
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+class CacheMissError(Exception):
+    """
+    Raised in offline mode when a page is not in the cache.
+    """
+
+
+class PageCache():
+    """
+    PageCache stores pages by the SHA-256 of their content under
+    `objects/` and keeps a small JSON index entry per (station, year, month)
+    under `index/` that points at the content along with its ETag and
+    Last-Modified headers.
+
+    A month is closed once `closed_after_days` have passed since its last
+    day. Pages fetched after their month closed are served from disk without
+    asking the server again. Pages of open months are revalidated with a
+    conditional request. With `offline` set the network is never used.
+    """
+
+    def __init__(self, directory="page_cache", offline=False, closed_after_days=45):
+        """
+        Initializes PageCache.
+        """
+        self.directory = directory
+        self.offline = offline
+        self.closed_after_days = closed_after_days
+
+    def fetch(self, session, url, station_id, year, month):
+        """
+        Returns the raw page for the month, from disk when possible
+        and from `session` otherwise.
+        """
+        entry = self.lookup(station_id, year, month)
+
+        if entry is not None:
+            fetched = date.fromisoformat(entry["fetched"])
+
+            if self.offline or self.is_closed(year, month, fetched):
+                return self.read(entry)
+
+        if self.offline:
+            raise CacheMissError(f"No cached page for station {station_id} {year}-{month:0>2}")
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = session.get(url, headers)
+
+        if response.status == 304 and entry is not None:
+            self.write_index(station_id, year, month, entry["sha256"],
+                             entry.get("etag"), entry.get("last_modified"))
+            return self.read(entry)
+
+        response.raise_for_status()
+
+        self.store(station_id, year, month, response.body,
+                   response.header("etag"), response.header("last-modified"))
+
+        return response.body
+
+    def is_closed(self, year, month, on_date=None):
+        """
+        Returns True if the month was closed on the given date (today by default).
+        """
+        on_date = on_date or date.today()
+        last_day = date(year, month, calendar.monthrange(year, month)[1])
+
+        return on_date > last_day + timedelta(days=self.closed_after_days)
+
+    def lookup(self, station_id, year, month):
+        """
+        Returns the index entry for the month or None if it is not cached.
+        """
+        try:
+            with open(self.index_path(station_id, year, month), encoding="utf-8") as index_file:
+                entry = json.load(index_file)
+
+            if os.path.exists(self.object_path(entry["sha256"])):
+                return entry
+
+        except (OSError, ValueError, KeyError):
+            pass
+
+        return None
+
+    def read(self, entry):
+        """
+        Returns the page content an index entry points at.
+        """
+        with open(self.object_path(entry["sha256"]), "rb") as object_file:
+            return object_file.read()
+
+    def store(self, station_id, year, month, body, etag=None, last_modified=None):
+        """
+        Writes the page content and points the month's index entry at it.
+        """
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self.object_path(sha256)
+
+        if not os.path.exists(path):
+            self._atomic_write(path, body)
+
+        self.write_index(station_id, year, month, sha256, etag, last_modified)
+
+    def write_index(self, station_id, year, month, sha256, etag, last_modified):
+        """
+        Writes the index entry for the month, stamped with today's date.
+        """
+        entry = {
+            "sha256": sha256,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched": date.today().isoformat(),
+        }
+
+        self._atomic_write(
+            self.index_path(station_id, year, month),
+            json.dumps(entry).encode("utf-8")
+        )
+
+    def index_path(self, station_id, year, month):
+        """
+        Returns the path of the index entry for the month.
+        """
+        return os.path.join(self.directory, "index", str(station_id), f"{year}-{month:0>2}.json")
+
+    def object_path(self, sha256):
+        """
+        Returns the path of the content with the given hash.
+        """
+        return os.path.join(self.directory, "objects", sha256[:2], sha256)
+
+    @staticmethod
+    def _atomic_write(path, data):
+        """
+        Writes to a temporary file and renames it into place so
+        readers never see a partially written file.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(data)
+
+        os.replace(temp_path, path)
@@ -0,0 +1,355 @@
+"""
+This module holds IngestPipeline which downloads, parses, and saves
+station histories in three overlapping stages.
+"""
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from metrics import METRICS, report_error
+from page_cache import CacheMissError
+from scrape_weather import WeatherScrapper
+from table_parser import DailyTableParser
+
+DONE = None
+
+MISSED = object()
+
+def parse_page(year, month, page):
+    """
+    Parses the raw bytes of a month's page in a worker process. Returns
+    (MonthRecord, title, rejected rows by reason, seconds spent parsing),
+    which pickles to a few hundred bytes.
+    """
+    parser = DailyTableParser(year, month)
+    parser.parse([page])
+
+    return parser.weather, parser.title, parser.rejected, parser.seconds
+
+class IngestPipeline():
+    """
+    IngestPipeline runs a crawl as three stages joined by bounded queues:
+    `fetchers` threads download raw pages into a queue of `queue_size`,
+    `parsers` threads turn them into MonthRecords in a second queue
+    of the same size, and one writer thread saves them `batch_size` months
+    to a transaction, or fewer if `flush_interval` seconds have passed
+    since the last save. A full queue blocks the stage feeding it, and no
+    station has more than `window` months between being handed to a
+    fetcher and being saved, so memory stays flat however long the crawl
+    and the slowest stage sets the pace.
+
+    Parsing is pure Python, so parser threads share one core. With
+    `processes` set, each parser thread instead sends the raw page bytes to
+    a pool of that many worker processes and waits for the MonthRecord to
+    come back, and at least `processes` parser threads are started so that
+    every worker has a page. The pool is started with "spawn" so that no
+    lock held by a running thread is copied into the workers.
+
+    The writer puts each station's months back in order. A station is done
+    when the same page title is served twice in a row, just like
+    WeatherScrapper.same_month(), or when a page is titled with another
+    month than the one asked for, as the site serves its first month for
+    any month before it. Months fetched past that are dropped. A station
+    whose pages fail to download or parse `failure_limit` months in a row
+    is given up on and listed in `incomplete`, so that an outage cannot
+    keep its crawl walking back forever. When replaying an offline page
+    cache, a station is done at its first month that is not in the cache.
+    """
+
+    def __init__(self, processor, fetchers=8, parsers=2, queue_size=16, batch_size=24,
+                 window=None, flush_interval=0.5, processes=None, failure_limit=12):
+        """
+        Initializes IngestPipeline for a WeatherProcessor, whose session,
+        cache, base URL, and database are used.
+        """
+        self.processor = processor
+        self.fetchers = fetchers
+        self.parsers = max(parsers, processes or 0)
+        self.processes = processes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.window = window or fetchers
+        self.failure_limit = failure_limit
+
+        self.pages = queue.Queue(maxsize=queue_size)
+        self.parsed = queue.Queue(maxsize=queue_size)
+
+        self.condition = threading.Condition()
+        self.crawls = {}
+        self.active = []
+        self.incomplete = []
+        self.pool = None
+
+    def run(self, station_ids):
+        """
+        Downloads the full history of the stations and returns
+        once every month has been saved.
+        """
+        today = date.today()
+
+        self.crawls = {
+            station_id: {
+                "months": self.processor.months_before(today.year, today.month),
+                "issued": 0,
+                "saved": 0,
+                "waiting": {},
+                "previous_title": None,
+                "failures": 0,
+                "finished": False,
+            }
+            for station_id in station_ids
+        }
+        self.active = list(self.crawls)
+        self.incomplete = []
+
+        if self.processes:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+
+        writer = threading.Thread(target=self.write, name="pipeline-writer")
+        parsers = [
+            threading.Thread(target=self.parse, name=f"pipeline-parser-{number}")
+            for number in range(self.parsers)
+        ]
+        fetchers = [
+            threading.Thread(target=self.fetch, name=f"pipeline-fetcher-{number}")
+            for number in range(self.fetchers)
+        ]
+
+        for thread in [writer] + parsers + fetchers:
+            thread.start()
+
+        for thread in fetchers:
+            thread.join()
+
+        for _ in parsers:
+            self.pages.put(DONE)
+
+        for thread in parsers:
+            thread.join()
+
+        self.parsed.put(DONE)
+        writer.join()
+
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def next_month(self):
+        """
+        Returns the next (station_id, sequence, year, month) to download,
+        taking stations in turn and waiting while every unfinished station
+        has `window` months in flight. Returns None once all are finished.
+        """
+        with self.condition:
+            while True:
+                if not self.active:
+                    return None
+
+                for _ in range(len(self.active)):
+                    station_id = self.active.pop(0)
+                    self.active.append(station_id)
+
+                    crawl = self.crawls[station_id]
+
+                    if crawl["issued"] - crawl["saved"] < self.window:
+                        year, month = next(crawl["months"])
+                        sequence = crawl["issued"]
+                        crawl["issued"] = sequence + 1
+
+                        print(
+                            f"Downloading data from {self.processor.months_list[month]} {year} "
+                            f"for station {station_id}..."
+                        )
+
+                        return station_id, sequence, year, month
+
+                self.condition.wait()
+
+    def fetch(self):
+        """
+        Downloads pages until there are no more months to hand out. A page
+        that fails to download is passed on as None, and one missing from
+        an offline cache as MISSED, so that the writer never waits for it.
+        """
+        processor = self.processor
+
+        while True:
+            job = self.next_month()
+
+            if job is None:
+                return
+
+            station_id, _, year, month = job
+            page = None
+
+            try:
+                scrapper = WeatherScrapper(
+                    processor.session, processor.cache,
+                    station_id=station_id, base_url=processor.base_url
+                )
+                page = scrapper.fetch_page(year, month)
+
+            except CacheMissError:
+                page = MISSED
+
+            except Exception as error:
+                report_error("IngestPipeline::fetch", error)
+
+            self.pages.put((job, page))
+
+    def parse(self):
+        """
+        Parses pages, here or in the process pool, until it is told to stop.
+        """
+        while True:
+            item = self.pages.get()
+
+            if item is DONE:
+                return
+
+            (station_id, sequence, year, month), page = item
+            weather = None
+            title = None
+
+            if page is MISSED:
+                weather = MISSED
+
+            elif page is not None:
+                try:
+                    scrapper = WeatherScrapper(station_id=station_id)
+
+                    if self.pool is None:
+                        weather = scrapper.parse_month(year, month, [page])
+                    else:
+                        weather = scrapper.parsed(
+                            year, month, *self.pool.submit(parse_page, year, month, page).result()
+                        )
+
+                    title = scrapper.title
+
+                except Exception as error:
+                    report_error("IngestPipeline::parse", error)
+
+            self.parsed.put((station_id, sequence, year, month, weather, title))
+
+    def write(self):
+        """
+        Puts each station's months back in order and saves them in batches.
+        """
+        downloaded = []
+        fetches = []
+        saved = time.monotonic()
+
+        while True:
+            try:
+                item = self.parsed.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+
+            if item is DONE:
+                break
+
+            try:
+                if item:
+                    station_id, sequence, year, month, weather, title = item
+                    crawl = self.crawls[station_id]
+
+                    if not crawl["finished"]:
+                        crawl["waiting"][sequence] = (year, month, weather, title)
+                        self.release(station_id, crawl, downloaded, fetches)
+
+            except Exception as error:
+                report_error("IngestPipeline::write", error)
+
+            if len(downloaded) >= self.batch_size or (
+                    downloaded and time.monotonic() - saved >= self.flush_interval):
+                self.save(downloaded, fetches)
+                downloaded = []
+                fetches = []
+                saved = time.monotonic()
+
+        if downloaded:
+            self.save(downloaded, fetches)
+
+    def release(self, station_id, crawl, downloaded, fetches):
+        """
+        Moves a station's months that are next in order into the batch
+        and lets the fetchers hand out as many new ones.
+        """
+        months_list = self.processor.months_list
+
+        with self.condition:
+            while crawl["saved"] in crawl["waiting"] and not crawl["finished"]:
+                year, month, weather, title = crawl["waiting"].pop(crawl["saved"])
+                crawl["saved"] = crawl["saved"] + 1
+
+                if weather is MISSED:
+                    print(
+                        f"{months_list[month]} {year} is not in the page cache "
+                        f"for station {station_id}, replay complete!"
+                    )
+
+                    self.finish(station_id, crawl)
+                    break
+
+                if weather is None:
+                    crawl["failures"] = crawl["failures"] + 1
+
+                    if crawl["failures"] >= self.failure_limit:
+                        print(
+                            f"Could not download {crawl['failures']} months in a row up to "
+                            f"{months_list[month]} {year} for station {station_id}, "
+                            f"its history is incomplete!"
+                        )
+
+                        self.incomplete.append(station_id)
+                        self.finish(station_id, crawl)
+                        break
+
+                    continue
+
+                crawl["failures"] = 0
+
+                if title is not None and (
+                        title == crawl["previous_title"]
+                        or f"{months_list[month]} {year}" not in title):
+                    print(
+                        f"Data from {months_list[month]} {year} and after "
+                        f"is not available for station {station_id}, download complete!"
+                    )
+
+                    self.finish(station_id, crawl)
+                    break
+
+                crawl["previous_title"] = title
+
+                downloaded.append((station_id, weather))
+                fetches.append((station_id, year, month, len(weather)))
+
+            self.condition.notify_all()
+
+    def finish(self, station_id, crawl):
+        """
+        Stops handing out a station's months and drops the ones in flight.
+        Called with the condition held.
+        """
+        crawl["finished"] = True
+        crawl["waiting"] = {}
+        self.active.remove(station_id)
+
+    def save(self, downloaded, fetches):
+        """
+        Saves a batch in one transaction. A batch that fails is left out
+        whole, fetch log included, so a later update downloads it again.
+        """
+        try:
+            with METRICS.timer("pipeline_batch"):
+                self.processor.db.save_station_months(downloaded, fetches)
+
+        except Exception as error:
+            report_error("IngestPipeline::save", error)
@@ -3,12 +3,23 @@ This module holds PlotOperations which employees matplotlib
 to graph weather data.
 """
 
+from datetime import date
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from downsample import lttb
+from metrics import report_error
 
 class PlotOperations:
     """
     Graphs climate data dependant on the vector
     data passed to each method.
+
+    The box_plot, line_plot, and range_plot methods show the graph
+    interactively through pyplot. The render_* methods draw the same
+    graphs headlessly on their own Figure with the Agg canvas, never
+    touching pyplot's global state, and save them to a file.
     """
 
     def box_plot(self, data, start_year, end_year):
@@ -17,17 +28,13 @@ class PlotOperations:
         in a date range supplied by the user.
         """
         try:
-            plt.boxplot(data)
-            title = f"Monthly Temperature Distribution for: {start_year} to {end_year}"
-
-            plt.title(title)
-            plt.xlabel("Month")
-            plt.ylabel("Temperature (Celsius)")
+            figure = plt.figure()
+            self.draw_box_plot(figure.add_subplot(), data, start_year, end_year)
 
             plt.show()
 
         except Exception as error:
-            print(f"PlotOperations::box_plot::{error}")
+            report_error("PlotOperations::box_plot", error)
 
     def line_plot(self, average_temperatures, timestamps, year, month):
         """
@@ -35,18 +42,123 @@ class PlotOperations:
         particular month based on user input.
         """
         try:
-            title = f"Daily Average Temperatures for: {month} {year}"
+            figure = plt.figure()
+            self.draw_line_plot(figure.add_subplot(), average_temperatures, timestamps, year, month)
 
-            plt.title(title)
-            plt.ylabel("Average Temperature")
-            plt.xlabel("Day of Month")
+            figure.tight_layout()
+            plt.show()
 
-            plt.plot(timestamps, average_temperatures)
+        except Exception as error:
+            report_error("PlotOperations::line_plot", error)
 
-            plt.xticks(timestamps, rotation=-45, fontsize=8)
+    def range_plot(self, average_temperatures, timestamps, start_date, end_date, max_points=1000):
+        """
+        Graphs a line plot of mean temperature data for any date range.
+        Long ranges are downsampled to at most `max_points` points with
+        LTTB and the date ticks are thinned to fit, so drawing takes the
+        same time however many years are plotted.
+        """
+        try:
+            figure = plt.figure()
+            self.draw_range_plot(
+                figure.add_subplot(), average_temperatures, timestamps,
+                start_date, end_date, max_points
+            )
 
-            plt.tight_layout()
+            figure.tight_layout()
             plt.show()
 
         except Exception as error:
-            print(f"PlotOperations::line_plot::{error}")
+            report_error("PlotOperations::range_plot", error)
+
+    def render_box_plot(self, data, start_year, end_year, path):
+        """
+        Saves a box plot to `path`. The format (PNG, SVG, ...)
+        follows the file extension.
+        """
+        return self.render(path, self.draw_box_plot, data, start_year, end_year)
+
+    def render_line_plot(self, average_temperatures, timestamps, year, month, path):
+        """
+        Saves a line plot of one month to `path`.
+        """
+        return self.render(path, self.draw_line_plot, average_temperatures, timestamps, year, month)
+
+    def render_range_plot(self, average_temperatures, timestamps, start_date, end_date, path,
+                          max_points=1000):
+        """
+        Saves a downsampled line plot of a date range to `path`.
+        """
+        return self.render(
+            path, self.draw_range_plot, average_temperatures, timestamps,
+            start_date, end_date, max_points
+        )
+
+    @staticmethod
+    def render(path, draw, *args):
+        """
+        Draws on a new Figure with an Agg canvas, saves it,
+        and returns the path.
+        """
+        figure = Figure()
+        FigureCanvasAgg(figure)
+
+        draw(figure.add_subplot(), *args)
+
+        figure.tight_layout()
+        figure.savefig(path)
+
+        return path
+
+    @staticmethod
+    def draw_box_plot(axes, data, start_year, end_year):
+        """
+        Draws a box plot of mean temperatures per month.
+        """
+        axes.boxplot(data)
+        title = f"Monthly Temperature Distribution for: {start_year} to {end_year}"
+
+        axes.set_title(title)
+        axes.set_xlabel("Month")
+        axes.set_ylabel("Temperature (Celsius)")
+
+    @staticmethod
+    def draw_line_plot(axes, average_temperatures, timestamps, year, month):
+        """
+        Draws a line plot with one tick per day of the month.
+        """
+        title = f"Daily Average Temperatures for: {month} {year}"
+
+        axes.set_title(title)
+        axes.set_ylabel("Average Temperature")
+        axes.set_xlabel("Day of Month")
+
+        axes.plot(timestamps, average_temperatures)
+
+        axes.set_xticks(timestamps)
+        axes.tick_params(axis="x", labelrotation=-45, labelsize=8)
+
+    @staticmethod
+    def draw_range_plot(axes, average_temperatures, timestamps, start_date, end_date, max_points):
+        """
+        Draws a downsampled line plot with thinned date ticks.
+        """
+        days = [date.fromisoformat(timestamp).toordinal() for timestamp in timestamps]
+
+        days, average_temperatures = lttb(days, average_temperatures, max_points)
+
+        dates = [date.fromordinal(day) for day in days]
+
+        title = f"Daily Average Temperatures for: {start_date} to {end_date}"
+
+        axes.set_title(title)
+        axes.set_ylabel("Average Temperature")
+        axes.set_xlabel("Date")
+
+        axes.plot(dates, average_temperatures)
+
+        locator = mdates.AutoDateLocator(maxticks=12)
+        axes.xaxis.set_major_locator(locator)
+        axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+        axes.tick_params(axis="x", labelrotation=-45, labelsize=8)
@@ -0,0 +1,229 @@
+"""
+This module holds RequestScheduler which paces, retries, and limits the
+concurrency of requests so that a crawl runs as fast as the server allows.
+"""
+
+import http.client
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from metrics import METRICS
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class RequestScheduler():
+    """
+    RequestScheduler runs requests through three controls:
+
+    A token bucket lets through at most `rate` requests per second on
+    average (unlimited when None) with bursts of up to `burst`.
+
+    Failed attempts, meaning connection errors, timeouts, and the statuses
+    in RETRY_STATUSES, are retried up to `retries` times after an
+    exponential backoff with full jitter. A Retry-After header pauses every
+    request, not just the one that got it, for at least that long.
+
+    The number of requests in flight is limited, and the limit adapts
+    (additive increase, multiplicative decrease): it grows by about one for
+    every limit's worth of fast successes, up to `max_concurrency`, and is
+    halved, down to `min_concurrency`, on a failure or when the smoothed
+    time to first byte goes over `target_latency`. Without a target, four
+    times the fastest smoothed latency seen is used.
+    """
+
+    def __init__(self, rate=None, burst=None, max_concurrency=8, min_concurrency=1, retries=4,
+                 backoff=0.5, max_backoff=30.0, target_latency=None, seed=None):
+        """
+        Initializes RequestScheduler. `seed` makes the jitter repeatable.
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.target_latency = target_latency
+
+        self.random = random.Random(seed)
+        self.condition = threading.Condition()
+
+        self.tokens = float(self.burst)
+        self.refilled = time.monotonic()
+        self.paused_until = 0.0
+
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.latency = None
+        self.fastest = None
+        self.decreased = 0.0
+
+    def call(self, request):
+        """
+        Runs `request()` under the scheduler's controls and returns its
+        result. `request` raises HTTPStatusError for an error status. The
+        last error is raised once the retries are used up.
+        """
+        attempt = 0
+
+        while True:
+            self.wait_for_token()
+
+            with self.slot():
+                start = time.monotonic()
+
+                try:
+                    result = request()
+
+                except Exception as error:
+                    if not self.retryable(error):
+                        raise
+
+                    failure = error
+
+                else:
+                    self.succeeded(time.monotonic() - start)
+                    return result
+
+            retry_after = self.retry_after(failure)
+            self.failed(retry_after)
+
+            METRICS.increment("http_retries", reason=self.reason(failure))
+
+            if attempt >= self.retries:
+                raise failure
+
+            delay = self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            time.sleep(max(delay, retry_after or 0))
+
+            attempt = attempt + 1
+
+    def wait_for_token(self):
+        """
+        Blocks until the bucket has a token and no Retry-After pause is
+        in effect, then takes the token.
+        """
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                wait = self.paused_until - now
+
+                if wait <= 0:
+                    if self.rate is None:
+                        return
+
+                    self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+                    self.refilled = now
+
+                    if self.tokens >= 1:
+                        self.tokens = self.tokens - 1
+                        return
+
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds one of the `limit` places for a request in flight.
+        """
+        with self.condition:
+            while self.in_flight >= max(1, int(self.limit)):
+                self.condition.wait()
+
+            self.in_flight = self.in_flight + 1
+
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.in_flight = self.in_flight - 1
+                self.condition.notify_all()
+
+    def succeeded(self, latency):
+        """
+        Folds a successful request's latency into the smoothed latency and
+        raises the limit, or lowers it if the server is slowing down.
+        """
+        with self.condition:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.fastest = self.latency if self.fastest is None else min(self.fastest, self.latency)
+
+            target = self.target_latency or 4 * self.fastest
+
+            if self.latency > target:
+                self.decrease()
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+            self.condition.notify_all()
+
+    def failed(self, retry_after):
+        """
+        Lowers the limit and pauses everything for `retry_after` seconds.
+        """
+        with self.condition:
+            self.decrease()
+
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                METRICS.increment("http_throttled")
+
+    def decrease(self):
+        """
+        Halves the limit, at most once per smoothed latency (and at least
+        a tenth of a second) so that a burst of failures from requests that
+        were already in flight only counts once. Called with the lock held.
+        """
+        now = time.monotonic()
+
+        if now - self.decreased < max(0.1, self.latency or 0.0):
+            return
+
+        self.decreased = now
+        self.limit = max(float(self.min_concurrency), self.limit / 2)
+
+    @staticmethod
+    def retryable(error):
+        """
+        Returns True for errors that may go away if the request is tried again.
+        """
+        status = getattr(error, "status", None)
+
+        if status is not None and isinstance(status, int) and hasattr(error, "response"):
+            return status in RETRY_STATUSES
+
+        return isinstance(error, (OSError, http.client.HTTPException))
+
+    @staticmethod
+    def retry_after(error):
+        """
+        Returns the seconds asked for by a Retry-After header, or None.
+        """
+        response = getattr(error, "response", None)
+        value = response.header("retry-after") if response is not None else None
+
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def reason(error):
+        """
+        Returns a short label for why an attempt failed.
+        """
+        status = getattr(error, "status", None)
+
+        return str(status) if isinstance(status, int) else type(error).__name__
@@ -1,13 +1,28 @@
 """
 This module holds the WeatherScrapper class that is used
-to scrape HTML from the Government of Canada website.
+to scrape HTML from the Government of Canada website, and
+BulkDataScrapper which downloads its yearly CSV files instead.
 """
 
+import http.client
 from html.parser import HTMLParser
-import urllib.request
-import ssl
+from http_session import HTTPSession
+from metrics import METRICS, report_error
+from scheduler import RequestScheduler
+from stations import DEFAULT_STATION_ID
+from csv_parser import DailyCSVParser
+from table_parser import DailyTableParser
+
+DEFAULT_SESSION = HTTPSession(scheduler=RequestScheduler())
+
+DEFAULT_BASE_URL = "https://climate.weather.gc.ca"
+
+class FetchError(Exception):
+    """
+    Raised when a month or year could not be downloaded or parsed,
+    after any retries.
+    """
 
-ssl._create_default_https_context = ssl._create_unverified_context
 
 class WeatherScrapper(HTMLParser):
     """
@@ -15,14 +30,30 @@ class WeatherScrapper(HTMLParser):
     from the Government of Canada website by scrapping the HTML tables per month.
     """
 
-    def __init__(self):
+    def __init__(self, session=None, cache=None, engine="stream", station_id=DEFAULT_STATION_ID,
+                 base_url=DEFAULT_BASE_URL):
         """
-        Initializes WeatherScrapper by setting the required fields.
+        Initializes WeatherScrapper by setting the required fields. Every
+        scrapper shares DEFAULT_SESSION unless a session is passed in.
+        Pages are read through `cache` (a PageCache) when one is given.
+        The "stream" engine parses pages with DailyTableParser as they
+        arrive, the "html" engine uses the HTMLParser callbacks below.
+        Pages are requested for the station `station_id` from the site at
+        `base_url`, which can point at a local ClimateServer instead.
         """
         try:
             HTMLParser.__init__(self)
 
+            self.session = session or DEFAULT_SESSION
+            self.cache = cache
+            self.engine = engine
+
+            self.station_id = station_id
+            self.base_url = base_url.rstrip("/")
+
             self.good_data = True
+            self.reject_reason = None
+            self.rejected = {}
 
             self.title = None
             self.in_title = False
@@ -31,6 +62,7 @@ class WeatherScrapper(HTMLParser):
             self.in_tbody = False
             self.in_abbr = False
             self.in_td = False
+            self.cell_text = ""
 
             self.year = None
             self.month = None
@@ -43,7 +75,7 @@ class WeatherScrapper(HTMLParser):
             self.temps_list = []
 
         except Exception as error:
-            print(f"WeatherScrapper::__init__::{error}")
+            report_error("WeatherScrapper::__init__", error)
 
     def handle_starttag(self, tag, attrs):
         """
@@ -68,12 +100,12 @@ class WeatherScrapper(HTMLParser):
                     self.in_td = True
 
         except Exception as error:
-            print(f"WeatherScrapper::handle_starttag::{error}")
+            report_error("WeatherScrapper::handle_starttag", error)
 
     def handle_data(self, data):
         """
-        Handles data by adding it to the weather dictionary if the
-        data handled is the data being sought.
+        Handles data by keeping the day and the text of the temperature
+        cells being sought.
         """
         try:
             if self.in_title:
@@ -87,42 +119,19 @@ class WeatherScrapper(HTMLParser):
                 if "Sum" in data:
                     self.in_tbody = False
 
-                if self.in_abbr:
+                if self.in_abbr and not self.in_td:
                     self.weather_current_key = f"{self.year}-{self.month}-{data}"
 
                 if self.in_td and self.tr_column_count != 3:
-                    if "M" in data:
-                        self.good_data = False
-                    elif "E" in data:
-                        self.good_data = False
-                    else:
-                        self.temps_list.append(data)
-
-                    self.tr_column_count = self.tr_column_count + 1
-
-                    if self.tr_column_count == 3:
-                        if self.good_data and self.weather_current_key is not None:
-                            daily_temps = {}
-
-                            daily_temps["Max"] = self.temps_list[0]
-                            daily_temps["Min"] = self.temps_list[1]
-                            daily_temps["Mean"] = self.temps_list[2]
-
-                            self.weather[self.weather_current_key] = daily_temps
-
-                        self.temps_list.clear()
-
-                        self.good_data = True
-
-                        self.weather_current_key = None
-
+                    self.cell_text = self.cell_text + data
 
         except Exception as error:
-            print(f"WeatherScrapper::handle_data::{error}")
+            report_error("WeatherScrapper::handle_data", error)
 
     def handle_endtag(self, tag):
         """
-        Handles end tags by setting the appropriate flags to False.
+        Handles end tags by setting the appropriate flags to False and
+        finishing temperature cells.
         """
         try:
             if "tbody" in tag:
@@ -135,35 +144,189 @@ class WeatherScrapper(HTMLParser):
                 if "td" in tag:
                     self.in_td = False
 
+                    if self.tr_column_count != 3:
+                        self.end_cell()
+
 
         except Exception as error:
-            print(f"ColourScrapper::handle_endtag::{error}")
+            report_error("WeatherScrapper::handle_endtag", error)
+
+    def end_cell(self):
+        """
+        Judges a temperature cell on its whole text, flags included, once
+        it is closed: a value followed by an "M" or "E" flag, which comes in
+        as data of its own, rejects the day just like DailyTableParser and
+        DailyCSVParser do. The day is added or counted as rejected after
+        its third cell.
+        """
+        temp = self.cell_text.strip()
+        self.cell_text = ""
+
+        if self.good_data:
+            if "M" in temp:
+                self.good_data = False
+                self.reject_reason = "missing"
+            elif "E" in temp:
+                self.good_data = False
+                self.reject_reason = "estimated"
+            elif not temp:
+                self.good_data = False
+                self.reject_reason = "incomplete"
+            else:
+                self.temps_list.append(temp)
+
+        self.tr_column_count = self.tr_column_count + 1
+
+        if self.tr_column_count == 3:
+            if self.good_data and self.weather_current_key is not None:
+                daily_temps = {}
+
+                daily_temps["Max"] = self.temps_list[0]
+                daily_temps["Min"] = self.temps_list[1]
+                daily_temps["Mean"] = self.temps_list[2]
+
+                self.weather[self.weather_current_key] = daily_temps
+
+            elif not self.good_data:
+                self.rejected[self.reject_reason] = (
+                    self.rejected.get(self.reject_reason, 0) + 1
+                )
+
+            self.temps_list.clear()
+
+            self.good_data = True
+
+            self.weather_current_key = None
 
     def retrieve_montly_data(self, year, month):
         """
         Retrieves and returns the max, min, mean, and dates for the requested month as a dictionary.
+        Raises FetchError if the month could not be retrieved.
         """
         try:
             self.weather = {}
+            self.rejected = {}
 
             self.month = "{:0>2}".format(month)
             self.year = year
 
-            url = (
-                f"https://climate.weather.gc.ca/climate_data/daily_data_e.html"
-                f"?StationID=27174&timeframe=2&StartYear=1840&EndYear=2021&Day=29&"
-                f"Year={year}&Month={month}#"
-            )
+            if self.engine == "stream":
+                chunks = self.page_chunks(year, month)
+
+                try:
+                    return self.parse_month(year, month, chunks)
+                finally:
+                    chunks.close()
 
-            with urllib.request.urlopen(url) as response:
-                HTML = str(response.read())
+            HTML = str(self.fetch_page(year, month))
 
-            self.feed(HTML)
+            with METRICS.timer("parse", engine="html"):
+                self.feed(HTML)
+
+            self.count_rows()
 
             return self.weather
 
         except Exception as error:
-            print(f"MyHTMLParser::print_address::{error}")
+            report_error("WeatherScrapper::retrieve_montly_data", error)
+            raise FetchError(
+                f"Could not retrieve {year}-{month:0>2} for station {self.station_id}"
+            ) from error
+
+    def parse_month(self, year, month, chunks):
+        """
+        Parses an already downloaded page for the requested month, given
+        in chunks, with DailyTableParser and returns its MonthRecord.
+        """
+        parser = DailyTableParser(year, month)
+        parser.parse(chunks)
+
+        return self.parsed(year, month, parser.weather, parser.title, parser.rejected, parser.seconds)
+
+    def parsed(self, year, month, weather, title, rejected, seconds):
+        """
+        Takes on the results of a DailyTableParser that parsed the requested
+        month, here or in another process, records its metrics, and returns
+        the MonthRecord.
+        """
+        self.month = "{:0>2}".format(month)
+        self.year = year
+
+        self.weather = weather
+
+        self.is_same_month = title is not None and title == self.title
+        self.title = title
+        self.rejected = rejected
+
+        METRICS.observe("parse", seconds, engine="stream")
+        self.count_rows()
+
+        return self.weather
+
+    def count_rows(self):
+        """
+        Counts the page and the days that were kept and left out.
+        """
+        METRICS.increment("pages")
+        METRICS.increment("rows_parsed", len(self.weather))
+        for reason, count in self.rejected.items():
+            METRICS.increment("rows_rejected", count, reason=reason)
+
+    def page_url(self, year, month):
+        """
+        Returns the URL of the daily data page for the requested month.
+        """
+        return (
+            f"{self.base_url}/climate_data/daily_data_e.html"
+            f"?StationID={self.station_id}&timeframe=2&StartYear=1840&EndYear=2021&Day=29&"
+            f"Year={year}&Month={month}#"
+        )
+
+    def page_chunks(self, year, month):
+        """
+        Yields the daily data page for the requested month in chunks. Pages
+        are streamed off the connection unless they go through the cache,
+        which needs the whole page. A page whose body fails before its first
+        chunk is requested again, up to the session scheduler's retries;
+        after that the parser has part of it and the error is raised.
+        """
+        if self.cache is not None:
+            yield self.fetch_page(year, month)
+            return
+
+        scheduler = getattr(self.session, "scheduler", None)
+        retries = scheduler.retries if scheduler is not None else 0
+
+        for attempt in range(retries + 1):
+            started = False
+
+            try:
+                for chunk in self.session.stream(self.page_url(year, month)):
+                    started = True
+                    yield chunk
+
+                return
+
+            except (OSError, http.client.HTTPException) as error:
+                if started or attempt >= retries:
+                    raise
+
+                METRICS.increment("http_retries", reason=type(error).__name__)
+
+    def fetch_page(self, year, month):
+        """
+        Returns the raw bytes of the daily data page for the requested month,
+        going through the page cache when there is one.
+        """
+        url = self.page_url(year, month)
+
+        if self.cache is not None:
+            return self.cache.fetch(self.session, url, self.station_id, int(year), int(month))
+
+        response = self.session.get(url)
+        response.raise_for_status()
+
+        return response.body
 
     def same_month(self):
         """
@@ -171,3 +334,65 @@ class WeatherScrapper(HTMLParser):
         otherwise returns False.
         """
         return self.is_same_month
+
+
+class BulkDataScrapper():
+    """
+    BulkDataScrapper retrieves a whole year of daily data for a station in
+    one request from the site's bulk CSV download, instead of the twelve
+    pages WeatherScrapper needs. The file is parsed with DailyCSVParser as
+    it streams in. Downloads do not go through the page cache.
+    """
+
+    def __init__(self, session=None, station_id=DEFAULT_STATION_ID, base_url=DEFAULT_BASE_URL):
+        """
+        Initializes BulkDataScrapper. Every scrapper shares DEFAULT_SESSION
+        unless a session is passed in.
+        """
+        self.session = session or DEFAULT_SESSION
+        self.station_id = station_id
+        self.base_url = base_url.rstrip("/")
+
+        self.title = None
+        self.months = {}
+        self.rejected = {}
+
+    def retrieve_yearly_data(self, year):
+        """
+        Retrieves the max, min, mean, and dates for the requested year and
+        returns them as one MonthRecord per month, keyed by month number.
+        Raises FetchError if the year could not be retrieved.
+        """
+        try:
+            parser = DailyCSVParser(year)
+            chunks = self.session.stream(self.csv_url(year))
+
+            try:
+                self.months = parser.parse(chunks)
+            finally:
+                chunks.close()
+
+            self.title = parser.title
+            self.rejected = parser.rejected
+
+            METRICS.observe("parse", parser.seconds, engine="csv")
+            METRICS.increment("pages")
+            METRICS.increment("rows_parsed", sum(len(record) for record in self.months.values()))
+            for reason, count in self.rejected.items():
+                METRICS.increment("rows_rejected", count, reason=reason)
+
+            return self.months
+
+        except Exception as error:
+            report_error("BulkDataScrapper::retrieve_yearly_data", error)
+            raise FetchError(f"Could not retrieve {year} for station {self.station_id}") from error
+
+    def csv_url(self, year):
+        """
+        Returns the URL of the bulk CSV file of daily data for the requested year.
+        """
+        return (
+            f"{self.base_url}/climate_data/bulk_data_e.html"
+            f"?format=csv&stationID={self.station_id}&Year={year}&Month=1&Day=1"
+            f"&timeframe=2&submit=Download+Data"
+        )
@@ -0,0 +1,8 @@
+"""
+This module holds the station the application works with
+when no other station is asked for.
+"""
+
+DEFAULT_STATION_ID = 27174
+
+DEFAULT_STATION_NAME = "Winnipeg, MB"
@@ -0,0 +1,207 @@
+"""
+This module holds DailyTableParser, a streaming parser for the daily data
+table of the Government of Canada climate pages.
+"""
+
+import codecs
+import html
+import re
+import time
+from month_record import MonthRecord
+
+TITLE_PATTERN = re.compile(rb"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+HEADER_PATTERN = re.compile(rb"Max(?:\s|&nbsp;)+Temp", re.IGNORECASE)
+TBODY_PATTERN = re.compile(rb"<tbody[^>]*>", re.IGNORECASE)
+ROW_END_PATTERN = re.compile(rb"</tr\s*>", re.IGNORECASE)
+TBODY_END_PATTERN = re.compile(rb"</tbody\s*>", re.IGNORECASE)
+ABBR_PATTERN = re.compile(rb"<abbr[^>]*>(.*?)</abbr>", re.IGNORECASE | re.DOTALL)
+TD_PATTERN = re.compile(rb"<td[^>]*>(.*?)</td\s*>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(rb"<[^>]*>")
+CHARSET_PATTERN = re.compile(rb"<meta[^>]*charset=[\"']?([\w-]+)", re.IGNORECASE)
+
+class DailyTableParser():
+    """
+    DailyTableParser is fed the raw bytes of a daily data page in chunks as
+    they arrive. It only looks for the page title and the rows of the daily
+    table, the first <tbody> after a "Max Temp" column header, works on
+    bytes until a cell's text is needed, and stops as soon as it reaches the
+    "Sum" row. The result is a MonthRecord, which reads
+    like the {date: {"Max", "Min", "Mean"}} dictionaries WeatherScrapper
+    produces but holds the temperatures as numbers.
+    """
+
+    def __init__(self, year, month, charset="utf-8"):
+        """
+        Initializes DailyTableParser for the requested year and month.
+        """
+        self.year = year
+        self.month = "{:0>2}".format(month)
+        self.charset = charset
+
+        self.title = None
+        self.weather = MonthRecord(year, month)
+        self.rejected = {}
+        self.done = False
+        self.seconds = 0.0
+
+        self.in_header = False
+        self.in_tbody = False
+        self.buffer = b""
+
+    def parse(self, chunks):
+        """
+        Feeds every chunk and returns the MonthRecord. Stops
+        reading from `chunks` once the table has been read. Time spent
+        parsing, not waiting for chunks, is added up in `seconds`.
+        """
+        for chunk in chunks:
+            start = time.perf_counter()
+            self.feed(chunk)
+            self.seconds = self.seconds + time.perf_counter() - start
+
+            if self.done:
+                break
+
+        return self.weather
+
+    def feed(self, chunk):
+        """
+        Processes the next chunk of the page.
+        """
+        if self.done:
+            return
+
+        self.buffer = self.buffer + chunk
+
+        if not self.in_tbody:
+            match = CHARSET_PATTERN.search(self.buffer)
+            if match is not None:
+                self.set_charset(match.group(1))
+
+            if self.title is None:
+                match = TITLE_PATTERN.search(self.buffer)
+                if match is not None:
+                    self.title = self.text(match.group(1))
+
+            if not self.in_header:
+                match = HEADER_PATTERN.search(self.buffer)
+                if match is None:
+                    self.keep_tail()
+                    return
+
+                self.in_header = True
+                self.buffer = self.buffer[match.end():]
+
+            match = TBODY_PATTERN.search(self.buffer)
+            if match is None:
+                self.keep_tail()
+                return
+
+            self.in_tbody = True
+            self.buffer = self.buffer[match.end():]
+
+        position = 0
+
+        tbody_end = TBODY_END_PATTERN.search(self.buffer)
+        end = len(self.buffer) if tbody_end is None else tbody_end.start()
+
+        while True:
+            row_end = ROW_END_PATTERN.search(self.buffer, position, end)
+
+            if row_end is None:
+                self.done = tbody_end is not None
+                break
+
+            self.row(self.buffer[position:row_end.start()])
+            position = row_end.end()
+
+            if self.done:
+                break
+
+        self.buffer = b"" if self.done else self.buffer[position:]
+
+    def keep_tail(self):
+        """
+        Drops the part of the buffer that has been searched once the title
+        is found. A short tail and any tag that is not closed yet are kept,
+        as the header or a tag may be split across chunks.
+        """
+        if self.title is None:
+            return
+
+        cut = len(self.buffer) - 64
+        tag = self.buffer.rfind(b"<")
+        if tag != -1 and self.buffer.find(b">", tag) == -1:
+            cut = min(cut, tag)
+
+        if cut > 0:
+            self.buffer = self.buffer[cut:]
+
+    def set_charset(self, name):
+        """
+        Uses the charset declared by the page if Python knows it.
+        """
+        try:
+            self.charset = codecs.lookup(name.decode("ascii")).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+
+    def row(self, row):
+        """
+        Adds a table row to the MonthRecord if it has a day and
+        usable max, min, and mean temperatures.
+        """
+        first_td = row.find(b"<td")
+        header = row if first_td == -1 else row[:first_td]
+
+        if b"Sum" in TAG_PATTERN.sub(b"", header):
+            self.done = True
+            return
+
+        if first_td == -1:
+            return
+
+        day = ABBR_PATTERN.search(row, 0, first_td)
+        if day is None:
+            return
+
+        temps = []
+        for cell in TD_PATTERN.finditer(row, first_td):
+            temps.append(self.text(cell.group(1)))
+
+            if len(temps) == 3:
+                break
+
+        if len(temps) < 3:
+            self.reject("incomplete")
+            return
+
+        for temp in temps:
+            if "M" in temp:
+                self.reject("missing")
+                return
+
+            if "E" in temp:
+                self.reject("estimated")
+                return
+
+            if not temp:
+                self.reject("incomplete")
+                return
+
+        try:
+            self.weather.append(int(self.text(day.group(1))), *map(float, temps))
+        except ValueError:
+            self.reject("invalid")
+
+    def reject(self, reason):
+        """
+        Counts a day that was left out and why.
+        """
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def text(self, raw):
+        """
+        Returns the decoded, stripped text of an element's content.
+        """
+        return html.unescape(TAG_PATTERN.sub(b"", raw).decode(self.charset, "replace")).strip()
@@ -0,0 +1,41 @@
+"""
+Shared fixtures for the tests. The application modules live at the
+repository root and the stand-in server in benchmarks/, so both are put
+on the import path.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from db_operations import DBOperations
+from dbcm import ConnectionManager
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+
+@pytest.fixture(autouse=True)
+def close_connections():
+    """
+    Closes the connections a test opened, before its database is deleted.
+    """
+    yield
+
+    ConnectionManager.close_all()
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Returns a DBOperations on a new, initialized database.
+    """
+    operations = DBOperations()
+    operations.app_database = str(tmp_path / "weather.sqlite")
+    operations.initialize_db()
+
+    return operations
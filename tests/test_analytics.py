@@ -0,0 +1,131 @@
+"""
+Tests for ClimateAnalytics, comparing incremental syncs with builds
+from scratch.
+"""
+
+import math
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from analytics import ClimateAnalytics
+from month_record import MonthRecord
+
+def mean_on(day):
+    return round(10 * math.sin(day.toordinal() / 58.0) + day.year % 7, 1)
+
+def months(first, last):
+    """
+    Returns a MonthRecord for every month between two dates.
+    """
+    records = {}
+    day = first
+
+    while day <= last:
+        record = records.setdefault((day.year, day.month), MonthRecord(day.year, day.month))
+        mean = mean_on(day)
+        record.append(day.day, mean + 4, mean - 4, mean)
+        day = day + timedelta(days=1)
+
+    return list(records.values())
+
+def stored(db, station_id=27174):
+    with sqlite3.connect(db.app_database) as conn:
+        return (
+            conn.execute(
+                "SELECT * FROM normals WHERE station_id = ? ORDER BY day_of_year", [station_id]
+            ).fetchall(),
+            conn.execute(
+                "SELECT * FROM daily_analytics WHERE station_id = ? ORDER BY date_key", [station_id]
+            ).fetchall(),
+        )
+
+def rebuilt(db, analytics, station_id=27174):
+    """
+    Returns what a build from scratch stores, without keeping it.
+    """
+    before = stored(db, station_id)
+    analytics.build(station_id)
+    after = stored(db, station_id)
+
+    with sqlite3.connect(db.app_database) as conn:
+        conn.execute("DELETE FROM normals WHERE station_id = ?", [station_id])
+        conn.execute("DELETE FROM daily_analytics WHERE station_id = ?", [station_id])
+        conn.executemany("INSERT INTO normals VALUES (?,?,?,?,?,?,?,?)", before[0])
+        conn.executemany("INSERT INTO daily_analytics VALUES (?,?,?,?,?,?)", before[1])
+
+    return after
+
+def save(db, analytics, records, station_id=27174):
+    pairs = [(station_id, record) for record in records]
+    db.save_station_months(pairs)
+    analytics.sync(pairs)
+
+@pytest.fixture
+def analytics(db):
+    climate = ClimateAnalytics(db, base_period=(2018, 2019), rolling_days=10, smoothing_days=5)
+    save(db, climate, months(date(2018, 1, 1), date(2019, 12, 31)))
+
+    return climate
+
+def test_first_sync_builds_normals_and_every_day(analytics, db):
+    normals, days = stored(db)
+
+    assert len(normals) == 366
+    assert len(days) == 730
+    assert normals[59][4] == 0
+
+def test_degree_days_and_anomalies(analytics, db):
+    rows = analytics.daily("2019-07-01", "2019-07-31", 27174)
+    hdd, cdd = analytics.degree_days(2019, 27174)
+
+    for sample_date, anomaly, rolling, heating, cooling in rows:
+        mean = mean_on(date.fromisoformat(sample_date))
+        assert heating == round(max(18.0 - mean, 0), 2)
+        assert cooling == round(max(mean - 18.0, 0), 2)
+
+    assert hdd == pytest.approx(sum(max(18.0 - mean_on(date(2019, 1, 1) + timedelta(days=n)), 0)
+                                    for n in range(365)), abs=0.05)
+    assert cdd >= 0
+    assert abs(sum(row[1] for row in analytics.daily("2018-01-01", "2019-12-31", 27174))) < 50
+
+def test_rolling_mean_needs_half_the_window(analytics):
+    rows = analytics.daily("2018-01-01", "2018-01-10", 27174)
+
+    assert [row[2] is None for row in rows] == [True] * 4 + [False] * 6
+    assert rows[9][2] == pytest.approx(
+        sum(mean_on(date(2018, 1, day)) for day in range(1, 11)) / 10, abs=0.01
+    )
+
+def test_syncing_days_after_the_base_period_matches_a_build(analytics, db):
+    normals = stored(db)[0]
+
+    save(db, analytics, months(date(2020, 1, 1), date(2020, 1, 31)))
+    save(db, analytics, months(date(2020, 2, 1), date(2020, 2, 15)))
+
+    assert stored(db)[0] == normals
+    assert stored(db) == rebuilt(db, analytics)
+
+def test_syncing_days_in_the_base_period_rebuilds_the_normals(analytics, db):
+    normals = stored(db)[0]
+    record = MonthRecord(2019, 7)
+    record.append(4, 40.0, 30.0, 35.0)
+
+    save(db, analytics, [record])
+
+    assert stored(db)[0] != normals
+    assert stored(db) == rebuilt(db, analytics)
+
+def test_a_build_that_fails_keeps_the_stored_analytics(analytics, db):
+    before = stored(db)
+    save(db, analytics, months(date(2020, 1, 1), date(2020, 1, 5)))
+    after_sync = stored(db)
+
+    def fail(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    analytics.save_days = fail
+    analytics.build(27174)
+
+    assert stored(db) == after_sync != before
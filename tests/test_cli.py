@@ -0,0 +1,131 @@
+"""
+Tests for the command line, run through main() against a local ClimateServer.
+"""
+
+import csv
+import os
+import sqlite3
+from datetime import date
+
+import pytest
+
+from climate_server import ClimateServer
+from test_migrations import old_database
+from weather_processor import main
+
+STATIONS = [27174, 51459]
+
+def first_month(months_back):
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months_back
+
+    return index // 12, index % 12 + 1
+
+@pytest.fixture(scope="module")
+def server():
+    with ClimateServer(first_month=first_month(14), seed=1) as running:
+        yield running
+
+@pytest.fixture(scope="module")
+def backfilled(server, tmp_path_factory):
+    """
+    Returns the path of a database both stations were backfilled into.
+    """
+    path = str(tmp_path_factory.mktemp("backfill") / "weather.sqlite")
+    stations = [str(station_id) for station_id in STATIONS]
+
+    assert main(["backfill", "--database", path, "--base-url", server.url,
+                 "--stations", *stations]) == 0
+
+    return path
+
+def query(path, sql):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchall()
+
+def test_backfill_downloads_every_station_s_history(backfilled):
+    months = query(backfilled, "SELECT station_id, COUNT(*) FROM fetch_log GROUP BY station_id")
+
+    assert months == [(station_id, 15) for station_id in STATIONS]
+
+def test_update_downloads_a_new_station_then_only_its_open_months(server, tmp_path):
+    path = str(tmp_path / "weather.sqlite")
+
+    assert main(["update", "--database", path, "--base-url", server.url]) == 0
+    days = query(path, "SELECT COUNT(*) FROM weather")[0][0]
+
+    query(path, "DELETE FROM weather WHERE date_key = (SELECT MAX(date_key) FROM weather)")
+
+    assert main(["update", "--database", path, "--base-url", server.url]) == 0
+    assert query(path, "SELECT COUNT(*) FROM weather")[0][0] == days
+
+def test_export_writes_the_station_s_days_as_csv(backfilled, tmp_path):
+    output = str(tmp_path / "days.csv")
+
+    assert main(["export", "1900-01-01", "2100-12-31", "--database", backfilled,
+                 "--output", output]) == 0
+
+    with open(output, encoding="utf-8", newline="") as exported:
+        rows = list(csv.reader(exported))
+
+    assert rows[0] == ["sample_date", "max_temp", "min_temp", "avg_temp"]
+    assert len(rows) - 1 == query(
+        backfilled, f"SELECT COUNT(*) FROM weather WHERE station_id = {STATIONS[0]}"
+    )[0][0]
+
+def test_export_brings_an_old_database_up_to_date_first(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    old_database(path, [("2020-1-9", -6.0, 0.0, -3.0), ("2020-1-10", -5.0, 1.0, -2.0)])
+    output = str(tmp_path / "days.csv")
+
+    assert main(["export", "2020-01-01", "2020-01-31", "--database", path,
+                 "--output", output]) == 0
+
+    with open(output, encoding="utf-8", newline="") as exported:
+        rows = list(csv.reader(exported))
+
+    assert [row[0] for row in rows[1:]] == ["2020-01-09", "2020-01-10"]
+
+def test_export_from_a_missing_database_fails_without_creating_files(tmp_path):
+    path = str(tmp_path / "missing.sqlite")
+    output = str(tmp_path / "days.csv")
+
+    assert main(["export", "2020-01-01", "2020-01-31", "--database", path,
+                 "--output", output]) == 1
+    assert os.listdir(tmp_path) == []
+
+def test_plot_saves_a_chart(backfilled, tmp_path):
+    year, month = first_month(2)
+    output = str(tmp_path / "line.png")
+
+    assert main(["plot", "line", str(year), str(month), "--database", backfilled,
+                 "--output", output]) == 0
+
+    with open(output, "rb") as image:
+        assert image.read(8) == b"\x89PNG\r\n\x1a\n"
+
+def test_build_analytics_works_out_every_station(backfilled):
+    stations = [str(station_id) for station_id in STATIONS]
+
+    assert main(["build-analytics", "--database", backfilled, "--stations", *stations]) == 0
+
+    assert query(backfilled, "SELECT DISTINCT station_id FROM daily_analytics "
+                             "ORDER BY station_id") == [(station_id,) for station_id in STATIONS]
+
+def test_backfill_offline_replays_the_page_cache_without_the_network(server, tmp_path):
+    cache = str(tmp_path / "cache")
+    online = str(tmp_path / "online.sqlite")
+    offline = str(tmp_path / "offline.sqlite")
+
+    assert main(["backfill", "--database", online, "--base-url", server.url,
+                 "--cache", cache]) == 0
+    assert main(["backfill", "--database", offline, "--base-url", "http://127.0.0.1:9",
+                 "--cache", cache, "--offline"]) == 0
+
+    sql = "SELECT station_id, date_key, max_temp, min_temp, avg_temp FROM weather ORDER BY date_key"
+    assert query(online, sql)
+    assert query(offline, sql) == query(online, sql)
+
+def test_offline_needs_a_cache(tmp_path):
+    with pytest.raises(SystemExit):
+        main(["backfill", "--database", str(tmp_path / "weather.sqlite"), "--offline"])
@@ -0,0 +1,102 @@
+"""
+Tests for ClimateServer, the local stand-in for the climate website.
+"""
+
+import time
+
+from climate_server import ClimateServer
+from http_session import HTTPSession
+from scrape_weather import WeatherScrapper
+
+def page_url(server, year, month, station_id=27174):
+    return WeatherScrapper(station_id=station_id, base_url=server.url).page_url(year, month)
+
+def statuses(server, count):
+    session = HTTPSession()
+
+    return [session.get(page_url(server, 2020, 1)).status for _ in range(count)]
+
+def test_months_outside_the_history_are_answered_with_its_first_or_last_month():
+    with ClimateServer(first_month=(2019, 3), last_month=(2020, 5)) as server:
+        session = HTTPSession()
+
+        def body(year, month):
+            return session.get(page_url(server, year, month)).body
+
+        assert body(2018, 1) == body(2019, 3) != body(2019, 4)
+        assert body(2021, 1) == body(2020, 5) != body(2020, 4)
+
+def test_pages_are_scraped_from_the_base_url():
+    with ClimateServer(first_month=(2019, 3), last_month=(2020, 5)) as server:
+        scrapper = WeatherScrapper(HTTPSession(), station_id=27174, base_url=server.url)
+        weather = scrapper.retrieve_montly_data(2020, 2)
+
+    assert len(weather) == 29
+    assert "February 2020" in scrapper.title
+
+def test_recorded_pages_are_served_when_present(tmp_path):
+    (tmp_path / "27174-2020-01.html").write_bytes(b"<html>recorded</html>")
+
+    with ClimateServer(first_month=(2019, 3), recorded_dir=str(tmp_path)) as server:
+        session = HTTPSession()
+
+        assert session.get(page_url(server, 2020, 1)).body == b"<html>recorded</html>"
+        assert session.get(page_url(server, 2020, 2)).body != b"<html>recorded</html>"
+
+def test_unknown_paths_and_bad_queries_are_refused():
+    with ClimateServer() as server:
+        session = HTTPSession()
+
+        assert session.get(server.url + "/elsewhere").status == 404
+        assert session.get(server.url + "/climate_data/daily_data_e.html?Year=x").status == 400
+
+def test_a_matching_etag_is_answered_304_and_gzip_is_sent_when_asked():
+    with ClimateServer() as server:
+        url = page_url(server, 2020, 1)
+        first = HTTPSession().get(url)
+        second = HTTPSession().get(url, {"If-None-Match": first.header("etag")})
+        plain = HTTPSession(compress=False).get(url)
+
+    assert first.header("content-encoding") == "gzip"
+    assert first.body == plain.body
+    assert plain.header("content-encoding") is None
+    assert second.status == 304
+
+def test_errors_are_injected_at_the_error_rate_and_counted():
+    with ClimateServer(error_rate=1.0) as server:
+        answered = statuses(server, 10)
+
+    assert set(answered) <= {500, 503}
+    assert sum(server.statuses.values()) == server.requests == 10
+
+def test_throttled_requests_get_a_retry_after():
+    with ClimateServer(throttle_rate=1.0, retry_after=7) as server:
+        response = HTTPSession().get(page_url(server, 2020, 1))
+
+    assert response.status == 429
+    assert response.header("retry-after") == "7"
+
+def test_requests_beyond_the_max_rate_are_throttled():
+    with ClimateServer(max_rate=5) as server:
+        answered = statuses(server, 20)
+
+    assert answered[:5] == [200] * 5
+    assert answered.count(429) >= 10
+
+def test_the_same_seed_injects_the_same_errors():
+    def run():
+        with ClimateServer(error_rate=0.5, seed=3) as server:
+            return statuses(server, 20)
+
+    first = run()
+
+    assert first == run()
+    assert 200 in first and set(first) - {200}
+
+def test_every_response_waits_the_latency():
+    with ClimateServer(latency=0.05) as server:
+        session = HTTPSession()
+        start = time.perf_counter()
+        session.get(page_url(server, 2020, 1))
+
+        assert time.perf_counter() - start >= 0.05
@@ -0,0 +1,61 @@
+"""
+Tests for columnar fetches and the vectorized box plot bucketing.
+"""
+
+import numpy as np
+import pytest
+
+from weather_processor import WeatherProcessor
+
+@pytest.fixture
+def filled(db):
+    days = {}
+    for year in (2019, 2020):
+        for month in range(1, 13):
+            for day in (1, 15, 28):
+                days[f"{year}-{month}-{day}"] = {
+                    "Max": month + day / 100 + 5, "Min": month + day / 100 - 5,
+                    "Mean": month + day / 100 + year % 10,
+                }
+
+    db.save_data(days, 27174)
+
+    return db
+
+def test_columns_are_typed_ordered_and_read_only(filled):
+    columns = filled.fetch_columns("2019-01-01", "2020-12-31", ("avg_temp", "max_temp"), 27174)
+
+    assert columns["dates"].dtype == np.dtype("datetime64[D]")
+    assert columns["avg_temp"].dtype == columns["max_temp"].dtype == np.float32
+    assert len(columns["dates"]) == 72
+    assert np.all(np.diff(columns["dates"]).astype(int) > 0)
+    assert str(columns["dates"][0]) == "2019-01-01" and str(columns["dates"][-1]) == "2020-12-28"
+    assert columns["avg_temp"][0] == pytest.approx(1.01 + 9)
+
+    with pytest.raises(ValueError):
+        columns["avg_temp"][0] = 0.0
+
+def test_columns_match_the_rows(filled):
+    columns = filled.fetch_columns("2020-03-01", "2020-05-31", ("avg_temp",), 27174)
+    rows = filled.fetch_data("2020-03-01", "2020-05-31", 27174)
+
+    assert [str(day) for day in columns["dates"]] == [row[0] for row in rows]
+    assert np.allclose(columns["avg_temp"], [row[1] for row in rows])
+
+def test_unknown_columns_are_refused(filled):
+    assert filled.fetch_columns("2020-01-01", "2020-12-31", ("avg_temp; DROP TABLE weather",)) is None
+    assert filled.count_rows_in_table(27174) == (72,)
+
+def test_box_plot_data_groups_mean_temperatures_by_calendar_month(filled):
+    app = WeatherProcessor(station_id=27174)
+    app.db.app_database = filled.app_database
+
+    groups = app.box_plot_data(2019, 2020)
+
+    assert len(groups) == 12
+    for month, group in enumerate(groups, start=1):
+        expected = [
+            row[1] for row in filled.fetch_data("2019-01-01", "2020-12-31", 27174)
+            if int(row[0][5:7]) == month
+        ]
+        assert np.allclose(group, expected)
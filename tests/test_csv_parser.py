@@ -0,0 +1,142 @@
+"""
+Tests for the yearly bulk CSV path: DailyCSVParser, BulkDataScrapper,
+and crawling stations year by year.
+"""
+
+from datetime import date
+
+from climate_server import ClimateServer
+from csv_parser import DailyCSVParser
+from fixture_pages import CSV_HEADER, daily_values, render_year_csv
+from month_record import MonthRecord
+from scrape_weather import BulkDataScrapper
+from weather_processor import WeatherProcessor
+
+def csv_file(*lines):
+    header = ",".join(f'"{name}"' for name in CSV_HEADER)
+    rows = [header]
+
+    for sample_date, maximum, max_flag, minimum, min_flag, mean, mean_flag in lines:
+        year, month, day = sample_date.split("-")
+        rows.append(",".join(f'"{value}"' for value in [
+            "-97.24", "49.92", "WINNIPEG", "5023222", sample_date, year, month, day, "",
+            maximum, max_flag, minimum, min_flag, mean, mean_flag,
+        ] + [""] * 12))
+
+    return ("\ufeff" + "\r\n".join(rows) + "\r\n").encode("utf-8")
+
+def chunked(data, size):
+    return [data[offset:offset + size] for offset in range(0, len(data), size)]
+
+def test_usable_days_are_kept_and_the_rest_counted_by_reason():
+    data = csv_file(
+        ("2020-01-01", "1.5", "", "-3.0", "", "-0.8", ""),
+        ("2020-01-02", "", "M", "-3.0", "", "-0.8", ""),
+        ("2020-01-03", "1.5", "", "-3.0", "", "-0.8", "E"),
+        ("2020-01-04", "warm", "", "-3.0", "", "-0.8", ""),
+        ("2020-02-29", "4.0", "", "0.0", "", "2.0", ""),
+    )
+
+    parser = DailyCSVParser(2020)
+    months = parser.parse(chunked(data, 5))
+
+    assert sorted(months) == [1, 2]
+    assert months[1].to_dict() == {"2020-01-01": {"Max": 1.5, "Min": -3.0, "Mean": -0.8}}
+    assert list(months[2]) == ["2020-02-29"]
+    assert parser.rejected == {"missing": 1, "estimated": 1, "invalid": 1}
+    assert parser.title == "WINNIPEG"
+
+def test_lines_from_other_years_are_skipped():
+    data = csv_file(
+        ("2019-12-31", "1.0", "", "0.0", "", "0.5", ""),
+        ("2020-01-01", "1.0", "", "0.0", "", "0.5", ""),
+    )
+
+    months = DailyCSVParser(2020).parse([data])
+
+    assert [str(record) for record in months.values()] == ["MonthRecord(2020-01, 1 days)"]
+
+def test_a_generated_year_parses_to_its_unflagged_days():
+    data = render_year_csv(27174, 2020, first_month=(2020, 1), last_month=(2020, 12))
+
+    months = DailyCSVParser(2020).parse(chunked(data, 4096))
+
+    for month in range(1, 13):
+        expected = {
+            f"2020-{month:02}-{day:02}": tuple(float(temp) for temp in temps)
+            for day, temps, flags, *_ in daily_values(27174, 2020, month)
+            if not any(flags)
+        }
+        got = {sample_date: tuple(temps.values()) for sample_date, temps in months[month].items()}
+
+        assert got == expected
+
+def test_bulk_scrapper_reads_a_year_from_the_server():
+    with ClimateServer(first_month=(2020, 3), last_month=(2020, 5)) as server:
+        scrapper = BulkDataScrapper(station_id=27174, base_url=server.url)
+        months = scrapper.retrieve_yearly_data(2020)
+
+    assert sorted(month for month, record in months.items() if len(record)) == [3, 4, 5]
+    assert all(isinstance(record, MonthRecord) for record in months.values())
+
+def test_bulk_crawl_goes_on_past_empty_years_until_several_in_a_row(db):
+    this_year = date.today().year
+    with_data = {this_year - 1, this_year - 2, this_year - 5}
+    asked = []
+
+    def retrieve_year(year, station_id):
+        asked.append(year)
+        months = {month: MonthRecord(year, month) for month in range(1, 13)}
+
+        if year in with_data:
+            months[6].append(1, 20.0, 10.0, 15.0)
+
+        return months, None
+
+    app = WeatherProcessor(source="csv")
+    app.db.app_database = db.app_database
+    app.retrieve_year = retrieve_year
+
+    app.retrieve_stations_bulk([27174], workers=1, empty_years=3)
+
+    assert db.count_rows_in_table(27174) == (3,)
+    assert min(asked) == this_year - 8
+
+def test_bulk_crawl_gives_up_on_a_station_whose_every_year_fails(db):
+    asked = []
+
+    def retrieve_year(year, station_id):
+        asked.append(year)
+        return None, None
+
+    app = WeatherProcessor(source="csv")
+    app.db.app_database = db.app_database
+    app.retrieve_year = retrieve_year
+
+    assert app.retrieve_stations_bulk([27174], workers=1, failed_years=3) == [27174]
+    assert asked == [date.today().year - offset for offset in range(3)]
+    assert db.count_rows_in_table(27174) == (0,)
+
+def test_bulk_crawl_leaves_a_failed_year_as_a_gap_and_goes_on(db):
+    this_year = date.today().year
+    asked = []
+
+    def retrieve_year(year, station_id):
+        asked.append(year)
+
+        if year == this_year - 2:
+            return None, None
+
+        months = {month: MonthRecord(year, month) for month in range(1, 13)}
+        if year in (this_year - 1, this_year - 3):
+            months[6].append(1, 20.0, 10.0, 15.0)
+
+        return months, None
+
+    app = WeatherProcessor(source="csv")
+    app.db.app_database = db.app_database
+    app.retrieve_year = retrieve_year
+
+    assert app.retrieve_stations_bulk([27174], workers=1, empty_years=3) == []
+    assert db.count_rows_in_table(27174) == (2,)
+    assert min(asked) == this_year - 6
@@ -0,0 +1,83 @@
+"""
+Tests for DailyStore.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from daily_store import DailyStore
+from month_record import MonthRecord
+
+def day(mean):
+    return {"Max": mean + 5, "Min": mean - 5, "Mean": mean}
+
+@pytest.fixture
+def store(db, tmp_path):
+    db.save_data({"2020-01-01": day(1.0), "2020-01-03": day(3.0)}, 27174)
+
+    daily_store = DailyStore(str(tmp_path / "daily_store"))
+    daily_store.build(db, 27174)
+    db.daily_store = daily_store
+
+    return daily_store
+
+def assert_matches_database(store, db, station_id=27174):
+    stored = store.read(station_id, "0001-01-01", "9999-12-31")
+    kept = ~np.isnan(stored["avg_temp"])
+    columns = db.fetch_columns("0001-01-01", "9999-12-31", ("max_temp", "min_temp", "avg_temp"), station_id)
+
+    assert np.array_equal(stored["dates"][kept], columns["dates"])
+    for column in ("max_temp", "min_temp", "avg_temp"):
+        assert np.array_equal(stored[column][kept], columns[column])
+
+def test_days_are_found_by_date_with_nan_for_days_without_data(store):
+    assert store.day(27174, "2020-01-03") == (8.0, -2.0, 3.0)
+    assert all(math.isnan(value) for value in store.day(27174, "2020-01-02"))
+    assert all(math.isnan(value) for value in store.day(27174, "1999-01-01"))
+    assert store.day(51459, "2020-01-01") is None
+
+def test_ranges_are_read_only_views_clipped_to_the_stored_days(store):
+    days = store.read(27174, "2019-12-25", "2020-01-02")
+
+    assert [str(value) for value in days["dates"]] == ["2020-01-01", "2020-01-02"]
+    assert not days["avg_temp"].flags.writeable
+
+def test_saves_after_the_last_day_grow_the_file(store, db):
+    db.save_data({"2020-02-10": day(10.0)}, 27174)
+
+    assert store.day(27174, "2020-02-10") == (15.0, 5.0, 10.0)
+    assert_matches_database(store, db)
+
+def test_saves_before_the_first_day_and_month_records_rewrite_it(store, db):
+    record = MonthRecord(2019, 12)
+    record.append(30, 4.0, -4.0, 0.5)
+    db.save_station_months([(27174, record)])
+    db.save_data({"2020-01-01": day(-1.0)}, 27174)
+
+    assert store.day(27174, "2019-12-30") == (4.0, -4.0, 0.5)
+    assert store.day(27174, "2020-01-01") == (4.0, -6.0, -1.0)
+    assert_matches_database(store, db)
+
+def test_another_reader_sees_the_file_after_it_grows(store, db, tmp_path):
+    reader = DailyStore(str(tmp_path / "daily_store"))
+    assert len(reader.columns(27174)) == 3
+
+    db.save_data({"2020-03-01": day(5.0)}, 27174)
+
+    assert len(reader.columns(27174)) == 61
+    assert reader.day(27174, "2020-03-01") == (10.0, 0.0, 5.0)
+
+def test_a_new_station_gets_its_file_on_its_first_save(store, db):
+    db.save_data({"2020-05-01": day(7.0)}, 51459)
+
+    assert store.day(51459, "2020-05-01") == (12.0, 2.0, 7.0)
+
+def test_purging_a_station_removes_only_its_file(store, db):
+    db.save_data({"2020-05-01": day(7.0)}, 51459)
+
+    db.purge_station(27174)
+
+    assert store.day(27174, "2020-01-01") is None
+    assert store.day(51459, "2020-05-01") == (12.0, 2.0, 7.0)
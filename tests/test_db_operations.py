@@ -0,0 +1,86 @@
+"""
+Tests for saving and fetching days with DBOperations.
+"""
+
+import sqlite3
+
+import pytest
+
+from month_record import MonthRecord
+
+def weather(*days):
+    return {
+        sample_date: {"Max": maximum, "Min": minimum, "Mean": mean}
+        for sample_date, maximum, minimum, mean in days
+    }
+
+def table(db, sql, *parameters):
+    with sqlite3.connect(db.app_database) as conn:
+        return conn.execute(sql, parameters).fetchall()
+
+def test_saved_days_are_fetched_in_date_order_with_padded_dates(db):
+    db.save_data(weather(("2020-1-10", 3.0, -1.0, 1.0), ("2020-1-9", 2.0, -2.0, 0.0)), 27174)
+
+    assert db.fetch_days("2020-01-01", "2020-01-31", 27174) == [
+        ("2020-01-09", 2.0, -2.0, 0.0),
+        ("2020-01-10", 3.0, -1.0, 1.0),
+    ]
+    assert table(db, "SELECT date_key, year, month, day FROM weather ORDER BY date_key") == [
+        (20200109, 2020, 1, 9), (20200110, 2020, 1, 10)
+    ]
+
+def test_saving_a_day_again_overwrites_it(db):
+    db.save_data(weather(("2020-01-09", 2.0, -2.0, 0.0)), 27174)
+    db.save_data(weather(("2020-01-09", 5.0, 1.0, 3.0)), 27174)
+
+    assert db.count_rows_in_table(27174) == (1,)
+    assert db.fetch_days("2020-01-09", "2020-01-09", 27174) == [("2020-01-09", 5.0, 1.0, 3.0)]
+
+def test_save_many_writes_every_month_in_one_batch(db):
+    db.save_many([
+        weather(("2020-01-31", 1.0, 0.0, 0.5)),
+        weather(("2020-02-01", 2.0, 0.0, 1.0), ("2020-02-02", 3.0, 0.0, 1.5)),
+    ], 27174)
+
+    assert db.count_rows_in_table(27174) == (3,)
+
+def test_failed_batch_saves_nothing_and_raises(db):
+    db.save_data(weather(("2019-12-31", 1.0, 0.0, 0.5)), 27174)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.save_station_months(
+            [
+                (27174, weather(("2020-01-01", 1.0, 0.0, 0.5))),
+                (27174, weather(("2020-01-02", 1.0, None, 0.5))),
+            ],
+            [(27174, 2020, 1, 2)]
+        )
+
+    assert db.fetch_days("0001-01-01", "9999-12-31", 27174) == [("2019-12-31", 1.0, 0.0, 0.5)]
+    assert table(db, "SELECT COUNT(1) FROM fetch_log") == [(0,)]
+
+def test_fetch_log_records_months_without_usable_days(db):
+    db.save_station_months(
+        [(27174, weather(("2020-01-01", 1.0, 0.0, 0.5))), (27174, {})],
+        [(27174, 2020, 1, 1), (27174, 2020, 2, 0)]
+    )
+
+    assert table(db, "SELECT year, month, rows FROM fetch_log ORDER BY month") == [
+        (2020, 1, 1), (2020, 2, 0)
+    ]
+
+def test_month_records_and_dictionaries_save_the_same_rows(db):
+    record = MonthRecord(2020, 2)
+    record.append(1, 2.5, -1.5, 0.5)
+    record.append(29, 4.0, 1.0, 2.5)
+
+    db.save_station_months([(27174, record), (51459, record.to_dict())])
+
+    assert db.fetch_days("2020-02-01", "2020-02-29", 27174) == \
+        db.fetch_days("2020-02-01", "2020-02-29", 51459)
+    assert len(db.fetch_days("2020-02-01", "2020-02-29", 27174)) == 2
+
+def test_unknown_stations_are_registered_when_saved(db):
+    db.save_data(weather(("2020-01-01", 1.0, 0.0, 0.5)), 51459)
+
+    assert (51459, "Station 51459") in db.stations()
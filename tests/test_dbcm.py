@@ -0,0 +1,93 @@
+"""
+Tests for DBCM and the ConnectionManager behind it.
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from dbcm import DBCM, ConnectionManager
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "weather.sqlite")
+
+    with DBCM(path) as cursor:
+        cursor.execute("create table days (day integer primary key)")
+        cursor.execute("insert into days values (1)")
+
+    return path
+
+def days(path):
+    with DBCM(path, read_only=True) as cursor:
+        return [day for day, in cursor.execute("select day from days order by day")]
+
+def in_thread(function):
+    """
+    Runs `function` in another thread and returns its result, or None if
+    it did not finish within five seconds.
+    """
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    return results[0] if results else None
+
+def test_connections_stay_open_in_wal_mode(path):
+    manager = ConnectionManager.for_database(path)
+
+    with DBCM(path) as cursor:
+        writer = cursor.connection
+        assert cursor.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    with DBCM(path) as cursor:
+        assert cursor.connection is writer is manager.writer
+
+    with DBCM(path, read_only=True) as first, DBCM(path, read_only=True) as second:
+        assert first.connection is second.connection is not writer
+
+def test_a_reader_queries_while_another_thread_is_writing(path):
+    writing = threading.Event()
+    done = threading.Event()
+
+    def write():
+        with DBCM(path) as cursor:
+            cursor.execute("insert into days values (2)")
+            writing.set()
+            done.wait(timeout=5)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writing.wait(timeout=5)
+
+    try:
+        assert in_thread(lambda: days(path)) == [1]
+    finally:
+        done.set()
+        writer.join()
+
+    assert days(path) == [1, 2]
+
+def test_read_only_connections_refuse_to_write(path):
+    with pytest.raises(sqlite3.OperationalError):
+        with DBCM(path, read_only=True) as cursor:
+            cursor.execute("insert into days values (3)")
+
+    assert days(path) == [1]
+
+def test_an_exception_rolls_back_and_releases_the_write_lock(path):
+    with pytest.raises(ValueError):
+        with DBCM(path) as cursor:
+            cursor.execute("insert into days values (2)")
+            raise ValueError("failed part way")
+
+    def write():
+        with DBCM(path) as cursor:
+            cursor.execute("insert into days values (3)")
+
+        return True
+
+    assert in_thread(write) is True
+    assert days(path) == [1, 3]
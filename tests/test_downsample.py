@@ -0,0 +1,57 @@
+"""
+Tests for Largest-Triangle-Three-Buckets downsampling.
+"""
+
+import math
+
+import matplotlib.pyplot as plt
+import pytest
+
+from downsample import lttb
+from plot_operations import PlotOperations
+
+def series(length):
+    x_values = list(range(length))
+    y_values = [math.sin(x / 50) * 10 for x in x_values]
+
+    return x_values, y_values
+
+@pytest.mark.parametrize("length, threshold", [(10000, 500), (1001, 3), (365, 100)])
+def test_keeps_threshold_points_with_the_ends_in_order(length, threshold):
+    x_values, y_values = series(length)
+
+    sampled_x, sampled_y = lttb(x_values, y_values, threshold)
+
+    assert len(sampled_x) == len(sampled_y) == threshold
+    assert (sampled_x[0], sampled_x[-1]) == (0, length - 1)
+    assert sampled_x == sorted(set(sampled_x))
+    assert all(y_values[x] == y for x, y in zip(sampled_x, sampled_y))
+
+@pytest.mark.parametrize("threshold", [2, 0, 100, 200])
+def test_short_series_or_small_thresholds_are_returned_whole(threshold):
+    x_values, y_values = series(100)
+
+    assert lttb(x_values, y_values, threshold) == (x_values, y_values)
+
+def test_peaks_and_troughs_survive():
+    x_values = list(range(3000))
+    y_values = [0.0] * 3000
+    y_values[1234] = 40.0
+    y_values[2345] = -40.0
+
+    sampled_x, sampled_y = lttb(x_values, y_values, 100)
+
+    assert 1234 in sampled_x and 2345 in sampled_x
+    assert max(sampled_y) == 40.0 and min(sampled_y) == -40.0
+
+def test_range_plot_draws_at_most_max_points():
+    timestamps = [f"{year}-{month:02}-{day:02}"
+                  for year in range(1990, 2020) for month in range(1, 13) for day in range(1, 29)]
+    temperatures = [float(index % 40) for index in range(len(timestamps))]
+
+    figure = plt.figure()
+    axes = figure.add_subplot()
+    PlotOperations.draw_range_plot(axes, temperatures, timestamps, "1990-01-01", "2019-12-28", 500)
+
+    assert len(axes.lines[0].get_xdata()) == 500
+    plt.close(figure)
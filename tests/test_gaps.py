@@ -0,0 +1,83 @@
+"""
+Tests for finding the months worth downloading again and for updates.
+"""
+
+import calendar
+import sqlite3
+from datetime import date, timedelta
+
+from climate_server import ClimateServer
+from weather_processor import WeatherProcessor
+
+def month_days(year, month, days=None):
+    last = calendar.monthrange(year, month)[1]
+
+    return {
+        f"{year}-{month:02}-{day:02}": {"Max": 1.0, "Min": -1.0, "Mean": 0.0}
+        for day in range(1, (days or last) + 1)
+    }
+
+def log_fetch(db, station_id, year, month, fetched_on):
+    with sqlite3.connect(db.app_database) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO fetch_log VALUES (?,?,?,?,?)",
+            [station_id, year, month, fetched_on.isoformat(), 0]
+        )
+
+def test_a_station_without_days_has_no_gaps(db):
+    assert db.gaps(27174, today=date(2020, 4, 15)) == []
+
+def test_incomplete_and_absent_months_up_to_today_newest_first(db):
+    db.save_many([month_days(2020, 1), month_days(2020, 2, days=20)], 27174)
+
+    assert db.gaps(27174, today=date(2020, 4, 15)) == [(2020, 4), (2020, 3), (2020, 2)]
+
+def test_gaps_start_at_the_first_stored_month_and_cross_years(db):
+    db.save_many([month_days(2019, 11), month_days(2019, 12)], 27174)
+
+    assert db.gaps(27174, today=date(2020, 2, 1)) == [(2020, 2), (2020, 1)]
+
+def test_a_month_fetched_after_it_settled_is_not_asked_for_again(db):
+    db.save_many([month_days(2020, 1, days=30)], 27174)
+    log_fetch(db, 27174, 2020, 1, date(2020, 1, 31) + timedelta(days=46))
+
+    assert db.gaps(27174, today=date(2020, 3, 31)) == [(2020, 3), (2020, 2)]
+
+def test_a_month_fetched_while_still_open_is_asked_for_again(db):
+    db.save_many([month_days(2020, 1, days=30)], 27174)
+    log_fetch(db, 27174, 2020, 1, date(2020, 1, 31) + timedelta(days=45))
+
+    assert (2020, 1) in db.gaps(27174, today=date(2020, 3, 31))
+
+def test_other_stations_do_not_fill_gaps(db):
+    db.save_many([month_days(2020, 1)], 27174)
+    db.save_many([month_days(2020, 1, days=10)], 51459)
+
+    assert db.gaps(27174, today=date(2020, 1, 31)) == []
+    assert db.gaps(51459, today=date(2020, 1, 31)) == [(2020, 1)]
+
+def test_update_downloads_the_gaps_with_the_given_workers(db):
+    today = date.today()
+    first = date(today.year, today.month, 1) - timedelta(days=200)
+    db.save_many([month_days(first.year, first.month, days=3)], 27174)
+
+    with ClimateServer(first_month=(first.year, first.month)) as server:
+        app = WeatherProcessor(station_id=27174, base_url=server.url)
+        app.db.app_database = db.app_database
+
+        used = []
+        download_months = app.download_months
+        app.download_months = lambda year_months, workers: (
+            used.append(workers) or download_months(year_months, workers)
+        )
+
+        app.update(3)
+
+    assert used == [3]
+    assert db.count_rows_in_table(27174)[0] > 150
+
+    settled = today - timedelta(days=46)
+    assert all(
+        date(year, month, calendar.monthrange(year, month)[1]) > settled
+        for year, month in db.gaps(27174)
+    )
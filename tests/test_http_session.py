@@ -0,0 +1,176 @@
+"""
+Tests for HTTPSession: pooling, retries, and decoding.
+"""
+
+import http.client
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_session import DeflateDecompressor, HTTPSession
+from scheduler import RequestScheduler
+from scrape_weather import WeatherScrapper
+
+PAGE = b"<html>" + b"x" * 4000 + b"</html>"
+
+class DroppingServer(ThreadingHTTPServer):
+    """
+    Answers every GET with PAGE, but for the first `drops` requests sends
+    only its first `sent` bytes and then closes the connection. With
+    `hang_up` every connection is closed after one response without
+    saying so, like a keep-alive connection the server timed out.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, drops=0, sent=0, hang_up=False):
+        ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), DroppingHandler)
+        self.drops = drops
+        self.sent = sent
+        self.hang_up = hang_up
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class DroppingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+
+        with self.server.lock:
+            self.server.connections = self.server.connections + 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests = self.server.requests + 1
+            drop = self.server.requests <= self.server.drops
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+
+        if drop:
+            self.wfile.write(PAGE[:self.server.sent])
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self.wfile.write(PAGE)
+            self.close_connection = self.server.hang_up
+
+    def log_message(self, format, *args):
+        pass
+
+
+def scheduled(retries=4):
+    return HTTPSession(scheduler=RequestScheduler(retries=retries, backoff=0))
+
+def test_a_body_dropped_midway_is_retried():
+    with DroppingServer(drops=2, sent=len(PAGE) // 2) as server:
+        response = scheduled().get(server.url + "/page")
+
+    assert response.body == PAGE
+    assert server.requests == 3
+
+def test_without_a_scheduler_a_dropped_body_is_raised():
+    with DroppingServer(drops=1, sent=len(PAGE) // 2) as server:
+        with pytest.raises(http.client.IncompleteRead):
+            HTTPSession().get(server.url + "/page")
+
+def test_a_dropped_body_is_raised_once_the_retries_run_out():
+    with DroppingServer(drops=3, sent=len(PAGE) // 2) as server:
+        with pytest.raises(http.client.IncompleteRead):
+            scheduled(retries=2).get(server.url + "/page")
+
+    assert server.requests == 3
+
+def test_a_streamed_page_dropped_before_its_first_chunk_is_requested_again():
+    with DroppingServer(drops=2, sent=0) as server:
+        scrapper = WeatherScrapper(scheduled(), base_url=server.url)
+        chunks = list(scrapper.page_chunks(2020, 1))
+
+    assert b"".join(chunks) == PAGE
+    assert server.requests == 3
+
+def test_a_streamed_page_dropped_after_a_chunk_is_not_requested_again():
+    with DroppingServer(drops=1, sent=len(PAGE) // 2) as server:
+        scrapper = WeatherScrapper(scheduled(), base_url=server.url)
+        chunks = []
+
+        with pytest.raises(http.client.IncompleteRead):
+            for chunk in scrapper.page_chunks(2020, 1):
+                chunks.append(chunk)
+
+    assert b"".join(chunks) == PAGE[:len(PAGE) // 2]
+    assert server.requests == 1
+
+def test_requests_one_after_another_reuse_one_connection():
+    session = HTTPSession()
+
+    with DroppingServer() as server:
+        pages = [session.get(server.url + f"/page/{number}").body for number in range(5)]
+
+    assert pages == [PAGE] * 5
+    assert server.connections == 1
+
+def test_concurrent_requests_open_at_most_pool_size_connections():
+    session = HTTPSession(pool_size=2)
+    pages = []
+
+    def fetch():
+        for number in range(5):
+            pages.append(session.get(server.url + f"/page/{number}").body)
+
+    with DroppingServer() as server:
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert pages == [PAGE] * 20
+    assert server.connections <= 2
+
+def test_a_stale_keep_alive_connection_is_reopened():
+    session = HTTPSession()
+
+    with DroppingServer(hang_up=True) as server:
+        first = session.get(server.url + "/page/1")
+        second = session.get(server.url + "/page/2")
+
+    assert first.body == second.body == PAGE
+    assert server.requests == 2
+    assert server.connections == 2
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("gzip", lambda data: zlib.compress(data, wbits=16 + zlib.MAX_WBITS)),
+    ("deflate", zlib.compress),
+    ("deflate", lambda data: zlib.compress(data, wbits=-zlib.MAX_WBITS)),
+])
+def test_compressed_bodies_are_decoded(encoding, compress):
+    assert HTTPSession.decode(compress(PAGE), encoding) == PAGE
+
+@pytest.mark.parametrize("wbits", [zlib.MAX_WBITS, -zlib.MAX_WBITS])
+def test_zlib_and_raw_deflate_bodies_are_decoded_a_byte_at_a_time(wbits):
+    body = zlib.compress(PAGE, wbits=wbits)
+    decompressor = DeflateDecompressor()
+
+    chunks = [decompressor.decompress(body[offset:offset + 1]) for offset in range(len(body))]
+
+    assert b"".join(chunks) + decompressor.flush() == PAGE
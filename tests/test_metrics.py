@@ -0,0 +1,47 @@
+"""
+Tests for Metrics.
+"""
+
+import json
+
+from metrics import Metrics
+
+def test_int_and_str_label_values_are_one_series_and_export():
+    metrics = Metrics()
+    metrics.increment("api_responses", status=200)
+    metrics.increment("api_responses", status="200")
+    metrics.increment("api_responses", status="404")
+    metrics.observe("db_query", 0.5, station=27174)
+    metrics.observe("db_query", 0.25, station="all")
+
+    snapshot = json.loads(metrics.to_json())
+    prometheus = metrics.to_prometheus()
+
+    assert {"name": "api_responses", "labels": {"status": "200"}, "value": 2} in snapshot["counters"]
+    assert 'weather_api_responses_total{status="200"} 2' in prometheus
+    assert 'weather_db_query_seconds_count{station="27174"} 1' in prometheus
+    assert 'weather_db_query_seconds_max{station="all"} 0.250000' in prometheus
+
+def test_timers_count_total_and_max():
+    metrics = Metrics()
+
+    for seconds in (0.1, 0.4, 0.2):
+        metrics.observe("parse", seconds, engine="stream")
+
+    timer = json.loads(metrics.to_json())["timers"][0]
+
+    assert (timer["count"], timer["max_seconds"]) == (3, 0.4)
+    assert abs(timer["total_seconds"] - 0.7) < 1e-9
+
+def test_errors_are_counted_by_class_and_kept(capsys):
+    metrics = Metrics(max_errors=2)
+
+    for message in ("one", "two", "three"):
+        metrics.error("DBOperations::save_data", ValueError(message))
+
+    assert metrics.total("errors") == 3
+    assert [error["message"] for error in metrics.snapshot()["errors"]] == ["two", "three"]
+    assert "DBOperations::save_data::three" in capsys.readouterr().out
+
+def test_label_values_are_escaped():
+    assert Metrics.labels((("path", 'a"b\\c\nd'),)) == '{path="a\\"b\\\\c\\nd"}'
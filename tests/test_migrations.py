@@ -0,0 +1,106 @@
+"""
+Tests for bringing databases made by older versions up to date.
+"""
+
+import sqlite3
+
+from db_operations import SCHEMA_VERSION, DBOperations, date_key
+from stations import DEFAULT_STATION_ID
+
+OLD_WEATHER_TABLE = (
+    """
+    create table weather
+    (id integer primary key autoincrement not null,
+    sample_date text not null UNIQUE,
+    location text not null,
+    min_temp real not null,
+    max_temp real not null,
+    avg_temp real not null);
+    """
+)
+
+def old_database(path, rows):
+    """
+    Writes a database in the first, unpadded and unkeyed, layout.
+    """
+    with sqlite3.connect(path) as conn:
+        conn.execute(OLD_WEATHER_TABLE)
+        conn.executemany(
+            "INSERT INTO weather (sample_date, location, min_temp, max_temp, avg_temp) "
+            "VALUES (?, 'Winnipeg, MB', ?, ?, ?)",
+            rows
+        )
+
+def open_database(path):
+    db = DBOperations()
+    db.app_database = str(path)
+    db.initialize_db()
+
+    return db
+
+def test_date_key_sorts_in_calendar_order_for_unpadded_dates():
+    assert date_key("2020-1-9") == 20200109
+    assert date_key(" 2020-01-10 ") == 20200110
+    assert sorted(["2020-1-10", "2020-1-9", "2019-12-31"], key=date_key) == [
+        "2019-12-31", "2020-1-9", "2020-1-10"
+    ]
+
+def test_unpadded_dates_are_padded_keyed_and_fetched_in_calendar_order(tmp_path):
+    path = tmp_path / "old.sqlite"
+    old_database(path, [
+        ("2020-1-10", -5.0, 1.0, -2.0),
+        ("2020-1-9", -6.0, 0.0, -3.0),
+        ("2019-12-31", -7.0, -1.0, -4.0),
+    ])
+
+    db = open_database(path)
+
+    assert [row[0] for row in db.fetch_data("2019-12-01", "2020-01-31")] == [
+        "2019-12-31", "2020-01-09", "2020-01-10"
+    ]
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute(
+            "SELECT sample_date, date_key, year, month, day FROM weather ORDER BY date_key"
+        ).fetchall() == [
+            ("2019-12-31", 20191231, 2019, 12, 31),
+            ("2020-01-09", 20200109, 2020, 1, 9),
+            ("2020-01-10", 20200110, 2020, 1, 10),
+        ]
+        assert conn.execute("PRAGMA user_version").fetchone() == (SCHEMA_VERSION,)
+
+def test_the_latest_of_two_spellings_of_a_day_is_kept(tmp_path):
+    path = tmp_path / "old.sqlite"
+    old_database(path, [("2020-01-09", -6.0, 0.0, -3.0), ("2020-1-9", -8.0, 2.0, -5.0)])
+
+    db = open_database(path)
+
+    assert db.fetch_days("2020-01-09", "2020-01-09") == [("2020-01-09", 2.0, -8.0, -5.0)]
+
+def test_migrating_twice_changes_nothing(tmp_path):
+    path = tmp_path / "old.sqlite"
+    old_database(path, [("2020-1-9", -6.0, 0.0, -3.0)])
+
+    first = open_database(path).fetch_days("0001-01-01", "9999-12-31")
+    second = open_database(path).fetch_days("0001-01-01", "9999-12-31")
+
+    assert first == second == [("2020-01-09", 0.0, -6.0, -3.0)]
+
+def test_single_station_rows_move_to_the_default_station(tmp_path):
+    path = tmp_path / "old.sqlite"
+    old_database(path, [("2020-1-9", -6.0, 0.0, -3.0)])
+
+    with sqlite3.connect(path) as conn:
+        DBOperations.migrate_date_key(conn.cursor())
+        conn.execute("PRAGMA user_version = 1")
+
+    db = open_database(path)
+    db.save_data({"2020-01-09": {"Max": 1.0, "Min": -1.0, "Mean": 0.0}}, 51459)
+
+    assert db.fetch_days("2020-01-09", "2020-01-09", DEFAULT_STATION_ID) == [
+        ("2020-01-09", 0.0, -6.0, -3.0)
+    ]
+    assert db.fetch_days("2020-01-09", "2020-01-09", 51459) == [("2020-01-09", 1.0, -1.0, 0.0)]
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone() == (SCHEMA_VERSION,)
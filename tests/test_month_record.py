@@ -0,0 +1,44 @@
+"""
+Tests for MonthRecord.
+"""
+
+import pickle
+
+from month_record import MonthRecord
+
+def record():
+    month = MonthRecord(2020, 2)
+    month.append(1, 2.5, -1.5, 0.5)
+    month.append(29, 4.0, 1.0, 2.5)
+
+    return month
+
+def test_reads_like_a_weather_dictionary():
+    month = record()
+
+    assert len(month) == 2
+    assert list(month) == ["2020-02-01", "2020-02-29"]
+    assert month.to_dict() == {
+        "2020-02-01": {"Max": 2.5, "Min": -1.5, "Mean": 0.5},
+        "2020-02-29": {"Max": 4.0, "Min": 1.0, "Mean": 2.5},
+    }
+    assert not MonthRecord(2020, 3)
+
+def test_rows_are_ready_to_insert():
+    assert list(record().rows(27174, "Winnipeg, MB")) == [
+        (27174, "2020-02-01", 20200201, 2020, 2, 1, 2.5, -1.5, 0.5, "Winnipeg, MB"),
+        (27174, "2020-02-29", 20200229, 2020, 2, 29, 4.0, 1.0, 2.5, "Winnipeg, MB"),
+    ]
+
+def test_pickles_to_the_same_days_in_few_bytes():
+    month = MonthRecord(2021, 1)
+    for day in range(1, 32):
+        month.append(day, day / 2, -day / 2, 0.25)
+
+    data = pickle.dumps(month)
+    copy = pickle.loads(data)
+
+    assert copy.to_dict() == month.to_dict()
+    assert (copy.year, copy.month) == (2021, 1)
+    assert len(data) < 31 * 25 + 150
+    assert pickle.loads(pickle.dumps(MonthRecord(2021, 2))).to_dict() == {}
@@ -0,0 +1,96 @@
+"""
+Tests for PageCache.
+"""
+
+from datetime import date
+
+import pytest
+
+from http_session import HTTPResponse, HTTPStatusError
+from page_cache import CacheMissError, PageCache
+
+class FakeSession():
+    """
+    Answers get() with queued responses and records the request headers.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+def response(status, body=b"", **headers):
+    return HTTPResponse("http://climate.test/page", status, headers, body)
+
+def test_open_month_is_revalidated_and_304_serves_the_stored_page(tmp_path):
+    cache = PageCache(str(tmp_path))
+    today = date.today()
+    session = FakeSession(
+        response(200, b"<html>v1</html>", etag='"v1"', **{"last-modified": "Mon, 01 Jan 2024"}),
+        response(304),
+    )
+
+    first = cache.fetch(session, "http://climate.test/page", 27174, today.year, today.month)
+    second = cache.fetch(session, "http://climate.test/page", 27174, today.year, today.month)
+
+    assert first == second == b"<html>v1</html>"
+    assert session.requests[0] == {}
+    assert session.requests[1] == {
+        "If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024"
+    }
+
+def test_open_month_takes_the_new_page_when_it_changed(tmp_path):
+    cache = PageCache(str(tmp_path))
+    today = date.today()
+    session = FakeSession(response(200, b"old", etag='"a"'), response(200, b"new", etag='"b"'))
+
+    cache.fetch(session, "http://climate.test/page", 27174, today.year, today.month)
+
+    assert cache.fetch(session, "http://climate.test/page", 27174, today.year, today.month) == b"new"
+    assert cache.lookup(27174, today.year, today.month)["etag"] == '"b"'
+
+def test_closed_month_fetched_after_closing_is_not_requested_again(tmp_path):
+    cache = PageCache(str(tmp_path))
+    session = FakeSession(response(200, b"<html>2001-05</html>"))
+
+    cache.fetch(session, "http://climate.test/page", 27174, 2001, 5)
+
+    assert cache.fetch(session, "http://climate.test/page", 27174, 2001, 5) == b"<html>2001-05</html>"
+    assert len(session.requests) == 1
+
+def test_identical_pages_share_one_object(tmp_path):
+    cache = PageCache(str(tmp_path))
+    session = FakeSession(response(200, b"same"), response(200, b"same"))
+
+    cache.fetch(session, "http://climate.test/page", 27174, 2001, 5)
+    cache.fetch(session, "http://climate.test/page", 51459, 2001, 5)
+
+    objects = [path for path in (tmp_path / "objects").rglob("*") if path.is_file()]
+    assert len(objects) == 1
+
+def test_offline_replays_cached_pages_and_refuses_missing_ones(tmp_path):
+    today = date.today()
+    PageCache(str(tmp_path)).fetch(
+        FakeSession(response(200, b"cached")), "http://climate.test/page", 27174, today.year, today.month
+    )
+    offline = PageCache(str(tmp_path), offline=True)
+    session = FakeSession()
+
+    assert offline.fetch(session, "http://climate.test/page", 27174, today.year, today.month) == b"cached"
+
+    with pytest.raises(CacheMissError):
+        offline.fetch(session, "http://climate.test/page", 27174, 2001, 5)
+
+    assert session.requests == []
+
+def test_error_status_is_raised_and_not_stored(tmp_path):
+    cache = PageCache(str(tmp_path))
+
+    with pytest.raises(HTTPStatusError):
+        cache.fetch(FakeSession(response(503)), "http://climate.test/page", 27174, 2001, 5)
+
+    assert cache.lookup(27174, 2001, 5) is None
@@ -0,0 +1,172 @@
+"""
+Tests for IngestPipeline, against a local ClimateServer.
+"""
+
+import os
+import sqlite3
+from datetime import date
+
+import pytest
+
+from climate_server import ClimateServer
+from db_operations import DBOperations
+from http_session import HTTPSession
+from page_cache import PageCache
+from pipeline import IngestPipeline
+from weather_processor import WeatherProcessor
+
+STATIONS = [27174, 51459]
+
+def first_month(months_back):
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months_back
+
+    return index // 12, index % 12 + 1
+
+@pytest.fixture(scope="module")
+def server():
+    with ClimateServer(first_month=first_month(14), latency=0.002, jitter=0.01, seed=1) as running:
+        yield running
+
+def crawl(server, path, session=None, cache=None, **options):
+    app = WeatherProcessor(cache=cache, base_url=server.url)
+    app.db.app_database = str(path)
+    app.db.initialize_db()
+
+    if session is not None:
+        app.session = session
+
+    pipeline = IngestPipeline(app, **options)
+    pipeline.run(STATIONS)
+
+    return pipeline
+
+def contents(db):
+    with sqlite3.connect(db.app_database) as conn:
+        return (
+            conn.execute(
+                "SELECT station_id, date_key, max_temp, min_temp, avg_temp FROM weather "
+                "ORDER BY station_id, date_key"
+            ).fetchall(),
+            conn.execute(
+                "SELECT station_id, year, month, rows FROM fetch_log ORDER BY station_id, year, month"
+            ).fetchall(),
+        )
+
+@pytest.fixture(scope="module")
+def sequential(server, tmp_path_factory):
+    pipeline = crawl(server, tmp_path_factory.mktemp("sequential") / "weather.sqlite",
+                     fetchers=1, parsers=1, batch_size=1)
+
+    return contents(pipeline.processor.db)
+
+def test_every_month_of_every_station_is_saved_once(sequential):
+    weather, fetch_log = sequential
+
+    for station_id in STATIONS:
+        months = [(year, month) for station, year, month, _ in fetch_log if station == station_id]
+        assert months[0] == first_month(14)
+        assert len(months) == 15
+
+    assert len(weather) == len(set((station, key) for station, key, *_ in weather))
+    assert sum(rows for *_, rows in fetch_log) == len(weather)
+
+def test_concurrent_stages_save_the_same_as_one_at_a_time(server, sequential, tmp_path):
+    pipeline = crawl(server, tmp_path / "weather.sqlite",
+                     fetchers=8, parsers=3, batch_size=5, window=4)
+    db = pipeline.processor.db
+
+    assert contents(db) == sequential
+
+def test_a_failed_batch_is_left_out_whole_and_the_crawl_goes_on(server, tmp_path):
+    failed = []
+    save_station_months = DBOperations.save_station_months
+
+    def save_once_failing(self, station_months, fetches=()):
+        if not failed:
+            failed.append(list(fetches))
+            raise sqlite3.OperationalError("disk I/O error")
+
+        return save_station_months(self, station_months, fetches)
+
+    DBOperations.save_station_months = save_once_failing
+    try:
+        pipeline = crawl(server, tmp_path / "weather.sqlite", fetchers=4, batch_size=3)
+    finally:
+        DBOperations.save_station_months = save_station_months
+
+    db = pipeline.processor.db
+
+    weather, fetch_log = contents(db)
+    lost = {(station, year, month) for station, year, month, _ in failed[0]}
+    logged = {(station, year, month) for station, year, month, _ in fetch_log}
+
+    assert lost and not lost & logged
+    assert len(logged) == 2 * 15 - len(lost)
+    assert {station for station, *_ in weather} == set(STATIONS)
+
+def test_parsing_in_worker_processes_saves_the_same(server, sequential, tmp_path):
+    pipeline = crawl(server, tmp_path / "weather.sqlite", fetchers=4, parsers=1, processes=2)
+    db = pipeline.processor.db
+
+    assert contents(db) == sequential
+
+class FailingSession():
+    """
+    Fails the requests whose URL contains any of `parts`, and passes the
+    others on to a plain HTTPSession.
+    """
+
+    def __init__(self, *parts):
+        self.parts = parts
+        self.session = HTTPSession()
+        self.failed = []
+
+    def get(self, url, headers=None):
+        if any(part in url for part in self.parts):
+            self.failed.append(url)
+            raise ConnectionRefusedError("connection refused")
+
+        return self.session.get(url, headers)
+
+def test_a_station_whose_every_fetch_fails_is_given_up_on(server, tmp_path):
+    session = FailingSession("StationID=")
+
+    pipeline = crawl(server, tmp_path / "weather.sqlite", session, fetchers=4, failure_limit=6)
+    db = pipeline.processor.db
+
+    assert sorted(pipeline.incomplete) == STATIONS
+    assert len(session.failed) <= 2 * (6 + 4)
+    assert contents(db) == ([], [])
+
+def test_a_failure_at_the_start_of_a_history_does_not_save_another_month(
+        server, sequential, tmp_path):
+    year, month = first_month(14)
+    session = FailingSession(f"Year={year}&Month={month}#")
+
+    pipeline = crawl(server, tmp_path / "weather.sqlite", session, fetchers=4)
+    db = pipeline.processor.db
+    weather, fetch_log = contents(db)
+
+    assert pipeline.incomplete == []
+    assert fetch_log == [entry for entry in sequential[1] if entry[1:3] != (year, month)]
+    assert weather == [row for row in sequential[0] if row[1] // 100 != year * 100 + month]
+
+def test_an_offline_replay_stops_each_station_at_its_first_missing_month(
+        server, sequential, tmp_path):
+    cache = PageCache(str(tmp_path / "cache"))
+    crawl(server, tmp_path / "online.sqlite", cache=cache, fetchers=4)
+
+    year, month = first_month(5)
+    for station_id in STATIONS:
+        os.remove(cache.index_path(station_id, year, month))
+
+    session = FailingSession("http")
+    pipeline = crawl(server, tmp_path / "offline.sqlite", session,
+                     cache=PageCache(cache.directory, offline=True), fetchers=4)
+    weather, fetch_log = contents(pipeline.processor.db)
+
+    assert session.failed == []
+    assert pipeline.incomplete == []
+    assert fetch_log == [entry for entry in sequential[1] if entry[1:3] > (year, month)]
+    assert weather == [row for row in sequential[0] if row[1] // 100 > year * 100 + month]
@@ -0,0 +1,99 @@
+"""
+Tests for the query cache and the write generation that invalidates it.
+"""
+
+import sqlite3
+import threading
+
+from dbcm import ConnectionManager
+
+def day(mean):
+    return {"Max": mean + 5, "Min": mean - 5, "Mean": mean}
+
+def counting(db):
+    """
+    Counts the queries that reach the database.
+    """
+    calls = []
+    select_data = db.select_data
+
+    def select(*args):
+        calls.append(args)
+        return select_data(*args)
+
+    db.select_data = select
+
+    return calls
+
+def test_repeated_fetches_are_answered_from_the_cache(db):
+    db.save_data({"2020-01-01": day(1.0)}, 27174)
+    calls = counting(db)
+
+    first = db.fetch_data("2020-01-01", "2020-01-31", 27174)
+    first.append("changed by the caller")
+    second = db.fetch_data("2020-01-01", "2020-01-31", 27174)
+
+    assert len(calls) == 1
+    assert second == [("2020-01-01", 1.0)]
+
+def test_a_save_makes_cached_results_stale(db):
+    db.save_data({"2020-01-01": day(1.0)}, 27174)
+    calls = counting(db)
+    db.fetch_data("2020-01-01", "2020-01-31", 27174)
+
+    db.save_data({"2020-01-02": day(2.0)}, 27174)
+
+    assert db.fetch_data("2020-01-01", "2020-01-31", 27174) == [
+        ("2020-01-01", 1.0), ("2020-01-02", 2.0)
+    ]
+    assert len(calls) == 2
+
+def test_a_write_by_another_connection_makes_cached_results_stale(db):
+    db.save_data({"2020-01-01": day(1.0)}, 27174)
+    db.fetch_data("2020-01-01", "2020-01-31", 27174)
+
+    with sqlite3.connect(db.app_database) as conn:
+        conn.execute("UPDATE weather SET avg_temp = 9.0")
+
+    assert db.fetch_data("2020-01-01", "2020-01-31", 27174) == [("2020-01-01", 9.0)]
+
+def test_least_recently_used_results_are_dropped(db):
+    db.cache_size = 2
+    db.save_data({"2020-01-01": day(1.0)}, 27174)
+    calls = counting(db)
+
+    for end in ("2020-01-01", "2020-01-02", "2020-01-01", "2020-01-03", "2020-01-01", "2020-01-02"):
+        db.fetch_data("2020-01-01", end, 27174)
+
+    assert [args[1] for args in calls] == ["2020-01-01", "2020-01-02", "2020-01-03", "2020-01-02"]
+
+def test_one_commit_moves_the_generation_on_once_for_every_thread(db):
+    manager = ConnectionManager.for_database(db.app_database)
+
+    def generations():
+        seen = []
+        barrier = threading.Barrier(8)
+
+        def read():
+            barrier.wait()
+            seen.append(manager.current_generation())
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return set(seen)
+
+    (before,) = generations()
+
+    with sqlite3.connect(db.app_database) as conn:
+        conn.execute("INSERT INTO stations VALUES (1, 'External')")
+
+    assert generations() == {before + 1}
+
+    db.save_data({"2020-01-01": day(1.0)}, 27174)
+
+    assert generations() == {before + 2}
+    assert generations() == {before + 2}
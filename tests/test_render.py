@@ -0,0 +1,58 @@
+"""
+Tests for rendering charts headlessly to files.
+"""
+
+import os
+
+import matplotlib.pyplot as plt
+import pytest
+
+from weather_processor import WeatherProcessor
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+@pytest.fixture
+def app(db):
+    days = {}
+    for year in (2019, 2020):
+        for month in range(1, 4):
+            for day in range(1, 29):
+                days[f"{year}-{month:02}-{day:02}"] = {
+                    "Max": day / 2, "Min": -day / 2, "Mean": float(month - day % 5)
+                }
+    db.save_data(days, 27174)
+
+    processor = WeatherProcessor(station_id=27174)
+    processor.db.app_database = db.app_database
+
+    return processor
+
+def test_render_writes_a_chart_without_touching_pyplot(app, tmp_path):
+    path = app.render(("line", 2020, 2), str(tmp_path / "line.png"))
+
+    with open(path, "rb") as image:
+        assert image.read(8) == PNG
+    assert plt.get_fignums() == []
+
+@pytest.mark.parametrize("image_format, magic", [("png", PNG), ("svg", b"<?xml")])
+def test_render_batch_writes_every_chart_in_order(app, tmp_path, image_format, magic):
+    charts = [("line", 2020, 1), ("box", 2019, 2020), ("range", "2019-01-01", "2020-03-31")]
+
+    paths = app.render_batch(charts, str(tmp_path / "charts"), image_format, workers=2)
+
+    assert [os.path.basename(path) for path in paths] == [
+        f"line-27174-2020-1.{image_format}",
+        f"box-27174-2019-2020.{image_format}",
+        f"range-27174-2019-01-01-2020-03-31.{image_format}",
+    ]
+    for path in paths:
+        with open(path, "rb") as image:
+            assert image.read(len(magic)) == magic
+
+def test_a_chart_that_fails_is_none_and_the_others_are_still_written(app, tmp_path):
+    charts = [("pie", 2020, 1), ("line", 2020, 3)]
+
+    paths = app.render_batch(charts, str(tmp_path), workers=2)
+
+    assert paths[0] is None
+    assert os.path.exists(paths[1])
@@ -0,0 +1,149 @@
+"""
+Tests for RequestScheduler's token bucket, retries, and adaptive
+concurrency limit.
+"""
+
+import threading
+import time
+
+import pytest
+
+from http_session import HTTPResponse, HTTPStatusError
+from scheduler import RequestScheduler
+
+def status_error(status, **headers):
+    return HTTPStatusError(HTTPResponse("http://climate.test/page", status, headers, b""))
+
+def failing(*errors, result="page"):
+    """
+    Returns a request that raises the errors in turn and then succeeds.
+    """
+    remaining = list(errors)
+    attempts = []
+
+    def request():
+        attempts.append(time.monotonic())
+
+        if remaining:
+            raise remaining.pop(0)
+
+        return result
+
+    return request, attempts
+
+def test_bucket_lets_a_burst_through_then_paces_to_the_rate():
+    scheduler = RequestScheduler(rate=50, burst=5)
+
+    start = time.monotonic()
+    for _ in range(15):
+        scheduler.call(lambda: None)
+    elapsed = time.monotonic() - start
+
+    assert 0.18 <= elapsed < 0.5
+
+def test_without_a_rate_requests_are_not_paced():
+    scheduler = RequestScheduler()
+
+    start = time.monotonic()
+    for _ in range(200):
+        scheduler.call(lambda: None)
+
+    assert time.monotonic() - start < 0.1
+
+def test_retryable_failures_are_retried_until_one_succeeds():
+    scheduler = RequestScheduler(backoff=0.001, seed=1)
+    request, attempts = failing(status_error(503), ConnectionResetError(), status_error(500))
+
+    assert scheduler.call(request) == "page"
+    assert len(attempts) == 4
+
+def test_other_statuses_are_raised_at_once():
+    scheduler = RequestScheduler(backoff=0.001)
+    request, attempts = failing(status_error(404))
+
+    with pytest.raises(HTTPStatusError):
+        scheduler.call(request)
+
+    assert len(attempts) == 1
+
+def test_the_last_failure_is_raised_when_retries_run_out():
+    scheduler = RequestScheduler(retries=2, backoff=0.001)
+    request, attempts = failing(status_error(502), status_error(503), status_error(504))
+
+    with pytest.raises(HTTPStatusError) as raised:
+        scheduler.call(request)
+
+    assert raised.value.status == 504
+    assert len(attempts) == 3
+
+def test_retry_after_pauses_every_request():
+    scheduler = RequestScheduler(backoff=0.001)
+    request, attempts = failing(status_error(429, **{"retry-after": "0.3"}))
+
+    scheduler.call(request)
+    other = time.monotonic()
+    scheduler.call(lambda: None)
+
+    assert attempts[1] - attempts[0] >= 0.3
+    assert time.monotonic() - other < 0.1
+    assert RequestScheduler.retry_after(status_error(429, **{"retry-after": "soon"})) is None
+
+def test_limit_grows_by_about_one_per_limit_of_fast_successes():
+    scheduler = RequestScheduler(max_concurrency=16, target_latency=1.0)
+    scheduler.limit = 4.0
+
+    for _ in range(4):
+        scheduler.succeeded(0.01)
+
+    assert 4.8 < scheduler.limit < 5.0
+
+    for _ in range(500):
+        scheduler.succeeded(0.01)
+
+    assert scheduler.limit == 16.0
+
+def test_failures_halve_the_limit_once_per_burst_down_to_the_minimum():
+    scheduler = RequestScheduler(max_concurrency=16, min_concurrency=2)
+
+    for _ in range(5):
+        scheduler.failed(None)
+
+    assert scheduler.limit == 8.0
+
+    for _ in range(3):
+        scheduler.decreased = 0.0
+        scheduler.failed(None)
+
+    assert scheduler.limit == 2.0
+
+def test_slow_responses_lower_the_limit():
+    scheduler = RequestScheduler(max_concurrency=8, target_latency=0.05)
+
+    scheduler.succeeded(0.5)
+
+    assert scheduler.limit == 4.0
+
+def test_requests_in_flight_never_exceed_the_limit():
+    scheduler = RequestScheduler(max_concurrency=8, target_latency=10.0)
+    scheduler.limit = 2.0
+    scheduler.max_concurrency = 2
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def request():
+        with lock:
+            in_flight[0] = in_flight[0] + 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+
+        time.sleep(0.02)
+
+        with lock:
+            in_flight[0] = in_flight[0] - 1
+
+    threads = [threading.Thread(target=scheduler.call, args=(request,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert in_flight[1] == 2
@@ -0,0 +1,73 @@
+"""
+Tests for keeping many stations in one database.
+"""
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+from analytics import ClimateAnalytics
+from climate_server import ClimateServer
+from weather_processor import main
+
+def day(mean):
+    return {"Max": mean + 5, "Min": mean - 5, "Mean": mean}
+
+def counts(db, station_id):
+    with sqlite3.connect(db.app_database) as conn:
+        return {
+            table: conn.execute(
+                f"SELECT COUNT(1) FROM {table} WHERE station_id = ?", [station_id]
+            ).fetchone()[0]
+            for table in ("weather", "fetch_log", "normals", "daily_analytics")
+        }
+
+@pytest.fixture
+def two_stations(db):
+    for station_id, mean in ((27174, 1.0), (51459, 2.0)):
+        db.save_station_months(
+            [(station_id, {"2020-01-01": day(mean), "2020-01-02": day(mean)})],
+            [(station_id, 2020, 1, 2)]
+        )
+        ClimateAnalytics(db).build(station_id)
+
+    return db
+
+def test_stations_keep_their_own_copy_of_a_day(two_stations):
+    assert two_stations.fetch_data("2020-01-01", "2020-01-01", 27174) == [("2020-01-01", 1.0)]
+    assert two_stations.fetch_data("2020-01-01", "2020-01-01", 51459) == [("2020-01-01", 2.0)]
+
+def test_purging_a_station_leaves_the_others_alone(two_stations):
+    kept = counts(two_stations, 51459)
+
+    two_stations.purge_station(27174)
+
+    assert set(counts(two_stations, 27174).values()) == {0}
+    assert counts(two_stations, 51459) == kept
+    assert all(kept.values())
+
+def test_purging_all_data_keeps_the_station_registry(two_stations):
+    two_stations.purge_data()
+
+    with sqlite3.connect(two_stations.app_database) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    assert not tables & {"weather", "fetch_log", "normals", "daily_analytics"}
+    assert {27174, 51459} <= {station_id for station_id, _ in two_stations.stations()}
+
+def test_full_backfill_only_replaces_the_listed_stations(two_stations):
+    today = date.today()
+    first_month = (today.year, today.month) if today.day > 1 else (today.year - 1, 12)
+
+    with ClimateServer(first_month=first_month) as server:
+        assert main([
+            "backfill", "--database", two_stations.app_database, "--base-url", server.url,
+            "--stations", "51459", "--full", "--workers", "2",
+        ]) == 0
+
+    assert two_stations.fetch_data("2020-01-01", "2020-01-02", 27174) == [
+        ("2020-01-01", 1.0), ("2020-01-02", 1.0)
+    ]
+    assert two_stations.fetch_data("2020-01-01", "2020-01-02", 51459) == []
+    assert two_stations.count_rows_in_table(51459)[0] > 0
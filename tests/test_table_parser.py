@@ -0,0 +1,167 @@
+"""
+Tests for DailyTableParser, the html engine of WeatherScrapper, and the
+streamed decompression of pages.
+"""
+
+import glob
+import os
+import zlib
+
+import pytest
+
+from conftest import FIXTURES
+from http_session import DeflateDecompressor
+from scrape_weather import WeatherScrapper
+from table_parser import DailyTableParser
+
+PAGES = sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+
+def read_page(path):
+    _, year, month = os.path.basename(path)[:-len(".html")].split("-")
+
+    with open(path, "rb") as page_file:
+        return int(year), int(month), page_file.read()
+
+def stream_engine(year, month, page, chunk_size=None):
+    parser = DailyTableParser(year, month)
+    chunks = [page] if chunk_size is None else [
+        page[offset:offset + chunk_size] for offset in range(0, len(page), chunk_size)
+    ]
+    record = parser.parse(chunks)
+
+    return {sample_date: tuple(temps.values()) for sample_date, temps in record.items()}, parser
+
+def html_engine(year, month, page):
+    scrapper = WeatherScrapper(engine="html")
+    scrapper.year, scrapper.month = year, f"{month:02}"
+    scrapper.feed(page.decode("utf-8"))
+
+    weather = {
+        sample_date: (float(temps["Max"]), float(temps["Min"]), float(temps["Mean"]))
+        for sample_date, temps in scrapper.weather.items()
+    }
+
+    return weather, scrapper
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_engines_agree_on_days_values_and_rejections(path):
+    year, month, page = read_page(path)
+
+    stream_days, parser = stream_engine(year, month, page)
+    html_days, scrapper = html_engine(year, month, page)
+
+    assert stream_days == html_days
+    assert parser.rejected == scrapper.rejected
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_chunk_boundaries_do_not_change_the_result(path):
+    year, month, page = read_page(path)
+
+    assert stream_engine(year, month, page, chunk_size=7)[0] == stream_engine(year, month, page)[0]
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_splitting_the_page_at_any_byte_around_the_tags_does_not_change_the_result(path):
+    year, month, page = read_page(path)
+    whole, parser = stream_engine(year, month, page)
+
+    for marker in (b"<title", b"Max Temp", b"<tbody", b"Sum", b"</tbody"):
+        position = page.index(marker)
+
+        for offset in range(max(0, position - 80), position + len(marker) + 80):
+            split = DailyTableParser(year, month)
+            record = split.parse([page[:offset], page[offset:]])
+
+            assert {day: tuple(temps.values()) for day, temps in record.items()} == whole
+            assert (split.title, split.rejected) == (parser.title, parser.rejected)
+
+def test_a_long_tbody_tag_fed_a_byte_at_a_time_is_found():
+    year, month, page = read_page(os.path.join(FIXTURES, "27174-2020-02.html"))
+    long_tag = b'<tbody class="' + b"striped " * 20 + b'" data-table="daily">'
+
+    assert stream_engine(year, month, page.replace(b"<tbody>", long_tag), chunk_size=1)[0] == (
+        stream_engine(year, month, page)[0]
+    )
+
+def test_the_daily_table_is_found_by_its_header_not_by_coming_first():
+    year, month, page = read_page(os.path.join(FIXTURES, "27174-2020-02.html"))
+    legend = (
+        b"<table><thead><tr><th>Legend</th></tr></thead><tbody>"
+        b"<tr><th><abbr>01</abbr></th><td>9.0</td><td>9.0</td><td>9.0</td></tr>"
+        b"<tr><th>Sum</th></tr></tbody></table>"
+    )
+    table = page.index(b"<table")
+
+    days, _ = stream_engine(year, month, page[:table] + legend + page[table:], chunk_size=7)
+
+    assert days == stream_engine(year, month, page)[0]
+
+def test_estimated_value_is_rejected_by_both_engines():
+    year, month, page = read_page(os.path.join(FIXTURES, "27174-2021-01.html"))
+
+    stream_days, parser = stream_engine(year, month, page)
+    html_days, _ = html_engine(year, month, page)
+
+    assert "2021-01-06" not in stream_days
+    assert "2021-01-06" not in html_days
+    assert len(stream_days) == 30
+    assert parser.rejected == {"estimated": 1}
+
+def test_missing_values_are_rejected():
+    year, month, page = read_page(os.path.join(FIXTURES, "27174-1998-07.html"))
+
+    days, parser = stream_engine(year, month, page)
+
+    assert len(days) == 29
+    assert parser.rejected == {"missing": 2}
+
+def test_parser_stops_at_the_sum_row():
+    year, month, page = read_page(os.path.join(FIXTURES, "27174-2020-02.html"))
+    parser = DailyTableParser(year, month)
+    served = []
+
+    def chunks():
+        for offset in range(0, len(page), 1024):
+            served.append(offset)
+            yield page[offset:offset + 1024]
+
+    parser.parse(chunks())
+
+    assert parser.done
+    assert len(served) < len(range(0, len(page), 1024))
+
+def test_flags_in_cells_reject_days_for_their_reason():
+    page = (
+        b"<html><title>Daily Data Report for January 2021</title><table>"
+        b"<thead><tr><th>Day</th><th>Max Temp</th><th>Min Temp</th><th>Mean Temp</th></tr></thead>"
+        b"<tbody>"
+        b"<tr><th><abbr title='January 1, 2021'>01</abbr></th><td>1.0</td><td>-1.0</td><td>0.0</td></tr>"
+        b"<tr><th><abbr title='January 2, 2021'>02</abbr></th><td>M</td><td>-1.0</td><td>0.0</td></tr>"
+        b"<tr><th><abbr title='January 3, 2021'>03</abbr></th><td>1.0</td><td>-1.0</td>"
+        b"<td>0.0<abbr title='Estimated'>E</abbr></td></tr>"
+        b"<tr><th><abbr title='January 4, 2021'>04</abbr></th><td>1.0</td><td></td><td>0.0</td></tr>"
+        b"<tr><th>Sum</th><td>1</td><td>1</td><td>1</td></tr>"
+        b"</tbody></table></html>"
+    )
+
+    stream_days, parser = stream_engine(2021, 1, page)
+    html_days, scrapper = html_engine(2021, 1, page)
+
+    assert list(stream_days) == list(html_days) == ["2021-01-01"]
+    assert parser.rejected == scrapper.rejected == {
+        "missing": 1, "estimated": 1, "incomplete": 1
+    }
+
+@pytest.mark.parametrize("wbits", [zlib.MAX_WBITS, -zlib.MAX_WBITS], ids=["zlib", "raw"])
+@pytest.mark.parametrize("chunk_size", [1, 7, 16384])
+def test_deflate_bodies_decode_with_or_without_the_zlib_wrapper(wbits, chunk_size):
+    body = b"<td>-16.9</td>" * 2000
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    compressed = compressor.compress(body) + compressor.flush()
+
+    decompressor = DeflateDecompressor()
+    decoded = b"".join(
+        decompressor.decompress(compressed[offset:offset + chunk_size])
+        for offset in range(0, len(compressed), chunk_size)
+    ) + decompressor.flush()
+
+    assert decoded == body
@@ -0,0 +1,132 @@
+"""
+Tests for the HTTP query API.
+"""
+
+import http.client
+import json
+import sqlite3
+
+import pytest
+
+from weather_api import WeatherAPI
+
+@pytest.fixture
+def api(db):
+    days = {}
+    for month in (1, 2):
+        for day in range(1, 29):
+            mean = month * 10 + day / 10
+            days[f"2020-{month:02}-{day:02}"] = {"Max": mean + 5, "Min": mean - 5, "Mean": mean}
+
+    db.save_data(days, 27174)
+
+    with WeatherAPI(db.app_database, threads=4, stream_rows=10) as running:
+        yield running
+
+def get(api, path, headers=None):
+    """
+    Returns the status, headers, and body of a GET request, and the
+    error raised while reading the body, if any.
+    """
+    host, port = api.httpd.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+
+    try:
+        body, error = response.read(), None
+    except http.client.HTTPException as raised:
+        body, error = None, raised
+
+    conn.close()
+
+    return response.status, dict(response.getheaders()), body, error
+
+def test_stations_are_listed(api):
+    status, _, body, _ = get(api, "/stations")
+
+    assert status == 200
+    assert 27174 in [station["station_id"] for station in json.loads(body)]
+
+def test_a_short_range_is_answered_whole_with_an_etag(api):
+    status, headers, body, _ = get(api, "/stations/27174/days?start=2020-01-01&end=2020-01-05")
+
+    assert status == 200
+    assert "Content-Length" in headers and headers["ETag"]
+    assert [day["date"] for day in json.loads(body)] == [f"2020-01-0{day}" for day in range(1, 6)]
+    assert json.loads(body)[0] == {"date": "2020-01-01", "max": 15.1, "min": 5.1, "mean": 10.1}
+
+def test_a_long_range_is_streamed_page_by_page(api):
+    pages = []
+    page_days = api.db.page_days
+    api.db.page_days = lambda *args: (pages.append(len(page)) or page for page in page_days(*args))
+
+    status, headers, body, error = get(api, "/stations/27174/days?start=2020-01-01&end=2020-02-28")
+
+    assert (status, error) == (200, None)
+    assert headers["Transfer-Encoding"] == "chunked"
+    assert [day["date"] for day in json.loads(body)] == \
+        [f"2020-{month:02}-{day:02}" for month in (1, 2) for day in range(1, 29)]
+    assert max(pages) == 10
+
+def test_a_failure_while_streaming_cuts_the_response_short(api):
+    select_day_page = api.db.select_day_page
+    calls = []
+
+    def failing(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise sqlite3.OperationalError("disk I/O error")
+        return select_day_page(*args)
+
+    api.db.select_day_page = failing
+
+    status, _, body, error = get(api, "/stations/27174/days?start=2020-01-01&end=2020-02-28")
+
+    assert status == 200
+    assert isinstance(error, http.client.IncompleteRead)
+    assert b"Internal Server Error" not in error.partial
+
+def test_matching_if_none_match_is_answered_304_until_the_data_changes(api, db):
+    path = "/stations/27174/summary?start=2020-01-01&end=2020-12-31"
+    _, headers, body, _ = get(api, path)
+
+    assert get(api, path, {"If-None-Match": headers["ETag"]})[0] == 304
+
+    db.save_data({"2020-03-01": {"Max": 9.0, "Min": 1.0, "Mean": 5.0}}, 27174)
+
+    status, changed, new_body, _ = get(api, path, {"If-None-Match": headers["ETag"]})
+
+    assert status == 200 and changed["ETag"] != headers["ETag"]
+    assert json.loads(body)["days"] == 56 and json.loads(new_body)["days"] == 57
+
+def test_cached_bodies_are_not_served_after_a_write_by_another_process(api, db):
+    path = "/stations/27174/summary"
+    get(api, path)
+
+    with sqlite3.connect(db.app_database) as conn:
+        conn.execute("UPDATE weather SET max_temp = 99.0 WHERE sample_date = '2020-02-01'")
+
+    assert json.loads(get(api, path)[2])["max"] == 99.0
+
+def test_months_give_each_calendar_month_distribution(api):
+    status, _, body, _ = get(api, "/stations/27174/months?start_year=2020&end_year=2020")
+    months = json.loads(body)
+
+    assert status == 200 and len(months) == 12
+    assert months[0]["days"] == 28 and months[0]["min"] == 10.1 and months[0]["max"] == 12.8
+    assert months[2] == {"month": 3, "days": 0}
+
+@pytest.mark.parametrize("path, status", [
+    ("/stations/27174/days?start=2020-13-01", 400),
+    ("/stations/27174/months?start_year=year", 400),
+    ("/stations/27174/weeks", 404),
+    ("/stations/winnipeg/days", 404),
+    ("/", 404),
+])
+def test_bad_requests_get_json_errors(api, path, status):
+    answered, headers, body, _ = get(api, path)
+
+    assert answered == status
+    assert headers["Content-Type"] == "application/json"
+    assert "error" in json.loads(body)
@@ -0,0 +1,94 @@
+"""
+Tests for WeatherProcessor's concurrent downloads, against a local ClimateServer.
+"""
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+from climate_server import ClimateServer
+from weather_processor import WeatherProcessor
+
+def first_month(months_back):
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months_back
+
+    return index // 12, index % 12 + 1
+
+@pytest.fixture(scope="module")
+def server():
+    with ClimateServer(first_month=first_month(20), latency=0.002, jitter=0.01, seed=2) as running:
+        yield running
+
+def processor(server, db, station_id=27174):
+    app = WeatherProcessor(station_id=station_id, base_url=server.url)
+    app.db.app_database = db.app_database
+
+    return app
+
+def contents(db, station_id):
+    with sqlite3.connect(db.app_database) as conn:
+        return (
+            conn.execute(
+                "SELECT date_key, max_temp, min_temp, avg_temp FROM weather "
+                "WHERE station_id = ? ORDER BY date_key", (station_id,)
+            ).fetchall(),
+            conn.execute(
+                "SELECT year, month, rows FROM fetch_log WHERE station_id = ? ORDER BY year, month",
+                (station_id,)
+            ).fetchall(),
+        )
+
+def test_retrieve_all_with_many_workers_saves_the_same_as_with_one(server, db):
+    processor(server, db).retrieve_all(workers=1)
+    one_at_a_time = contents(db, 27174)
+
+    processor(server, db).retrieve_all(workers=8)
+
+    assert contents(db, 27174) == one_at_a_time
+    assert [entry[:2] for entry in one_at_a_time[1]][0] == first_month(20)
+    assert len(one_at_a_time[1]) == 21
+
+def test_retrieve_all_keeps_other_stations(server, db):
+    processor(server, db, station_id=51459).retrieve_all(workers=4)
+    other = contents(db, 51459)
+
+    processor(server, db).retrieve_all(workers=8)
+
+    assert other[0] and contents(db, 51459) == other
+
+def test_download_months_returns_months_in_the_order_asked(server, db):
+    app = processor(server, db)
+    asked = [first_month(back) for back in range(10)]
+
+    downloaded, fetches = app.download_months(asked, workers=8)
+
+    assert [(year, month) for _, year, month, _ in fetches] == asked
+    assert [len(weather) for _, weather in downloaded] == [rows for *_, rows in fetches]
+
+def test_a_month_outside_the_history_is_saved_without_days(server, db):
+    app = processor(server, db)
+
+    _, fetches = app.download_months([first_month(21), first_month(20)], workers=2)
+
+    assert fetches[0][3] == 0 and fetches[1][3] > 0
+
+def test_an_update_without_new_days_does_not_load_the_analytics(server, db):
+    db.save_data({"2020-01-09": {"Max": 2.0, "Min": -2.0, "Mean": 0.0}}, 27174)
+    app = processor(server, db)
+    app.db.gaps = lambda station_id: [first_month(30)]
+
+    app.update(workers=2)
+
+    assert app._analytics is None
+
+def test_an_update_with_new_days_syncs_the_analytics(server, db):
+    db.save_data({"2020-01-09": {"Max": 2.0, "Min": -2.0, "Mean": 0.0}}, 27174)
+    app = processor(server, db)
+    app.db.gaps = lambda station_id: [first_month(3)]
+
+    app.update(workers=2)
+
+    assert app._analytics is not None
+    assert app.analytics.daily("1900-01-01", "2100-12-31", 27174)
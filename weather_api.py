@@ -0,0 +1,510 @@
+"""
+This module holds WeatherAPI, a read-only HTTP API over the weather
+database for dashboards and scripts:
+
+    python weather_api.py --database weather.sqlite --port 8080
+
+    GET /stations
+    GET /stations/<id>/days?start=YYYY-MM-DD&end=YYYY-MM-DD
+    GET /stations/<id>/months?start_year=YYYY&end_year=YYYY
+    GET /stations/<id>/summary?start=YYYY-MM-DD&end=YYYY-MM-DD
+
+Every answer is JSON. Dates and years left out cover all stored data.
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from db_operations import DBOperations
+from dbcm import ConnectionManager
+from metrics import METRICS, report_error
+
+FIRST_DATE = "0001-01-01"
+LAST_DATE = "9999-12-31"
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """
+    PooledHTTPServer handles each connection on one of a fixed pool of
+    `threads` threads rather than a new thread per connection, so that
+    the read-only database connection each thread opens is reused.
+    """
+
+    def __init__(self, server_address, handler_class, threads=16):
+        """
+        Initializes PooledHTTPServer.
+        """
+        super().__init__(server_address, handler_class)
+
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="weather-api")
+
+    def process_request(self, request, client_address):
+        """
+        Hands the connection to the pool.
+        """
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        """
+        Closes the socket and lets the pool finish the connections it has.
+        """
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class APIError(Exception):
+    """
+    Raised for a request that cannot be answered, with its HTTP status.
+    """
+
+    def __init__(self, status, message):
+        """
+        Initializes APIError.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class WeatherAPI():
+    """
+    WeatherAPI answers GET requests from the database behind a DBOperations,
+    on `threads` threads that each read through their own read-only SQLite
+    connection, so requests never wait for each other or for a writer.
+
+    Every answer carries an ETag made of the database's write generation,
+    which goes up with any write by any process. A request whose
+    If-None-Match still matches is answered 304 without running a query,
+    and the encoded bodies of the last `cache_size` answers are kept and
+    served again until the generation moves on.
+
+    Ranges of `stream_rows` days or more are neither cached nor read in
+    one go: they are streamed with chunked encoding, one page of
+    `stream_rows` days read and sent at a time. A failure part way through
+    drops the connection, so the client sees a truncated response rather
+    than an error mixed into the body.
+    """
+
+    def __init__(self, database="weather.sqlite", host="127.0.0.1", port=0, threads=16,
+                 cache_size=256, stream_rows=5000):
+        """
+        Initializes WeatherAPI. Port 0 picks a free port.
+        """
+        self.db = DBOperations(cache_size=cache_size)
+        self.db.app_database = database
+
+        self.cache_size = cache_size
+        self.stream_rows = stream_rows
+
+        self.instance = uuid.uuid4().hex[:12]
+        self.responses = OrderedDict()
+        self.responses_lock = threading.Lock()
+
+        self.httpd = PooledHTTPServer((host, port), self.handler(), threads)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        Returns the base URL of the API.
+        """
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Serves requests on a background thread and returns the API.
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        """
+        Stops serving and closes the socket.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        """
+        Starts the API for the body of a with statement.
+        """
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_trace):
+        """
+        Stops the API.
+        """
+        self.stop()
+
+    def etag(self):
+        """
+        Returns the ETag for the database as it is now. The instance id
+        keeps tags from an earlier run, whose generations started from the
+        same numbers, from matching.
+        """
+        generation = ConnectionManager.for_database(self.db.app_database).current_generation()
+
+        return f'"{self.instance}-{generation}"'
+
+    def cached_response(self, key, etag):
+        """
+        Returns the body kept for a request, if it is still current.
+        """
+        with self.responses_lock:
+            entry = self.responses.get(key)
+
+            if entry is not None and entry[0] == etag:
+                self.responses.move_to_end(key)
+                return entry[1]
+
+        return None
+
+    def keep_response(self, key, etag, body):
+        """
+        Keeps the body of an answer, dropping the least recently used
+        ones past `cache_size`.
+        """
+        if not self.cache_size:
+            return
+
+        with self.responses_lock:
+            self.responses[key] = (etag, body)
+            self.responses.move_to_end(key)
+
+            while len(self.responses) > self.cache_size:
+                self.responses.popitem(last=False)
+
+    def route(self, path, query):
+        """
+        Returns the endpoint name and a function that answers the request
+        with either a JSON-ready value or, for streamed ranges, a generator
+        of encoded chunks. Raises APIError for unknown or bad requests.
+        """
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["stations"]:
+            return "stations", self.stations
+
+        if len(parts) != 3 or parts[0] != "stations":
+            raise APIError(404, "Not Found")
+
+        try:
+            station_id = int(parts[1])
+        except ValueError:
+            raise APIError(404, "Not Found")
+
+        endpoint = parts[2]
+
+        if endpoint == "days":
+            start, end = self.date_range(query)
+            return endpoint, lambda: self.days(station_id, start, end)
+
+        if endpoint == "months":
+            start_year = self.year(query, "start_year", 1)
+            end_year = self.year(query, "end_year", 9999)
+            return endpoint, lambda: self.months(station_id, start_year, end_year)
+
+        if endpoint == "summary":
+            start, end = self.date_range(query)
+            return endpoint, lambda: self.summary(station_id, start, end)
+
+        raise APIError(404, "Not Found")
+
+    @staticmethod
+    def date_range(query):
+        """
+        Returns the "start" and "end" dates of a query, zero-padded.
+        """
+        dates = []
+
+        for name, default in (("start", FIRST_DATE), ("end", LAST_DATE)):
+            value = query.get(name, [default])[0]
+
+            try:
+                dates.append(date.fromisoformat(value).isoformat())
+            except ValueError:
+                raise APIError(400, f"{name} must be a YYYY-MM-DD date")
+
+        return dates
+
+    @staticmethod
+    def year(query, name, default):
+        """
+        Returns a year from a query.
+        """
+        try:
+            year = int(query.get(name, [default])[0])
+        except ValueError:
+            raise APIError(400, f"{name} must be a year")
+
+        if not 1 <= year <= 9999:
+            raise APIError(400, f"{name} must be a year")
+
+        return year
+
+    def stations(self):
+        """
+        Returns the registered stations.
+        """
+        return [
+            {"station_id": station_id, "name": name}
+            for station_id, name in self.db.stations() or []
+        ]
+
+    def days(self, station_id, start, end):
+        """
+        Returns a station's days between two dates, or a generator of
+        encoded chunks when they fill a whole page of `stream_rows`.
+        """
+        pages = self.db.page_days(start, end, station_id, self.stream_rows)
+
+        try:
+            rows = next(pages, [])
+        except Exception:
+            raise APIError(500, "Query failed")
+
+        if len(rows) < self.stream_rows:
+            return [self.day(row) for row in rows]
+
+        return self.stream(rows, pages)
+
+    @staticmethod
+    def day(row):
+        """
+        Returns a (date, max, min, mean) row as a JSON-ready dictionary.
+        """
+        return {"date": row[0], "max": row[1], "min": row[2], "mean": row[3]}
+
+    def stream(self, rows, pages):
+        """
+        Yields the first page of days and then the rest of `pages` as one
+        JSON array in encoded chunks.
+        """
+        chunk = json.dumps([self.day(row) for row in rows])
+        yield b"[" + chunk[1:-1].encode("utf-8")
+
+        for rows in pages:
+            chunk = json.dumps([self.day(row) for row in rows])
+            yield b"," + chunk[1:-1].encode("utf-8")
+
+        yield b"]"
+
+    def months(self, station_id, start_year, end_year):
+        """
+        Returns the distribution of a station's mean temperatures in each
+        calendar month between two years: the number of days, the lowest,
+        quartiles, highest, and average.
+        """
+        # Imported here so that starting the API does not pay for loading numpy.
+        import numpy as np
+
+        columns = self.db.fetch_columns(
+            f"{start_year:04}-01-01", f"{end_year:04}-12-31", station_id=station_id
+        )
+
+        if columns is None:
+            raise APIError(500, "Query failed")
+
+        temperatures = columns["avg_temp"].astype(np.float64)
+        months = columns["dates"].astype("datetime64[M]").astype(np.int64) % 12
+
+        distribution = []
+
+        for month in range(12):
+            values = temperatures[months == month]
+
+            entry = {"month": month + 1, "days": int(len(values))}
+
+            if len(values):
+                lowest, q1, median, q3, highest = np.percentile(values, [0, 25, 50, 75, 100])
+
+                entry.update({
+                    "min": round(float(lowest), 2),
+                    "q1": round(float(q1), 2),
+                    "median": round(float(median), 2),
+                    "q3": round(float(q3), 2),
+                    "max": round(float(highest), 2),
+                    "mean": round(float(values.mean()), 2),
+                })
+
+            distribution.append(entry)
+
+        return distribution
+
+    def summary(self, station_id, start, end):
+        """
+        Returns the summary statistics of a station's days between two dates.
+        """
+        row = self.db.fetch_summary(start, end, station_id)
+
+        if row is None:
+            raise APIError(500, "Query failed")
+
+        days, first_date, last_date, mean, lowest, highest = row
+
+        return {
+            "station_id": station_id,
+            "days": days,
+            "first_date": first_date,
+            "last_date": last_date,
+            "mean": None if mean is None else round(mean, 2),
+            "min": lowest,
+            "max": highest,
+        }
+
+    def handler(self):
+        """
+        Returns the request handler class bound to this API.
+        """
+        api = self
+
+        class WeatherRequestHandler(BaseHTTPRequestHandler):
+            """
+            Answers API requests.
+            """
+
+            protocol_version = "HTTP/1.1"
+
+            # Headers and body go out in separate writes, which Nagle's
+            # algorithm would hold back until the client acknowledges.
+            disable_nagle_algorithm = True
+
+            # Idle kept-alive connections give their thread back after this long.
+            timeout = 10
+
+            def do_GET(self):
+                """
+                Answers from the response cache, with a 304, or by running
+                the query.
+                """
+                start = time.perf_counter()
+                endpoint = "unknown"
+
+                try:
+                    parts = urlsplit(self.path)
+                    endpoint, answer = api.route(parts.path, parse_qs(parts.query))
+
+                    etag = api.etag()
+                    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+                    if self.headers.get("If-None-Match") == etag:
+                        self.reply(304, b"", headers)
+                        return
+
+                    key = (parts.path, parts.query)
+                    body = api.cached_response(key, etag)
+
+                    if body is None:
+                        result = answer()
+
+                        if not isinstance(result, (list, dict)):
+                            self.reply_stream(result, headers)
+                            return
+
+                        body = json.dumps(result).encode("utf-8")
+                        api.keep_response(key, etag, body)
+
+                    self.reply(200, body, headers)
+
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+                except APIError as error:
+                    self.reply(error.status, json.dumps({"error": str(error)}).encode("utf-8"))
+
+                except Exception as error:
+                    report_error("WeatherAPI::do_GET", error)
+                    self.reply(500, json.dumps({"error": "Internal Server Error"}).encode("utf-8"))
+
+                finally:
+                    METRICS.observe("api_request", time.perf_counter() - start, endpoint=endpoint)
+
+            def reply(self, status, body, headers=None):
+                """
+                Sends a complete JSON response on the kept-alive connection.
+                """
+                METRICS.increment("api_responses", status=str(status))
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                if body:
+                    self.wfile.write(body)
+
+            def reply_stream(self, chunks, headers):
+                """
+                Sends a JSON response in chunks as they are encoded. If
+                encoding fails part way, the connection is closed without
+                the final chunk.
+                """
+                METRICS.increment("api_responses", status="200")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                try:
+                    for chunk in chunks:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+
+                except (BrokenPipeError, ConnectionResetError):
+                    raise
+
+                except Exception as error:
+                    # The status line has gone out, so the only honest
+                    # signal left is to end the response unterminated.
+                    report_error("WeatherAPI::reply_stream", error)
+                    self.close_connection = True
+                    return
+
+                self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, format, *args):
+                """
+                Keeps the console quiet.
+                """
+
+        return WeatherRequestHandler
+
+
+def main(argv=None):
+    """
+    Runs the API until it is interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Read-only HTTP API over the weather database")
+    parser.add_argument("--database", default="weather.sqlite", help="SQLite database file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--threads", type=int, default=16, help="requests answered at once")
+    parser.add_argument("--cache-size", type=int, default=256, help="answers kept in memory")
+    args = parser.parse_args(argv)
+
+    api = WeatherAPI(args.database, args.host, args.port, args.threads, args.cache_size)
+
+    print(f"Serving the weather API on {api.url}")
+
+    try:
+        api.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,33 @@
 """
 This module holds WeatherProcessor, launches the application and manages all
 tasks between the different modules that make up the application.
+
+Run without arguments for the interactive prompts, or with a subcommand
+to run unattended, for example from cron:
+
+    python weather_processor.py update
+    python weather_processor.py backfill --station 27174 3698 --workers 8
+    python weather_processor.py export 2020-01-01 2020-12-31 --output 2020.csv
+    python weather_processor.py plot box 2000 2020 --output box.png
+
+matplotlib and numpy are only imported by the commands that use them.
 """
 
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import date
 from db_operations import DBOperations
-from scrape_weather import WeatherScrapper
-from plot_operations import PlotOperations
+from http_session import HTTPSession
+from metrics import METRICS, report_error
+from month_record import MonthRecord
+from pipeline import IngestPipeline
+from scheduler import RequestScheduler
+from scrape_weather import DEFAULT_BASE_URL, BulkDataScrapper, FetchError, WeatherScrapper
+from stations import DEFAULT_STATION_ID
 
 class WeatherProcessor():
     """
@@ -14,14 +35,34 @@ class WeatherProcessor():
     WeatherScrapper, and PlotOperations.
     """
 
-    def __init__(self):
+    def __init__(self, pool_size=8, cache=None, station_id=DEFAULT_STATION_ID,
+                 base_url=DEFAULT_BASE_URL, source="html", rate=None):
         """
-        Initializes WeatherProcessor.
+        Initializes WeatherProcessor for the station `station_id`. All
+        downloads from `base_url` share one HTTPSession holding up to
+        `pool_size` keep-alive connections, and go through `cache`
+        (a PageCache) when one is given. With `source` set to "csv"
+        history is downloaded a year at a time from the bulk CSV files
+        instead of a month at a time from the HTML pages. Requests are
+        limited to `rate` per second if given, retried when they fail, and
+        their concurrency adapts to how the server is coping (see
+        RequestScheduler).
         """
         try:
             self.db = DBOperations()
-            self.scrapper = WeatherScrapper()
-            self.plotter = PlotOperations()
+            self.station_id = station_id
+            self.base_url = base_url
+            self.source = source
+            self.session = HTTPSession(
+                pool_size=pool_size,
+                scheduler=RequestScheduler(rate=rate, max_concurrency=pool_size)
+            )
+            self.cache = cache
+            self.scrapper = WeatherScrapper(
+                self.session, self.cache, station_id=station_id, base_url=base_url
+            )
+            self._plotter = None
+            self._analytics = None
 
             self.months_list = [
                 "Brumaire",
@@ -40,101 +81,335 @@ class WeatherProcessor():
             ]
 
         except Exception as error:
-            print(f"WeatherProcessor::__init__::{error}")
+            report_error("WeatherProcessor::__init__", error)
+
+    @property
+    def plotter(self):
+        """
+        Returns the PlotOperations, importing matplotlib on first use.
+        """
+        if self._plotter is None:
+            from plot_operations import PlotOperations
+
+            self._plotter = PlotOperations()
+
+        return self._plotter
 
-    def update(self):
+    @plotter.setter
+    def plotter(self, plotter):
         """
-        Updates the database based on the current date and last entry in database.
+        Replaces the PlotOperations.
+        """
+        self._plotter = plotter
+
+    @property
+    def analytics(self):
+        """
+        Returns the ClimateAnalytics, importing numpy on first use.
+        """
+        if self._analytics is None:
+            from analytics import ClimateAnalytics
+
+            self._analytics = ClimateAnalytics(self.db)
+
+        return self._analytics
+
+    def update(self, workers=8):
+        """
+        Updates the database by downloading only the months that are missing
+        days or still open to corrections, as found by DBOperations.gaps().
+        A station with no data at all gets its full history. Up to
+        `workers` months are downloaded at once. The analytics are brought
+        up to date for the new days only, and not loaded at all when there
+        are none.
         """
         try:
-            year = date.today().year
-            month = date.today().month
+            if self.db.count_rows_in_table(self.station_id)[0] == 0:
+                self.retrieve_stations([self.station_id], workers)
+                return
+
+            gaps = self.db.gaps(self.station_id)
+
+            if self.source == "csv":
+                downloaded, fetches = self.download_years(gaps, workers)
+            else:
+                downloaded, fetches = self.download_months(gaps, workers)
 
-            most_recent_date_in_database = self.db.most_recent_date()[0].split("-")
+            self.db.save_station_months(downloaded, fetches)
 
-            last_year_in_database = int(most_recent_date_in_database[0])
-            last_month_in_database = int(most_recent_date_in_database[1])
-            last_day_in_database = int(most_recent_date_in_database[2])
+            if any(weather for _, weather in downloaded):
+                self.analytics.sync(downloaded)
 
-            final_month = last_year_in_database == year and last_month_in_database == month
+            print("Update complete! Database is now up to date!")
+
+        except Exception as error:
+            report_error("WeatherProcessor::update", error)
+
+    def download_months(self, year_months, workers=8):
+        """
+        Downloads the given (year, month) pairs, `workers` at a time. Returns
+        the (station_id, weather dictionary) pairs to save and the fetch log
+        entries for them. A page for a different month than the one asked
+        for, which the site serves outside a station's history, counts as
+        a month without data.
+        """
+        downloaded = []
+        fetches = []
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+
+            for year, month in year_months:
+                print(f"Updating data for {self.months_list[month]} {year}...")
+                futures.append((year, month, executor.submit(self.retrieve_month, (year, month))))
 
-            while not final_month:
+            for year, month, future in futures:
                 try:
-                    print(f"Downloading data from {self.months_list[month]} {year}...")
-                    weather = self.scrapper.retrieve_montly_data(year, month)
+                    weather, title = future.result()
 
-                    if month == 1:
-                        month = 12
-                        year = year - 1
-                    else:
-                        month = month - 1
+                    if weather is None:
+                        continue
 
-                    final_month = last_year_in_database == year and last_month_in_database == month
+                    if title is not None and f"{self.months_list[month]} {year}" not in title:
+                        weather = {}
 
-                    self.db.save_data(weather)
+                    downloaded.append((self.station_id, weather))
+                    fetches.append((self.station_id, year, month, len(weather)))
 
                 except Exception as error:
-                    print(f"WeatherProcessor::update::while_loop::{error}")
+                    report_error("WeatherProcessor::download_months", error)
 
-            print(f"Updating data for {self.months_list[month]} {year}...")
+        return downloaded, fetches
+
+    def download_years(self, year_months, workers=8):
+        """
+        Downloads the yearly CSV file of every year among the given
+        (year, month) pairs, `workers` at a time, and returns every month in
+        them the same way download_months() does.
+        """
+        downloaded = []
+        fetches = []
 
-            weather = self.scrapper.retrieve_montly_data(year, month)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
 
-            non_duplicates = {}
+            for year in sorted({year for year, _ in year_months}, reverse=True):
+                print(f"Updating data for {year}...")
+                futures.append((year, executor.submit(self.retrieve_year, year)))
 
-            for key, value in weather.items():
+            for year, future in futures:
                 try:
-                    day = int(key.split("-")[2])
-                    if day > last_day_in_database:
-                        non_duplicates[key] = value
+                    months, _ = future.result()
+
+                    for month, weather in (months or {}).items():
+                        downloaded.append((self.station_id, weather))
+                        fetches.append((self.station_id, year, month, len(weather)))
+
                 except Exception as error:
-                    print(f"WeatherProcessor::update::for_loop::{error}")
+                    report_error("WeatherProcessor::download_years", error)
 
-            self.db.save_data(non_duplicates)
+        return downloaded, fetches
 
-            print("Update complete! Database is now up to date!")
+    def retrieve_all(self, workers=8):
+        """
+        Purges the station's data and performs a full download of it to the
+        database. Other stations are kept. Up to `workers` months are
+        downloaded at once.
+        """
+        try:
+            self.db.initialize_db()
+            self.db.purge_station(self.station_id)
 
+            self.retrieve_stations([self.station_id], workers)
 
         except Exception as error:
-            print(f"WeatherProcessor::update::{error}")
+            report_error("WeatherProcessor::retrieve_all", error)
 
-    def retrieve_all(self):
+    def retrieve_stations(self, station_ids, workers=8, window=None, parsers=2, processes=None):
         """
-        Purges the database and performs a full download to the database.
+        Downloads the full history of many stations at the same time through
+        an IngestPipeline: `workers` threads download pages, `parsers`
+        threads parse them, and one thread saves them, with each station
+        keeping at most `window` months (`workers` by default) in flight. A
+        station is done when the same page title is served twice in a row,
+        just like WeatherScrapper.same_month(). With `processes`, pages are
+        parsed in that many worker processes instead of in the threads.
+        Each station's analytics are built once its history is saved.
         """
         try:
-            self.db.purge_data()
-            self.db.initialize_db()
+            if self.source == "csv":
+                self.retrieve_stations_bulk(station_ids, workers)
+            else:
+                pipeline = IngestPipeline(
+                    self, fetchers=workers, parsers=parsers, window=window, processes=processes
+                )
+                pipeline.run(station_ids)
 
-            year = date.today().year
-            month = date.today().month
+            for station_id in station_ids:
+                self.analytics.build(station_id)
 
-            is_finished = False
+        except Exception as error:
+            report_error("WeatherProcessor::retrieve_stations", error)
 
-            while not is_finished:
-                try:
-                    print(f"Downloading data from {self.months_list[month]} {year}...")
-                    weather = self.scrapper.retrieve_montly_data(year, month)
-                    if month == 1:
-                        month = 12
-                        year = year - 1
-                    else:
-                        month = month - 1
-
-                    is_finished = self.scrapper.same_month()
-
-                    if is_finished:
-                        print(
-                            f"Data from {self.months_list[month + 1]} {year} "
-                            "and after is not available, download complete!"
-                        )
-                    else:
-                        self.db.save_data(weather)
-                except Exception as error:
-                    print(f"WeatherProcessor::retrieve_all::while_loop::{error}")
+    def retrieve_stations_bulk(self, station_ids, workers=8, empty_years=3, failed_years=3):
+        """
+        Downloads the full history of many stations from the yearly CSV
+        files, `workers` years at a time shared between the stations. A
+        station is done once `empty_years` years in a row, walking back from
+        this one, have no usable day, so neither a new year with no data
+        yet nor a gap in a station's history ends its crawl early. A year
+        that could not be downloaded is reported and left as a gap, and a
+        station is given up on after `failed_years` of them in a row. Each
+        round is saved in one transaction. Returns the stations given up on.
+        """
+        incomplete = []
+
+        try:
+            crawls = {station_id: date.today().year for station_id in station_ids}
+            empty = dict.fromkeys(station_ids, 0)
+            failed = dict.fromkeys(station_ids, 0)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while crawls:
+                    years = max(1, workers // len(crawls))
+                    futures = []
+
+                    for station_id, year in crawls.items():
+                        for year_to_fetch in range(year, year - years, -1):
+                            print(f"Downloading data from {year_to_fetch} for station {station_id}...")
+
+                            future = executor.submit(self.retrieve_year, year_to_fetch, station_id)
+                            futures.append((station_id, year_to_fetch, future))
+
+                    downloaded = []
+                    fetches = []
+                    finished = set()
+
+                    for station_id, year, future in futures:
+                        try:
+                            if station_id in finished:
+                                future.cancel()
+                                continue
+
+                            months, _ = future.result()
+
+                            if months is None:
+                                failed[station_id] = failed[station_id] + 1
+
+                                if failed[station_id] >= failed_years:
+                                    print(
+                                        f"Could not download {failed_years} years in a row up to "
+                                        f"{year} for station {station_id}, its history is incomplete!"
+                                    )
+                                    incomplete.append(station_id)
+                                    finished.add(station_id)
+                                else:
+                                    print(f"Could not download {year} for station {station_id}, "
+                                          f"it is left as a gap.")
+                                continue
+
+                            failed[station_id] = 0
+
+                            if not any(months.values()):
+                                empty[station_id] = empty[station_id] + 1
+
+                                if empty[station_id] >= empty_years:
+                                    print(
+                                        f"Data from {year + empty_years - 1} and before is not "
+                                        f"available for station {station_id}, download complete!"
+                                    )
+                                    finished.add(station_id)
+                                continue
+
+                            empty[station_id] = 0
+
+                            for month, weather in months.items():
+                                downloaded.append((station_id, weather))
+                                fetches.append((station_id, year, month, len(weather)))
+
+                        except Exception as error:
+                            report_error("WeatherProcessor::retrieve_stations_bulk::for_loop", error)
+
+                    crawls = {
+                        station_id: year - years
+                        for station_id, year in crawls.items() if station_id not in finished
+                    }
+
+                    self.db.save_station_months(downloaded, fetches)
+
+        except Exception as error:
+            report_error("WeatherProcessor::retrieve_stations_bulk", error)
+
+        return incomplete
+
+    def retrieve_year(self, year, station_id=None):
+        """
+        Downloads a year from the bulk CSV file with its own BulkDataScrapper.
+        Returns one MonthRecord per month up to the current one, keyed by
+        month number, and the station name the file gave.
+        """
+        try:
+            scrapper = BulkDataScrapper(
+                self.session, station_id=station_id or self.station_id, base_url=self.base_url
+            )
+
+            scrapper.retrieve_yearly_data(year)
+
+            today = date.today()
+            last_month = 12 if year < today.year else today.month
+
+            months = {
+                month: scrapper.months.get(month) or MonthRecord(year, month)
+                for month in range(1, last_month + 1)
+            }
+
+            return months, scrapper.title
+
+        except FetchError:
+            return None, None
 
         except Exception as error:
-            print(f"WeatherProcessor::retrieve_all::{error}")
+            report_error("WeatherProcessor::retrieve_year", error)
+            return None, None
+
+    def retrieve_month(self, year_month, station_id=None):
+        """
+        Downloads a single month with its own WeatherScrapper so that several
+        months can be downloaded at the same time. Returns the MonthRecord
+        and the title of the page that was served.
+        """
+        try:
+            year, month = year_month
+
+            scrapper = WeatherScrapper(
+                self.session, self.cache,
+                station_id=station_id or self.station_id, base_url=self.base_url
+            )
+            weather = scrapper.retrieve_montly_data(year, month)
+
+            return weather, scrapper.title
+
+        except FetchError:
+            return None, None
+
+        except Exception as error:
+            report_error("WeatherProcessor::retrieve_month", error)
+            return None, None
+
+    @staticmethod
+    def months_before(year, month):
+        """
+        Yields (year, month) pairs starting at the given month
+        and walking backwards one month at a time.
+        """
+        while True:
+            yield year, month
+
+            if month == 1:
+                month = 12
+                year = year - 1
+            else:
+                month = month - 1
 
     def line_plot(self, month, year):
         """
@@ -142,21 +417,53 @@ class WeatherProcessor():
         to instance of PlotOperations.
         """
         try:
-            start_date = f"{year}-{month}-01"
+            temperatures, timestamps, month_string = self.line_plot_data(month, year)
 
-            end_date = f"{year}-{month}-31"
+            self.plotter.line_plot(temperatures, timestamps, year, month_string)
 
-            entries = self.db.fetch_data(start_date, end_date)
+        except Exception as error:
+            report_error("WeatherProcessor::line_plot", error)
 
-            timestamps = [entry[0] for entry in entries]
-            temperatures = [entry[1] for entry in entries]
+    def line_plot_data(self, month, year):
+        """
+        Returns the mean temperatures, dates, and month name for a month.
+        """
+        start_date = f"{year}-{month}-01"
 
-            month_string = self.months_list[int(month)]
+        end_date = f"{year}-{month}-31"
 
-            self.plotter.line_plot(temperatures, timestamps, year, month_string)
+        entries = self.db.fetch_data(start_date, end_date, self.station_id)
+
+        timestamps = [entry[0] for entry in entries]
+        temperatures = [entry[1] for entry in entries]
+
+        month_string = self.months_list[int(month)]
+
+        return temperatures, timestamps, month_string
+
+    def range_plot(self, start_date, end_date, max_points=1000):
+        """
+        Retrieves data between two dates (YYYY-MM-DD) from the database
+        and passes it to instance of PlotOperations.
+        """
+        try:
+            temperatures, timestamps = self.range_plot_data(start_date, end_date)
+
+            self.plotter.range_plot(temperatures, timestamps, start_date, end_date, max_points)
 
         except Exception as error:
-            print(f"WeatherProcessor::line_plot::{error}")
+            report_error("WeatherProcessor::range_plot", error)
+
+    def range_plot_data(self, start_date, end_date):
+        """
+        Returns the mean temperatures and dates between two dates.
+        """
+        entries = self.db.fetch_data(start_date, end_date, self.station_id)
+
+        timestamps = [entry[0] for entry in entries]
+        temperatures = [entry[1] for entry in entries]
+
+        return temperatures, timestamps
 
     def box_plot(self, start_year, end_year):
         """
@@ -164,67 +471,108 @@ class WeatherProcessor():
         to instance of PlotOperations
         """
         try:
-            weather_data = [[],[],[],[],[],[],[],[],[],[],[],[]]
+            weather_data = self.box_plot_data(start_year, end_year)
+
+            self.plotter.box_plot(weather_data, start_year, end_year)
 
-            start_date = f"{start_year}-01-01"
-            finish_date = f"{end_year}-12-31"
+        except Exception as error:
+            report_error("WeatherProcessor::box_plot", error)
 
-            entries = self.db.fetch_data(start_date, finish_date)
+    def box_plot_data(self, start_year, end_year):
+        """
+        Returns the mean temperatures between two years
+        grouped into one array per month.
+        """
+        import numpy as np
 
-            for entry in entries:
-                try:
-                    month = entry[0].split("-")[1]
+        start_date = f"{start_year}-01-01"
+        finish_date = f"{end_year}-12-31"
+
+        columns = self.db.fetch_columns(start_date, finish_date, station_id=self.station_id)
 
-                    if month == "01":
-                        weather_data[0].append(entry[1])
+        temperatures = columns["avg_temp"]
+        months = columns["dates"].astype("datetime64[M]").astype(np.int64) % 12
 
-                    if month == "02":
-                        weather_data[1].append(entry[1])
+        order = np.argsort(months, kind="stable")
+        counts = np.bincount(months, minlength=12)
 
-                    if month == "03":
-                        weather_data[2].append(entry[1])
+        return np.split(temperatures[order], np.cumsum(counts)[:-1])
 
-                    if month == "04":
-                        weather_data[3].append(entry[1])
+    def render(self, chart, path):
+        """
+        Renders one chart headlessly to `path` and returns the path.
+        `chart` is ("box", start_year, end_year), ("line", year, month),
+        or ("range", start_date, end_date).
+        """
+        kind = chart[0]
 
-                    if month == "05":
-                        weather_data[4].append(entry[1])
+        if kind == "box":
+            _, start_year, end_year = chart
+            weather_data = self.box_plot_data(start_year, end_year)
 
-                    if month == "06":
-                        weather_data[5].append(entry[1])
+            return self.plotter.render_box_plot(weather_data, start_year, end_year, path)
 
-                    if month == "07":
-                        weather_data[6].append(entry[1])
+        if kind == "line":
+            _, year, month = chart
+            temperatures, timestamps, month_string = self.line_plot_data(month, year)
 
-                    if month == "08":
-                        weather_data[7].append(entry[1])
+            return self.plotter.render_line_plot(temperatures, timestamps, year, month_string, path)
 
-                    if month == "09":
-                        weather_data[8].append(entry[1])
+        if kind == "range":
+            _, start_date, end_date = chart
+            temperatures, timestamps = self.range_plot_data(start_date, end_date)
 
-                    if month == "10":
-                        weather_data[9].append(entry[1])
+            return self.plotter.render_range_plot(
+                temperatures, timestamps, start_date, end_date, path
+            )
 
-                    if month == "11":
-                        weather_data[10].append(entry[1])
+        raise ValueError(f"Unknown chart type {kind}")
+
+    def render_batch(self, charts, output_dir, image_format="png", workers=None):
+        """
+        Renders many charts to files in `output_dir` across a pool of
+        `workers` processes (one per core by default). Each process reads
+        the database on its own. Returns the paths in the order of
+        `charts`, with None for any chart that failed.
+        """
+        try:
+            os.makedirs(output_dir, exist_ok=True)
 
-                    if month == "12":
-                        weather_data[11].append(entry[1])
+            tasks = []
+            for chart in charts:
+                name = "-".join(str(part) for part in (chart[0], self.station_id) + tuple(chart[1:]))
+                path = os.path.join(output_dir, f"{name}.{image_format}")
 
-                except Exception as error:
-                    print(f"WeatherProcessor::box_plot::for_loop::{error}")
+                tasks.append((self.db.app_database, self.station_id, tuple(chart), path))
 
-            self.plotter.box_plot(weather_data, start_year, end_year)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(render_chart, tasks))
 
         except Exception as error:
-            print(f"WeatherProcessor::box_plot::{error}")
+            report_error("WeatherProcessor::render_batch", error)
 
-if __name__ == '__main__':
+def render_chart(task):
+    """
+    Renders one chart in a worker process. `task` is
+    (database path, station id, chart, output path).
+    """
     try:
-        app = WeatherProcessor()
+        app_database, station_id, chart, path = task
 
-        app.db.initialize_db()
+        app = WeatherProcessor(station_id=station_id)
+        app.db.app_database = app_database
+
+        return app.render(chart, path)
 
+    except Exception as error:
+        report_error("weather_processor::render_chart", error)
+        return None
+
+def interactive(app):
+    """
+    Runs the original question and answer session.
+    """
+    try:
         print()
         print("*************************************************")
         print("*                                               *")
@@ -323,4 +671,194 @@ if __name__ == '__main__':
         print()
 
     except Exception as error:
-        print(f"weather_processor::main::{error}")
+        report_error("weather_processor::interactive", error)
+
+def export(app, start_date, end_date, output, export_format):
+    """
+    Writes one station's days between two dates as CSV or JSON.
+    """
+    rows = app.db.fetch_days(start_date, end_date, app.station_id) or []
+    header = ("sample_date", "max_temp", "min_temp", "avg_temp")
+
+    if export_format == "json":
+        json.dump([dict(zip(header, row)) for row in rows], output, indent=2)
+        output.write("\n")
+    else:
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def parse_arguments(argv):
+    """
+    Parses the command line.
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--database", default="weather.sqlite", help="SQLite database file")
+    common.add_argument("--station", type=int, default=DEFAULT_STATION_ID, help="station id")
+    common.add_argument("--base-url", default=DEFAULT_BASE_URL, help="climate data site")
+    common.add_argument("--cache", help="directory to keep downloaded pages in")
+    common.add_argument(
+        "--offline", action="store_true",
+        help="replay pages from --cache only, stopping each station at its first missing month"
+    )
+    common.add_argument("--rate", type=float, help="most requests per second to send")
+    common.add_argument("--daily-store", help="directory of memory-mapped daily arrays to keep in sync")
+    common.add_argument(
+        "--source", choices=["html", "csv"], default="html",
+        help="download monthly HTML pages or yearly bulk CSV files"
+    )
+    common.add_argument("--metrics-json", help="write metrics as JSON to this file on exit")
+    common.add_argument("--metrics-prometheus", help="write metrics as Prometheus text on exit")
+
+    parser = argparse.ArgumentParser(
+        description="Ali's Stupendous Weather Processor. Run without a command for prompts."
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    update = commands.add_parser("update", parents=[common], help="download missing and recent months")
+    update.add_argument("--workers", type=int, default=8, help="concurrent downloads")
+
+    backfill = commands.add_parser("backfill", parents=[common], help="download whole histories")
+    backfill.add_argument("--stations", type=int, nargs="+", help="stations to crawl together")
+    backfill.add_argument("--workers", type=int, default=8, help="concurrent downloads")
+    backfill.add_argument(
+        "--full", action="store_true", help="delete the stations' stored data first"
+    )
+    backfill.add_argument(
+        "--processes", type=int, help="parse pages in this many processes instead of threads"
+    )
+
+    export_parser = commands.add_parser("export", parents=[common], help="write days as CSV or JSON")
+    export_parser.add_argument("start_date", help="YYYY-MM-DD")
+    export_parser.add_argument("end_date", help="YYYY-MM-DD")
+    export_parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    export_parser.add_argument("--output", help="file to write (standard output by default)")
+
+    commands.add_parser(
+        "purge", parents=[common], help="delete every station's data (the registry is kept)"
+    )
+
+    build_store = commands.add_parser(
+        "build-store", parents=[common], help="write memory-mapped daily arrays from the database"
+    )
+    build_store.add_argument("--stations", type=int, nargs="+", help="stations to write")
+
+    build_analytics = commands.add_parser(
+        "build-analytics", parents=[common],
+        help="work out normals, rolling means, degree-days, and anomalies from scratch"
+    )
+    build_analytics.add_argument("--stations", type=int, nargs="+", help="stations to work out")
+
+    plot = commands.add_parser("plot", parents=[common], help="draw or save a graph")
+    plot.add_argument(
+        "kind", choices=["line", "box", "range"],
+        help="line YEAR MONTH, box START_YEAR END_YEAR, or range START_DATE END_DATE"
+    )
+    plot.add_argument("first")
+    plot.add_argument("second")
+    plot.add_argument("--output", help="save to this PNG or SVG file instead of showing it")
+
+    args = parser.parse_args(argv)
+
+    if getattr(args, "offline", False) and not args.cache:
+        parser.error("--offline needs --cache")
+
+    return args
+
+def main(argv=None):
+    """
+    Runs a command, or the interactive session when there is none,
+    and returns the process exit code.
+    """
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+
+    if args.command is None:
+        app = WeatherProcessor()
+        app.db.initialize_db()
+
+        interactive(app)
+
+        return 0
+
+    errors = METRICS.total("errors")
+
+    cache = None
+    if args.cache:
+        from page_cache import PageCache
+
+        cache = PageCache(args.cache, offline=args.offline)
+
+    app = WeatherProcessor(
+        cache=cache, station_id=args.station, base_url=args.base_url, source=args.source,
+        rate=args.rate
+    )
+    app.db.app_database = args.database
+
+    if args.daily_store or args.command == "build-store":
+        from daily_store import DailyStore
+
+        app.db.daily_store = DailyStore(args.daily_store or "daily_store")
+
+    try:
+        if args.command == "export" and not os.path.exists(args.database):
+            raise FileNotFoundError(f"There is no database at {args.database} to export from")
+
+        app.db.initialize_db()
+
+        if args.command == "update":
+            app.update(args.workers)
+
+        elif args.command == "backfill":
+            if args.full:
+                for station_id in args.stations or [args.station]:
+                    app.db.purge_station(station_id)
+
+            app.retrieve_stations(
+                args.stations or [args.station], args.workers, processes=args.processes
+            )
+
+        elif args.command == "export":
+            if args.output:
+                with open(args.output, "w", encoding="utf-8", newline="") as output:
+                    export(app, args.start_date, args.end_date, output, args.format)
+            else:
+                export(app, args.start_date, args.end_date, sys.stdout, args.format)
+
+        elif args.command == "purge":
+            app.db.purge_data()
+
+        elif args.command == "build-store":
+            for station_id in args.stations or [args.station]:
+                app.db.daily_store.build(app.db, station_id)
+
+        elif args.command == "build-analytics":
+            for station_id in args.stations or [args.station]:
+                app.analytics.build(station_id)
+
+        elif args.command == "plot":
+            chart = (args.kind, args.first, args.second)
+
+            if args.output:
+                app.render(chart, args.output)
+            elif args.kind == "line":
+                app.line_plot(args.second, args.first)
+            elif args.kind == "box":
+                app.box_plot(args.first, args.second)
+            else:
+                app.range_plot(args.first, args.second)
+
+    except Exception as error:
+        report_error(f"weather_processor::{args.command}", error)
+
+    finally:
+        if args.metrics_json:
+            METRICS.write_json(args.metrics_json)
+        if args.metrics_prometheus:
+            METRICS.write_prometheus(args.metrics_prometheus)
+
+    failed = METRICS.total("errors")
+
+    return 1 if failed > errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())